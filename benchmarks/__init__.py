@@ -0,0 +1,3 @@
+"""
+Benchmarks for the ZeroCode LLM Chat Client
+"""
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Benchmark of the client-side overhead of ChatClient requests
+
+The provider is replaced by a fake that answers instantly, so the timings
+cover only our own work: context trimming, token counting, scheduling and
+history bookkeeping.
+
+Usage:
+    python -m benchmarks.bench_chat_client [--ops 2000] [--history 0,20,200]
+"""
+import argparse
+import os
+import sys
+from types import SimpleNamespace
+from typing import Dict, Iterable, List
+
+# Allow running as a plain script from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.timing import format_result, time_operation
+from src.llm.chat_client import ChatClient
+
+class FakeProvider:
+    """Zero-latency stand-in for the OpenAI client's chat.completions API"""
+    
+    def __init__(self, answer: str = "Benchmark answer " * 20):
+        self.chat = SimpleNamespace(completions=self)
+        self.completion = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
+        self.chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+            for word in answer.split()
+        ]
+    
+    def create(self, stream: bool = False, **kwargs):
+        return iter(self.chunks) if stream else self.completion
+
+def synthetic_history(length: int) -> List[Dict[str, str]]:
+    """
+    Build a conversation history of alternating user and assistant messages
+    
+    Args:
+        length: Number of messages
+    
+    Returns:
+        The messages
+    """
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Benchmark message {i} " + "lorem ipsum dolor sit amet " * 8
+        }
+        for i in range(length)
+    ]
+
+def run(ops: int, history_lengths: Iterable[int]) -> Dict[str, Dict[str, float]]:
+    """
+    Time get_response() and stream_response() against the fake provider
+    
+    Args:
+        ops: Timed calls per operation
+        history_lengths: Conversation lengths to measure with
+    
+    Returns:
+        A dictionary mapping each benchmark name to its timing result
+    """
+    client = ChatClient(api_key="benchmark", model="gpt-4")
+    client.openai_client = FakeProvider()
+    results = {}
+    
+    for length in history_lengths:
+        history = synthetic_history(length)
+        
+        def get_response(i):
+            client.conversation_history = list(history)
+            client.get_response(f"Benchmark prompt {i}")
+        
+        def stream_response(i):
+            client.conversation_history = list(history)
+            for _ in client.stream_response(f"Benchmark prompt {i}"):
+                pass
+        
+        # The warm-up calls fill the token count cache with the history, as in a real conversation
+        results[f"chat_client.get_response[history={length}]"] = time_operation(get_response, ops, warmup=10)
+        results[f"chat_client.stream_response[history={length}]"] = time_operation(stream_response, ops, warmup=10)
+    
+    return results
+
+def main(argv=None) -> int:
+    """Time ChatClient requests against the fake provider"""
+    parser = argparse.ArgumentParser(description="Benchmark ChatClient request overhead")
+    parser.add_argument("--ops", type=int, default=2000, help="Iterations per operation")
+    parser.add_argument("--history", default="0,20,200", help="Comma-separated conversation lengths")
+    args = parser.parse_args(argv)
+    
+    for name, result in run(args.ops, [int(length) for length in args.history.split(",")]).items():
+        print(format_result(name, result))
+    
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+"""
+Benchmark of message body compression: ratio, codec throughput and database size
+
+The corpus is a synthetic chat history whose assistant answers carry code,
+pasted logs and JSON, or the messages of an existing database given with
+--db (opened read-only). Every body is run through DBManager's codec, then
+the corpus is saved into two databases, with and without compression, to
+compare file sizes and write and read throughput.
+
+Usage:
+    python -m benchmarks.bench_compression [--messages 5000] [--db ~/.zerocode-llm-chat/chat_history.db] [--min-bytes 1024] [--level 6]
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+from typing import Dict, List
+
+# Allow running as a plain script from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db.db_manager import DBManager
+
+# Messages per conversation when the corpus is saved
+PER_CONVERSATION = 20
+
+WORDS = (
+    "the request handler retries connection pool timeout cache index query latency page "
+    "function returns value error config service deploy build token model stream user "
+    "response database table column migration thread queue worker batch file path"
+).split()
+
+def _prose(rng: random.Random, sentences: int) -> str:
+    """Generate sentences of plausible technical prose"""
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 16))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+def _code(rng: random.Random, lines: int) -> str:
+    """Generate a fenced Python code block"""
+    body = []
+    for i in range(lines):
+        name = rng.choice(WORDS)
+        body.append(rng.choice([
+            f"    {name}_{i} = {rng.choice(WORDS)}.get('{rng.choice(WORDS)}', {rng.randint(0, 999)})",
+            f"    if {name} is None:\n        raise ValueError('{name} is required')",
+            f"    for item in {name}s:\n        results.append(process(item, retries={rng.randint(1, 5)}))",
+            f"    logger.info('{name} took %.3f s', time.perf_counter() - started)"
+        ]))
+    return "```python\ndef handle(request):\n" + "\n".join(body) + "\n    return results\n```"
+
+def _log(rng: random.Random, lines: int) -> str:
+    """Generate a pasted application log"""
+    levels = ["INFO", "INFO", "INFO", "DEBUG", "WARNING", "ERROR"]
+    return "```\n" + "\n".join(
+        f"2024-03-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}.{rng.randint(0, 999):03d} "
+        f"{rng.choice(levels):<7} [worker-{rng.randint(1, 8)}] src.{rng.choice(WORDS)}.{rng.choice(WORDS)}: "
+        f"{rng.choice(WORDS)} {rng.choice(WORDS)} id={rng.getrandbits(32):08x} elapsed={rng.random() * 2:.3f}s"
+        for _ in range(lines)
+    ) + "\n```"
+
+def _json(rng: random.Random, items: int) -> str:
+    """Generate a pasted JSON API response"""
+    rows = ",\n".join(
+        f'    {{"id": {rng.randint(1, 10 ** 6)}, "name": "{rng.choice(WORDS)}_{rng.choice(WORDS)}", '
+        f'"status": "{rng.choice(["active", "pending", "failed"])}", "score": {rng.random():.4f}}}'
+        for _ in range(items)
+    )
+    return "```json\n{\n  \"items\": [\n" + rows + "\n  ]\n}\n```"
+
+def synthetic_corpus(messages: int, seed: int = 0) -> List[str]:
+    """
+    Generate a chat history mixing short questions with long technical answers
+    
+    Args:
+        messages: Number of messages, alternating user and assistant
+        seed: Random seed; the same arguments always give the same corpus (default: 0)
+    
+    Returns:
+        The message bodies in order
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(messages):
+        if i % 2 == 0:
+            # Questions are short, but sometimes come with a pasted log or file
+            text = _prose(rng, rng.randint(1, 3))
+            if rng.random() < 0.15:
+                text += "\n\n" + (_log(rng, rng.randint(20, 200)) if rng.random() < 0.6 else _code(rng, rng.randint(10, 60)))
+        else:
+            parts = [_prose(rng, rng.randint(2, 8))]
+            kind = rng.random()
+            if kind < 0.35:
+                parts.append(_code(rng, rng.randint(10, 80)))
+            elif kind < 0.5:
+                parts.append(_log(rng, rng.randint(10, 100)))
+            elif kind < 0.6:
+                parts.append(_json(rng, rng.randint(10, 80)))
+            parts.append(_prose(rng, rng.randint(1, 4)))
+            text = "\n\n".join(parts)
+        corpus.append(text)
+    return corpus
+
+def database_corpus(db_path: str, limit: int) -> List[str]:
+    """
+    Read the most recent message bodies of an existing database without changing it
+    
+    Args:
+        db_path: Path of a chat_history.db
+        limit: Maximum number of messages
+    
+    Returns:
+        The message bodies, oldest first
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+        if "codec" in columns:
+            rows = conn.execute(
+                "SELECT content, codec, content_blob FROM messages ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        else:
+            rows = [(row[0], None, None) for row in conn.execute(
+                "SELECT content FROM messages ORDER BY id DESC LIMIT ?", (limit,)
+            )]
+    finally:
+        conn.close()
+    return [DBManager._message_text(*row) or "" for row in reversed(rows)]
+
+def measure_codec(corpus: List[str], min_bytes: int, level: int) -> Dict[str, float]:
+    """
+    Compress every body that DBManager would compress and time both directions
+    
+    Args:
+        corpus: Message bodies
+        min_bytes: Smallest body compressed, in UTF-8 bytes
+        level: zlib compression level
+    
+    Returns:
+        A dictionary with the share of messages compressed, the raw and stored
+        sizes in bytes, their ratio, and compression and decompression
+        throughput in MB of raw text per second
+    """
+    raw_bytes = stored_bytes = compressed_raw = 0
+    compressed = []
+    compress_seconds = 0.0
+    
+    for text in corpus:
+        data = text.encode("utf-8")
+        raw_bytes += len(data)
+        if len(data) < min_bytes:
+            stored_bytes += len(data)
+            continue
+        
+        start = time.perf_counter()
+        blob = zlib.compress(data, level)
+        compress_seconds += time.perf_counter() - start
+        
+        if len(blob) < len(data):
+            compressed.append(blob)
+            compressed_raw += len(data)
+            stored_bytes += len(blob)
+        else:
+            stored_bytes += len(data)
+    
+    start = time.perf_counter()
+    for blob in compressed:
+        zlib.decompress(blob).decode("utf-8")
+    decompress_seconds = time.perf_counter() - start
+    
+    return {
+        "messages": len(corpus),
+        "compressed_share": round(len(compressed) / len(corpus), 4) if corpus else 0.0,
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "ratio": round(raw_bytes / stored_bytes, 3) if stored_bytes else 1.0,
+        "compress_mb_per_sec": round(compressed_raw / 1e6 / compress_seconds, 1) if compress_seconds else 0.0,
+        "decompress_mb_per_sec": round(compressed_raw / 1e6 / decompress_seconds, 1) if decompress_seconds else 0.0
+    }
+
+def measure_database(corpus: List[str], work_dir: str, compress: bool, min_bytes: int, level: int) -> Dict[str, float]:
+    """
+    Save the corpus through DBManager and read it back
+    
+    Args:
+        corpus: Message bodies
+        work_dir: Directory for the database
+        compress: Whether large bodies are compressed
+        min_bytes: Smallest body compressed, in UTF-8 bytes
+        level: zlib compression level
+    
+    Returns:
+        A dictionary with the database size in bytes after a checkpoint, and
+        messages written and read per second
+    """
+    class BenchDBManager(DBManager):
+        COMPRESSION_MIN_BYTES = min_bytes if compress else float("inf")
+        COMPRESSION_LEVEL = level
+    
+    db_path = os.path.join(work_dir, f"compression-{'on' if compress else 'off'}.db")
+    db_manager = BenchDBManager(db_path)
+    try:
+        conversation_ids = []
+        start = time.perf_counter()
+        for offset in range(0, len(corpus), PER_CONVERSATION):
+            conversation_id = db_manager.create_conversation()
+            conversation_ids.append(conversation_id)
+            db_manager.add_messages([
+                (conversation_id, "user" if i % 2 == 0 else "assistant", text)
+                for i, text in enumerate(corpus[offset:offset + PER_CONVERSATION])
+            ])
+        write_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        for conversation_id in conversation_ids:
+            db_manager.get_conversation(conversation_id)
+        read_seconds = time.perf_counter() - start
+        
+        with db_manager._connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            size = conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        db_manager.close()
+    
+    return {
+        "db_bytes": size,
+        "write_messages_per_sec": round(len(corpus) / write_seconds, 1),
+        "read_messages_per_sec": round(len(corpus) / read_seconds, 1)
+    }
+
+def run(corpus: List[str], work_dir: str, min_bytes: int = DBManager.COMPRESSION_MIN_BYTES,
+        level: int = DBManager.COMPRESSION_LEVEL) -> Dict[str, Dict[str, float]]:
+    """
+    Measure the codec and both databases on a corpus
+    
+    Args:
+        corpus: Message bodies
+        work_dir: Directory for the databases
+        min_bytes: Smallest body compressed, in UTF-8 bytes (default: DBManager.COMPRESSION_MIN_BYTES)
+        level: zlib compression level (default: DBManager.COMPRESSION_LEVEL)
+    
+    Returns:
+        A dictionary with 'codec', 'uncompressed' and 'compressed' results
+    """
+    return {
+        "codec": measure_codec(corpus, min_bytes, level),
+        "uncompressed": measure_database(corpus, work_dir, False, min_bytes, level),
+        "compressed": measure_database(corpus, work_dir, True, min_bytes, level)
+    }
+
+def main(argv=None) -> int:
+    """Print the compression report"""
+    parser = argparse.ArgumentParser(description="Benchmark message body compression")
+    parser.add_argument("--messages", type=int, default=5000, help="Number of messages in the corpus")
+    parser.add_argument("--db", help="Take the corpus from this database instead of generating one")
+    parser.add_argument("--min-bytes", type=int, default=DBManager.COMPRESSION_MIN_BYTES, help="Smallest body compressed")
+    parser.add_argument("--level", type=int, default=DBManager.COMPRESSION_LEVEL, help="zlib compression level")
+    args = parser.parse_args(argv)
+    
+    corpus = database_corpus(args.db, args.messages) if args.db else synthetic_corpus(args.messages)
+    
+    temp_dir = tempfile.mkdtemp(prefix="zerocode-bench-")
+    try:
+        results = run(corpus, temp_dir, args.min_bytes, args.level)
+    finally:
+        shutil.rmtree(temp_dir)
+    
+    codec = results["codec"]
+    print(f"Corpus: {codec['messages']:,} messages, {codec['raw_bytes'] / 1e6:.1f} MB of text")
+    print(f"Compressed: {codec['compressed_share']:.0%} of messages (at least {args.min_bytes:,} bytes, level {args.level})")
+    print(f"Body size: {codec['raw_bytes'] / 1e6:.1f} MB -> {codec['stored_bytes'] / 1e6:.1f} MB (ratio {codec['ratio']:.2f})")
+    print(f"zlib: compress {codec['compress_mb_per_sec']:,.1f} MB/s, decompress {codec['decompress_mb_per_sec']:,.1f} MB/s")
+    for name in ["uncompressed", "compressed"]:
+        result = results[name]
+        print(
+            f"{name:<14} database {result['db_bytes'] / 1e6:>8.1f} MB   "
+            f"write {result['write_messages_per_sec']:>10,.1f} msg/s   read {result['read_messages_per_sec']:>10,.1f} msg/s"
+        )
+    
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
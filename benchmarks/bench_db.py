@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""
+Benchmark of DBManager operations per second on a populated database
+
+Usage:
+    python -m benchmarks.bench_db [--messages 100000] [--per-conversation 100] [--ops 2000] [--cache-dir DIR]
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+# Allow running as a plain script from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.timing import format_result, time_operation
+from src.db.db_manager import DBManager
+
+def populate(db_manager: DBManager, messages: int, per_conversation: int, seed: int = 0) -> List[str]:
+    """
+    Fill the database with synthetic conversations
+    
+    Rows are inserted with raw SQL so building a large database stays fast.
+    The same arguments always build the same database.
+    
+    Args:
+        db_manager: Manager whose database to populate
+        messages: Total number of messages to create
+        per_conversation: Number of messages in each conversation
+        seed: Seed of the generated conversation IDs (default: 0)
+    
+    Returns:
+        The IDs of the created conversations
+    """
+    rng = random.Random(seed)
+    conversation_ids = []
+    start = datetime(2024, 1, 1)
+    conn = sqlite3.connect(db_manager.db_path)
+    
+    for offset in range(0, messages, per_conversation):
+        conversation_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        created = (start + timedelta(minutes=offset)).isoformat()
+        conversation_ids.append(conversation_id)
+        
+        conn.execute(
+            "INSERT INTO conversations (id, title, model, created_at, updated_at, summary) VALUES (?, ?, ?, ?, ?, ?)",
+            (conversation_id, f"Conversation {offset}", "gpt-3.5-turbo", created, created, "Benchmark")
+        )
+        conn.executemany(
+            "INSERT INTO messages (conversation_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+            [
+                (
+                    conversation_id,
+                    "user" if i % 2 == 0 else "assistant",
+                    f"Benchmark message {offset + i} " + "lorem ipsum dolor sit amet " * 8,
+                    (start + timedelta(minutes=offset, seconds=i)).isoformat()
+                )
+                for i in range(min(per_conversation, messages - offset))
+            ]
+        )
+    
+    conn.commit()
+    conn.close()
+    
+    return conversation_ids
+
+def build_database(db_path: str, messages: int, per_conversation: int, cache_dir: str = None) -> List[str]:
+    """
+    Create a populated benchmark database, reusing a cached copy when there is one
+    
+    Args:
+        db_path: Path of the database to create
+        messages: Total number of messages
+        per_conversation: Number of messages in each conversation
+        cache_dir: Directory keeping built databases between runs (default: None, always builds)
+    
+    Returns:
+        The IDs of the conversations, oldest first
+    """
+    cached = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        cached = os.path.join(cache_dir, f"bench-{messages}-{per_conversation}-v{DBManager.MIGRATIONS[-1][0]}.db")
+    
+    if cached and os.path.exists(cached):
+        shutil.copyfile(cached, db_path)
+        DBManager(db_path).close()
+    else:
+        db_manager = DBManager(db_path)
+        populate(db_manager, messages, per_conversation)
+        db_manager.close()
+        if cached:
+            shutil.copyfile(db_path, cached)
+    
+    conn = sqlite3.connect(db_path)
+    conversation_ids = [row[0] for row in conn.execute("SELECT id FROM conversations ORDER BY created_at, id")]
+    conn.close()
+    return conversation_ids
+
+def run(messages: int, per_conversation: int, ops: int, work_dir: str, cache_dir: str = None) -> Dict[str, Dict[str, float]]:
+    """
+    Time each DBManager operation on a database of the given size
+    
+    Reads run before writes, and deletes and imports last, so every
+    operation sees the same database on every run.
+    
+    Args:
+        messages: Total number of messages in the database
+        per_conversation: Number of messages in each conversation
+        ops: Timed calls per operation (fewer for whole-database operations)
+        work_dir: Directory for the database and exported files
+        cache_dir: Directory keeping built databases between runs (default: None)
+    
+    Returns:
+        A dictionary mapping each operation to its timing result, plus a
+        'build' entry with the database size and how long it took to prepare
+    """
+    db_path = os.path.join(work_dir, f"bench-{messages}.db")
+    start = time.perf_counter()
+    conversation_ids = build_database(db_path, messages, per_conversation, cache_dir)
+    build_seconds = time.perf_counter() - start
+    count = len(conversation_ids)
+    
+    # Spread the operations over the whole history rather than hitting the same rows
+    def pick(i):
+        return conversation_ids[(i * 7919) % count]
+    
+    export_path = os.path.join(work_dir, "conversation.json")
+    export_all_path = os.path.join(work_dir, "export.jsonl")
+    db_manager = DBManager(db_path)
+    results = {}
+    
+    try:
+        results["get_conversation"] = time_operation(lambda i: db_manager.get_conversation(pick(i)), ops)
+        results["get_all_conversations"] = time_operation(lambda i: db_manager.get_all_conversations(), max(ops // 100, 3))
+        results["list_conversations"] = time_operation(lambda i: db_manager.list_conversations(), ops)
+        results["add_message"] = time_operation(lambda i: db_manager.add_message(pick(i), "user", "Benchmark"), ops)
+        results["update_conversation_title"] = time_operation(lambda i: db_manager.update_conversation_title(pick(i), f"Title {i}"), ops)
+        results["create_conversation"] = time_operation(lambda i: db_manager.create_conversation(), ops)
+        
+        results["export_conversation"] = time_operation(lambda i: db_manager.export_conversation(pick(i), export_path), ops)
+        results["import_conversation"] = time_operation(lambda i: db_manager.import_conversation(export_path), ops)
+        results["export_all"] = time_operation(lambda i: db_manager.export_all(export_all_path), 1)
+        
+        # Import the whole export into an empty database, as when moving to a new machine
+        target = DBManager(os.path.join(work_dir, "import.db"))
+        try:
+            results["import_all"] = time_operation(lambda i: target.import_all(export_all_path), 1)
+        finally:
+            target.close()
+        
+        # Delete the oldest conversations, which the timed operations above didn't create
+        deletions = min(ops, count // 2)
+        results["delete_conversation"] = time_operation(lambda i: db_manager.delete_conversation(conversation_ids[i]), deletions)
+    finally:
+        db_manager.close()
+    
+    results["build"] = {"messages": messages, "conversations": count, "seconds": round(build_seconds, 2)}
+    return results
+
+def main(argv=None) -> int:
+    """Build the benchmark database and time each DBManager operation"""
+    parser = argparse.ArgumentParser(description="Benchmark DBManager operations")
+    parser.add_argument("--messages", type=int, default=100000, help="Number of messages in the database")
+    parser.add_argument("--per-conversation", type=int, default=100, help="Messages per conversation")
+    parser.add_argument("--ops", type=int, default=2000, help="Iterations per operation")
+    parser.add_argument("--cache-dir", help="Directory keeping built databases between runs")
+    args = parser.parse_args(argv)
+    
+    temp_dir = tempfile.mkdtemp(prefix="zerocode-bench-")
+    try:
+        results = run(args.messages, args.per_conversation, args.ops, temp_dir, args.cache_dir)
+    finally:
+        shutil.rmtree(temp_dir)
+    
+    build = results.pop("build")
+    print(f"Database: {build['messages']:,} messages in {build['conversations']:,} conversations")
+    for name, result in results.items():
+        print(format_result(name, result))
+    
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
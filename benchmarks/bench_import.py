@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Benchmark of module import times, for cold start regressions
+
+Each module is imported in a fresh interpreter with `python -X importtime`,
+and the cumulative time reported for it is taken, so interpreter startup
+itself is not counted. Provider SDKs, LangChain and Streamlit are meant to
+be loaded on first use only; the report lists any of them a module pulls in.
+
+Usage:
+    python -m benchmarks.bench_import [--runs 5] [--modules src.main,src.llm.chat_client] [--max-ms 500]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, Iterable, List, Tuple
+
+# Allow running as a plain script from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.timing import format_result, summarize
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry points whose import time is measured
+DEFAULT_MODULES = ["src.main", "src.llm.chat_client", "src.api.server", "src.batch.batch_runner", "src.db.db_manager"]
+
+# Heavy packages that should only be imported once they are used
+LAZY_PACKAGES = ["anthropic", "langchain", "langchain_openai", "openai", "streamlit"]
+
+def parse_importtime(output: str) -> Dict[str, int]:
+    """
+    Parse the report written to stderr by `python -X importtime`
+    
+    Args:
+        output: The report, one 'import time: self | cumulative | name' line per module
+    
+    Returns:
+        A dictionary mapping each imported module to its cumulative import time in microseconds
+    """
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            # The header line
+            continue
+        modules.setdefault(fields[2].strip(), int(fields[1]))
+    return modules
+
+def import_profile(module: str) -> Dict[str, int]:
+    """
+    Import a module in a fresh interpreter and profile the import
+    
+    Args:
+        module: Dotted module name
+    
+    Returns:
+        The parsed -X importtime report of every module loaded
+    
+    Raises:
+        RuntimeError: If the module failed to import
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=PROJECT_ROOT
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{process.stderr[-2000:]}")
+    return parse_importtime(process.stderr)
+
+def lazy_packages_loaded(profile: Dict[str, int]) -> List[str]:
+    """List the LAZY_PACKAGES found in an import profile"""
+    return [package for package in LAZY_PACKAGES if package in profile]
+
+def run(runs: int, modules: Iterable[str] = DEFAULT_MODULES) -> Tuple[Dict[str, Dict[str, float]], Dict[str, List[str]]]:
+    """
+    Time the import of each module
+    
+    Args:
+        runs: Fresh interpreters started per module
+        modules: Dotted names of the modules to import (default: DEFAULT_MODULES)
+    
+    Returns:
+        A dictionary mapping 'import[module]' to its timing result, and one
+        mapping each module to the lazy packages it imports eagerly
+    """
+    results = {}
+    eager = {}
+    for module in modules:
+        timings = []
+        for _ in range(runs):
+            profile = import_profile(module)
+            timings.append(profile[module] / 1e6)
+        results[f"import[{module}]"] = summarize(timings)
+        eager[module] = lazy_packages_loaded(profile)
+    return results, eager
+
+def main(argv=None) -> int:
+    """Time the imports and fail if any median exceeds the limit"""
+    parser = argparse.ArgumentParser(description="Benchmark module import times")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--modules", default=",".join(DEFAULT_MODULES), help="Comma-separated modules to import")
+    parser.add_argument("--max-ms", type=float, default=500.0, help="Slowest acceptable median import time")
+    args = parser.parse_args(argv)
+    
+    results, eager = run(args.runs, args.modules.split(","))
+    
+    slow = []
+    for (name, result), module in zip(results.items(), eager):
+        line = format_result(name, result)
+        if eager[module]:
+            line += f"   loads {', '.join(eager[module])}"
+        print(line)
+        if result["median_ms"] > args.max_ms:
+            slow.append(name)
+    
+    if slow:
+        print(f"Slower than {args.max_ms:g} ms: {', '.join(slow)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
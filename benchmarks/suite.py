@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for regression checks between releases
+
+Runs the DBManager benchmarks on synthetic databases of each size, the
+ChatClient overhead benchmark and the import time benchmark, then writes
+every result to a JSON file.
+Given the results of an earlier run, it also reports the operations whose
+median time got worse by more than a threshold.
+
+Usage:
+    python -m benchmarks.suite [--sizes 1k,100k,1m] [--output results.json] [--baseline old.json] [--threshold 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+# Allow running as a plain script from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import bench_chat_client, bench_db, bench_import
+from benchmarks.timing import format_result
+
+# Version of the results file layout
+RESULTS_VERSION = 1
+
+def parse_size(size: str) -> int:
+    """
+    Parse a database size such as '1000', '100k' or '1m'
+    
+    Args:
+        size: The size, optionally with a k or m suffix
+    
+    Returns:
+        The number of messages
+    """
+    size = size.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(size[-1:], 1)
+    return int(float(size.rstrip("km")) * multiplier)
+
+def size_label(messages: int) -> str:
+    """Format a number of messages the way sizes are given on the command line"""
+    if messages >= 1000000 and messages % 1000000 == 0:
+        return f"{messages // 1000000}m"
+    if messages >= 1000 and messages % 1000 == 0:
+        return f"{messages // 1000}k"
+    return str(messages)
+
+def environment() -> Dict[str, Any]:
+    """Describe the machine and code the benchmarks ran on"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count()
+    }
+
+def run_suite(sizes: List[int], per_conversation: int, ops: int, history_lengths: List[int],
+              cache_dir: str = None, import_runs: int = 5) -> Dict[str, Any]:
+    """
+    Run every benchmark
+    
+    Args:
+        sizes: Numbers of messages in the benchmark databases
+        per_conversation: Number of messages in each conversation
+        ops: Timed calls per operation
+        history_lengths: Conversation lengths for the ChatClient benchmark
+        cache_dir: Directory keeping built databases between runs (default: None)
+        import_runs: Fresh interpreters per module for the import benchmark (default: 5, 0 to skip it)
+    
+    Returns:
+        The results document: the environment, the settings, the database
+        sizes, the lazily imported packages each entry point loads and a
+        mapping from benchmark name to timing result
+    """
+    results = {}
+    databases = {}
+    
+    for messages in sizes:
+        label = size_label(messages)
+        print(f"Database with {messages:,} messages...")
+        work_dir = tempfile.mkdtemp(prefix="zerocode-bench-")
+        try:
+            db_results = bench_db.run(messages, per_conversation, ops, work_dir, cache_dir)
+        finally:
+            shutil.rmtree(work_dir)
+        
+        databases[label] = db_results.pop("build")
+        for operation, result in db_results.items():
+            name = f"db[{label}].{operation}"
+            results[name] = result
+            print(format_result(name, result))
+    
+    print("ChatClient against a zero-latency provider...")
+    for name, result in bench_chat_client.run(ops, history_lengths).items():
+        results[name] = result
+        print(format_result(name, result))
+    
+    eager_imports = {}
+    if import_runs:
+        print("Module import times...")
+        import_results, eager_imports = bench_import.run(import_runs)
+        for name, result in import_results.items():
+            results[name] = result
+            print(format_result(name, result))
+    
+    return {
+        "version": RESULTS_VERSION,
+        "environment": environment(),
+        "settings": {
+            "per_conversation": per_conversation, "ops": ops,
+            "history_lengths": history_lengths, "import_runs": import_runs
+        },
+        "databases": databases,
+        "eager_imports": eager_imports,
+        "results": results
+    }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Tuple[str, float, float]]:
+    """
+    Find the benchmarks that got slower than in a baseline run
+    
+    Medians are compared because they are the least affected by the odd
+    slow call; benchmarks missing from either run are ignored.
+    
+    Args:
+        results: Results document of this run
+        baseline: Results document of the earlier run
+        threshold: Allowed slowdown as a fraction, e.g. 0.25 for 25%
+    
+    Returns:
+        (name, baseline median, new median) for each regression, worst first
+    """
+    regressions = []
+    for name, result in results["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None or not previous["median_ms"]:
+            continue
+        if result["median_ms"] > previous["median_ms"] * (1 + threshold):
+            regressions.append((name, previous["median_ms"], result["median_ms"]))
+    
+    regressions.sort(key=lambda regression: regression[2] / regression[1], reverse=True)
+    return regressions
+
+def main(argv=None) -> int:
+    """Run the suite, save the results and check them against a baseline"""
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("--sizes", default="1k,100k,1m", help="Comma-separated database sizes in messages")
+    parser.add_argument("--per-conversation", type=int, default=20, help="Messages per conversation")
+    parser.add_argument("--ops", type=int, default=500, help="Timed calls per operation")
+    parser.add_argument("--history", default="0,20,200", help="Conversation lengths for the ChatClient benchmark")
+    parser.add_argument("--output", default="benchmark-results.json", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown against the baseline")
+    parser.add_argument("--cache-dir", help="Directory keeping built databases between runs")
+    parser.add_argument("--import-runs", type=int, default=5, help="Fresh interpreters per module for import times")
+    args = parser.parse_args(argv)
+    
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    
+    results = run_suite(
+        [parse_size(size) for size in args.sizes.split(",")],
+        args.per_conversation,
+        args.ops,
+        [int(length) for length in args.history.split(",")],
+        args.cache_dir,
+        args.import_runs
+    )
+    
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    
+    if baseline is None:
+        return 0
+    
+    regressions = compare(results, baseline, args.threshold)
+    if not regressions:
+        print(f"No regressions against {args.baseline}")
+        return 0
+    
+    print(f"{len(regressions)} regressions against {args.baseline}:")
+    for name, before, after in regressions:
+        print(f"  {name:<40} {before:.3f} ms -> {after:.3f} ms ({after / before - 1:+.0%})")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Timing helpers shared by the benchmarks
+"""
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+def time_operation(operation: Callable[[int], Any], ops: int, warmup: int = 0) -> Dict[str, float]:
+    """
+    Run an operation repeatedly, timing every call
+    
+    Args:
+        operation: Callable taking the iteration number
+        ops: Number of timed calls
+        warmup: Untimed calls made first, e.g. to fill caches (default: 0)
+    
+    Returns:
+        A dictionary with the number of calls, the mean, median, 95th
+        percentile and fastest call in milliseconds, and calls per second
+    """
+    for i in range(warmup):
+        operation(i)
+    
+    timings = []
+    for i in range(warmup, warmup + ops):
+        start = time.perf_counter()
+        operation(i)
+        timings.append(time.perf_counter() - start)
+    
+    return summarize(timings)
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    """
+    Summarize measured durations the way time_operation() reports them
+    
+    Args:
+        timings: Durations in seconds
+    
+    Returns:
+        A dictionary with the number of calls, the mean, median, 95th
+        percentile and fastest call in milliseconds, and calls per second
+    """
+    timings = sorted(timings)
+    ops = len(timings)
+    total = sum(timings)
+    return {
+        "ops": ops,
+        "mean_ms": round(total * 1000 / ops, 4),
+        "median_ms": round(statistics.median(timings) * 1000, 4),
+        "p95_ms": round(timings[min(int(ops * 0.95), ops - 1)] * 1000, 4),
+        "min_ms": round(timings[0] * 1000, 4),
+        "ops_per_sec": round(ops / total, 1) if total else float("inf")
+    }
+
+def format_result(name: str, result: Dict[str, float]) -> str:
+    """
+    Format a time_operation() result as one line of a report
+    
+    Args:
+        name: Label of the operation
+        result: The timing result
+    
+    Returns:
+        The report line
+    """
+    return (
+        f"{name:<40} {result['ops_per_sec']:>12,.1f} ops/sec   "
+        f"median {result['median_ms']:.3f} ms   p95 {result['p95_ms']:.3f} ms"
+    )
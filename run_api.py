@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+API server script for the ZeroCode LLM Chat Client
+This script serves the chat backend over HTTP without the UI
+
+Usage:
+    python run_api.py [--host 127.0.0.1] [--port 8000] [--db PATH] [--model gpt-4]
+"""
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+
+def main(argv=None):
+    """Main entry point for the API server script"""
+    parser = argparse.ArgumentParser(description="Serve the chat backend as an HTTP API")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--db", metavar="PATH", help="Database file (default: the app's database)")
+    parser.add_argument("--model", help="Model for requests and conversations that don't name one")
+    parser.add_argument("--log-level", default="info", help="uvicorn log level")
+    args = parser.parse_args(argv)
+    
+    # Load environment variables
+    load_dotenv()
+    
+    from src.monitoring.logs import configure_logging
+    configure_logging()
+    
+    if not os.getenv("OPENAI_API_KEY") and not os.getenv("ANTHROPIC_API_KEY"):
+        print("Error: neither OPENAI_API_KEY nor ANTHROPIC_API_KEY is set")
+        print("Please set at least one in your .env file or environment")
+        return 1
+    
+    try:
+        import uvicorn
+    except ImportError:
+        print("Error: uvicorn is not installed. Please run: pip install uvicorn")
+        return 1
+    
+    from src.api.server import create_app
+    from src.db.db_manager import DBManager
+    
+    default_model = args.model or ("gpt-3.5-turbo" if os.getenv("OPENAI_API_KEY") else "claude-3-sonnet")
+    app = create_app(DBManager(args.db) if args.db else None, default_model)
+    
+    uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
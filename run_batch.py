@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Batch script for the ZeroCode LLM Chat Client
+This script runs a JSONL file of prompts without the UI
+
+Usage:
+    python run_batch.py prompts.jsonl --output results.jsonl [--db] [--model gpt-4] [--concurrency 8] [--rpm 500] [--tpm 30000]
+    python run_batch.py prompts.jsonl --batch-api [--db PATH] [--model gpt-4] [--wait 3600]
+"""
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+from src.batch.batch_jobs import BatchJobManager
+from src.batch.batch_runner import BatchRunner, read_items
+from src.db.db_manager import DBManager
+from src.llm.scheduler import LLMRequestError, configure_scheduler
+from src.monitoring.logs import configure_logging
+
+def main(argv=None):
+    """Main entry point for the batch script"""
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through the chat client")
+    parser.add_argument("input", help="JSONL file with one prompt or conversation per line")
+    parser.add_argument("--output", help="JSONL file to append results to")
+    parser.add_argument("--db", nargs="?", const="", default=None, metavar="PATH",
+                        help="Save results as conversations (in the app's database unless PATH is given)")
+    parser.add_argument("--run-name", help="Name of the run in the database (default: the input file name)")
+    parser.add_argument("--model", default="gpt-3.5-turbo", help="Model for items that don't name one")
+    parser.add_argument("--concurrency", type=int, default=8, help="Prompts in flight at once")
+    parser.add_argument("--rpm", type=float, help="Requests per minute allowed per provider")
+    parser.add_argument("--tpm", type=float, help="Tokens per minute allowed per provider")
+    parser.add_argument("--max-retries", type=int, help="Retries of rate-limited or failed requests")
+    parser.add_argument("--temperature", type=float, help="Sampling temperature")
+    parser.add_argument("--max-tokens", type=int, help="Maximum response length")
+    parser.add_argument("--id-field", default="id", help="Field holding each item's ID")
+    parser.add_argument("--prompt-field", default="prompt", help="Field holding each item's prompt")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="Submit the prompts to the providers' batch APIs and save the results to the database")
+    parser.add_argument("--wait", type=float, help="With --batch-api, seconds to wait for the jobs (default: until done)")
+    args = parser.parse_args(argv)
+    
+    if args.batch_api:
+        if args.output is not None:
+            parser.error("--batch-api saves results to the database; --output isn't supported")
+    elif args.output is None and args.db is None:
+        parser.error("give --output, --db, or both")
+    
+    # Load environment variables
+    load_dotenv()
+    
+    # Skipped lines, progress and failed requests are reported as log events
+    configure_logging()
+    
+    if args.batch_api:
+        return run_batch_api(args)
+    
+    for provider in ("openai", "anthropic"):
+        configure_scheduler(
+            provider,
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+            max_concurrency=args.concurrency,
+            max_retries=args.max_retries
+        )
+    
+    db_manager = DBManager(args.db or None) if args.db is not None else None
+    runner = BatchRunner(
+        model=args.model,
+        concurrency=args.concurrency,
+        output_path=args.output,
+        db_manager=db_manager,
+        run_name=args.run_name,
+        id_field=args.id_field,
+        prompt_field=args.prompt_field,
+        temperature=args.temperature,
+        max_tokens=args.max_tokens
+    )
+    
+    try:
+        stats = runner.run(args.input)
+    except KeyboardInterrupt:
+        print("\nBatch interrupted; run the same command again to resume")
+        return 130
+    finally:
+        if db_manager is not None:
+            db_manager.close()
+    
+    print(
+        f"{stats['succeeded']} succeeded, {stats['failed']} failed, "
+        f"{stats['skipped']} already done, {stats['invalid']} invalid"
+    )
+    return 1 if stats["failed"] else 0
+
+def run_batch_api(args) -> int:
+    """Run the prompt file through the provider batch APIs"""
+    db_manager = DBManager(args.db or None)
+    manager = BatchJobManager(db_manager)
+    if args.temperature is not None:
+        manager.temperature = args.temperature
+    if args.max_tokens:
+        manager.max_tokens = args.max_tokens
+    
+    run = args.run_name or os.path.splitext(os.path.basename(args.input))[0]
+    stats = {"invalid": 0}
+    items = read_items(args.input, args.id_field, args.prompt_field, stats)
+    
+    try:
+        stats.update(manager.run(items, args.model, run, timeout=args.wait))
+    except KeyboardInterrupt:
+        print("\nStopped waiting; run the same command again to collect the results")
+        return 130
+    except LLMRequestError as e:
+        print(f"Error submitting batch: {e}")
+        return 1
+    finally:
+        db_manager.close()
+    
+    print(
+        f"{stats['submitted']} submitted, {stats['succeeded']} succeeded, {stats['failed']} failed, "
+        f"{stats['skipped']} already submitted or done, {stats['invalid']} invalid"
+    )
+    return 1 if stats["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
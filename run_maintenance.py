@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Maintenance script for the ZeroCode LLM Chat Client
+This script archives idle conversations and compacts the database without the UI
+
+Usage:
+    python run_maintenance.py [--db PATH] [--archive-after-days 180] [--enable-incremental-vacuum] [--rebuild-search-index]
+    python run_maintenance.py [--db PATH] --restore CONVERSATION_ID
+"""
+import argparse
+import sys
+from src.db.db_manager import DBManager
+from src.db.maintenance import DBMaintenance
+
+def main(argv=None):
+    """Main entry point for the maintenance script"""
+    parser = argparse.ArgumentParser(description="Archive idle conversations and compact the database")
+    parser.add_argument("--db", metavar="PATH", help="Database file (default: the app's database)")
+    parser.add_argument("--archive-after-days", type=float,
+                        help="Archive conversations idle for more than this many days")
+    parser.add_argument("--restore", metavar="CONVERSATION_ID",
+                        help="Move an archived conversation back into the database and exit")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Rewrite a database created before incremental auto-vacuum so it can be compacted")
+    parser.add_argument("--rebuild-search-index", action="store_true",
+                        help="Rebuild the message search index, after messages were deleted by another SQLite client")
+    args = parser.parse_args(argv)
+    
+    db_manager = DBManager(args.db)
+    try:
+        if args.restore:
+            if not db_manager.restore_conversation(args.restore):
+                print(f"Conversation {args.restore} isn't archived")
+                return 1
+            print(f"Restored conversation {args.restore}")
+            return 0
+        
+        if args.enable_incremental_vacuum:
+            if db_manager.enable_incremental_vacuum():
+                print("Enabled incremental auto-vacuum")
+            else:
+                print("Incremental auto-vacuum was already enabled")
+        
+        if args.rebuild_search_index:
+            db_manager.rebuild_search_index()
+            print("Rebuilt the message search index")
+        
+        result = DBMaintenance(db_manager, archive_after_days=args.archive_after_days, step_pause=0).run_once()
+    finally:
+        db_manager.close()
+    
+    archived = result["archived"]
+    if archived is not None:
+        print(
+            f"Archived {archived['conversations']} conversations ({archived['messages']} messages) "
+            f"into {archived['files']} files"
+        )
+    print(f"Released {result['pages_released']} free pages")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Mock provider script for the ZeroCode LLM Chat Client
+This script serves a local stand-in for the OpenAI and Anthropic APIs
+
+Usage:
+    python run_mock_provider.py [--port 8100] [--latency 0.5] [--tokens-per-second 50] [--rate-limit-rate 0.05]
+    python run_mock_provider.py --record traffic.jsonl
+    python run_mock_provider.py --replay traffic.jsonl
+
+Then point the app at it:
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 ANTHROPIC_BASE_URL=http://127.0.0.1:8100 python run.py
+"""
+import argparse
+import sys
+
+def main(argv=None):
+    """Main entry point for the mock provider script"""
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the OpenAI and Anthropic APIs")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8100, help="Port to listen on")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the first token of every answer")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Rate answers are generated at (0: instant)")
+    parser.add_argument("--response-tokens", type=int, help="Length of synthetic answers (default: echo the last message)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="Fraction of requests answered with a 5xx error")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--seed", type=int, help="Seed for the injected errors")
+    recording = parser.add_mutually_exclusive_group()
+    recording.add_argument("--replay", metavar="FILE", help="Answer from the answers recorded in FILE")
+    recording.add_argument("--record", metavar="FILE",
+                           help="Forward requests that aren't in FILE to the real APIs and record their answers")
+    parser.add_argument("--openai-upstream", help="OpenAI API to record from (default: the real API)")
+    parser.add_argument("--anthropic-upstream", help="Anthropic API to record from (default: the real API)")
+    parser.add_argument("--log-level", default="warning", help="uvicorn log level")
+    args = parser.parse_args(argv)
+    
+    try:
+        import uvicorn
+    except ImportError:
+        print("Error: uvicorn is not installed. Please run: pip install uvicorn")
+        return 1
+    
+    from src.llm.mock_provider import MockProvider, create_app
+    
+    upstream_urls = {}
+    if args.openai_upstream:
+        upstream_urls["openai"] = args.openai_upstream
+    if args.anthropic_upstream:
+        upstream_urls["anthropic"] = args.anthropic_upstream
+    
+    provider = MockProvider(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        rate_limit_rate=args.rate_limit_rate,
+        server_error_rate=args.server_error_rate,
+        retry_after=args.retry_after,
+        replay_path=args.replay,
+        record_path=args.record,
+        upstream_urls=upstream_urls,
+        seed=args.seed
+    )
+    
+    print(f"Mock provider listening on http://{args.host}:{args.port}")
+    print(f"  OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    print(f"  ANTHROPIC_BASE_URL=http://{args.host}:{args.port}")
+    uvicorn.run(create_app(provider), host=args.host, port=args.port, log_level=args.log_level)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""
+HTTP API server for the chat backend
+Exposes conversation management from DBManager and chat completions from
+AsyncChatClient, streaming answers as server-sent events
+"""
+import base64
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from src.db.db_manager import DBManager
+from src.llm.async_chat_client import AsyncChatClient
+from src.llm.scheduler import LLMRequestError
+from src.monitoring.metrics import CONTENT_TYPE, get_metrics
+
+class APIError(Exception):
+    """An error returned to the API caller as a JSON body"""
+    
+    def __init__(self, status_code: int, message: str):
+        """
+        Initialize the error
+        
+        Args:
+            status_code: HTTP status code of the response
+            message: Description of the error
+        """
+        super().__init__(message)
+        self.status_code = status_code
+
+class ChatAPI:
+    """Routes HTTP requests to DBManager and AsyncChatClient"""
+    
+    # Largest page of conversations returned at once
+    MAX_PAGE_SIZE = 200
+    
+    def __init__(self, db_manager: DBManager, default_model: str = "gpt-3.5-turbo",
+                 client_factory: Callable[[], AsyncChatClient] = AsyncChatClient):
+        """
+        Initialize the API
+        
+        Args:
+            db_manager: Database the conversations are stored in
+            default_model: Model used when neither the request nor the conversation names one (default: gpt-3.5-turbo)
+            client_factory: Function creating the chat client used for each request (default: AsyncChatClient)
+        """
+        self.db_manager = db_manager
+        self.default_model = default_model
+        self.client_factory = client_factory
+    
+    def routes(self) -> List[Route]:
+        """
+        Get the API routes
+        
+        Returns:
+            The list of Starlette routes
+        """
+        return [
+            Route("/health", self.health, methods=["GET"]),
+            Route("/metrics", self.metrics, methods=["GET"]),
+            Route("/chat", self.chat, methods=["POST"]),
+            Route("/conversations", self.list_conversations, methods=["GET"]),
+            Route("/conversations", self.create_conversation, methods=["POST"]),
+            Route("/conversations/{conversation_id}", self.get_conversation, methods=["GET"]),
+            Route("/conversations/{conversation_id}", self.update_conversation, methods=["PATCH"]),
+            Route("/conversations/{conversation_id}", self.delete_conversation, methods=["DELETE"]),
+            Route("/conversations/{conversation_id}/messages", self.send_message, methods=["POST"]),
+        ]
+    
+    async def health(self, request: Request) -> Response:
+        """GET /health: report that the server is up"""
+        return JSONResponse({"status": "ok"})
+    
+    async def metrics(self, request: Request) -> Response:
+        """GET /metrics: request and database metrics in the Prometheus text format"""
+        return Response(get_metrics().render(), headers={"Content-Type": CONTENT_TYPE})
+    
+    async def list_conversations(self, request: Request) -> Response:
+        """GET /conversations?limit=&cursor=: one page of conversations, most recently updated first"""
+        try:
+            limit = min(int(request.query_params.get("limit", 50)), self.MAX_PAGE_SIZE)
+        except ValueError:
+            raise APIError(400, "limit must be an integer")
+        if limit < 1:
+            raise APIError(400, "limit must be at least 1")
+        cursor = self._decode_cursor(request.query_params.get("cursor"))
+        
+        conversations, next_cursor = await run_in_threadpool(self.db_manager.list_conversations, limit, cursor)
+        
+        return JSONResponse({
+            "conversations": conversations,
+            "next_cursor": self._encode_cursor(next_cursor)
+        })
+    
+    async def create_conversation(self, request: Request) -> Response:
+        """POST /conversations {"title", "model"}: create an empty conversation"""
+        body = await self._json(request)
+        model = body.get("model") or self.default_model
+        
+        conversation_id = await run_in_threadpool(self.db_manager.create_conversation, body.get("title"), model)
+        conversation, _ = await run_in_threadpool(self.db_manager.get_conversation, conversation_id)
+        
+        return JSONResponse(conversation, status_code=201)
+    
+    async def get_conversation(self, request: Request) -> Response:
+        """GET /conversations/{id}: a conversation and its messages"""
+        conversation, messages = await self._load(request.path_params["conversation_id"])
+        return JSONResponse({**conversation, "messages": messages})
+    
+    async def update_conversation(self, request: Request) -> Response:
+        """PATCH /conversations/{id} {"title"}: rename a conversation"""
+        body = await self._json(request)
+        title = body.get("title")
+        if not isinstance(title, str) or not title.strip():
+            raise APIError(400, "title must be a non-empty string")
+        
+        conversation_id = request.path_params["conversation_id"]
+        if not await run_in_threadpool(self.db_manager.update_conversation_title, conversation_id, title):
+            raise APIError(404, "Conversation not found")
+        
+        conversation, _ = await run_in_threadpool(self.db_manager.get_conversation, conversation_id)
+        return JSONResponse(conversation)
+    
+    async def delete_conversation(self, request: Request) -> Response:
+        """DELETE /conversations/{id}: delete a conversation and its messages"""
+        if not await run_in_threadpool(self.db_manager.delete_conversation, request.path_params["conversation_id"]):
+            raise APIError(404, "Conversation not found")
+        return Response(status_code=204)
+    
+    async def send_message(self, request: Request) -> Response:
+        """
+        POST /conversations/{id}/messages {"content", "model", "stream", "temperature", "max_tokens"}
+        
+        Sends the message with the conversation's history and saves both the
+        message and the answer once the answer is complete. Failed requests
+        save nothing, so they can simply be sent again.
+        """
+        body = await self._json(request)
+        content = self._content(body)
+        conversation, messages = await self._load(request.path_params["conversation_id"])
+        
+        client = self._client(body, body.get("model") or conversation["model"] or self.default_model)
+        client.conversation_history = [{"role": m["role"], "content": m["content"]} for m in messages]
+        
+        async def save(answer: str) -> Dict[str, Any]:
+            await run_in_threadpool(self.db_manager.add_message, conversation["id"], "user", content)
+            message_id = await run_in_threadpool(self.db_manager.add_message, conversation["id"], "assistant", answer)
+            return {"conversation_id": conversation["id"], "message_id": message_id}
+        
+        return await self._respond(client, content, body.get("stream", False), save)
+    
+    async def chat(self, request: Request) -> Response:
+        """
+        POST /chat {"messages", "model", "stream", "temperature", "max_tokens"}
+        
+        Answers a conversation given in full, ending with a user message,
+        without saving anything.
+        """
+        body = await self._json(request)
+        messages = body.get("messages")
+        try:
+            history = [{"role": m["role"], "content": m["content"]} for m in messages]
+        except (KeyError, TypeError):
+            raise APIError(400, "messages must be a list of objects with role and content")
+        if not history or history[-1]["role"] != "user" or not isinstance(history[-1]["content"], str):
+            raise APIError(400, "the last message must be from the user")
+        
+        client = self._client(body, body.get("model") or self.default_model)
+        client.conversation_history = history[:-1]
+        
+        return await self._respond(client, history[-1]["content"], body.get("stream", False))
+    
+    async def _respond(self, client: AsyncChatClient, content: str, stream: bool,
+                       save: Optional[Callable[[str], Any]] = None) -> Response:
+        """
+        Answer a message, either all at once or as a stream of server-sent events
+        
+        Args:
+            client: Chat client holding the conversation history
+            content: The user's message
+            stream: Whether to stream the answer
+            save: Coroutine function called with the complete answer, returning extra response fields (default: None)
+        
+        Returns:
+            A JSON response, or an event stream of 'delta' events followed by 'done' or 'error'
+        """
+        if not stream:
+            try:
+                answer = await client.get_response(content)
+            except LLMRequestError as e:
+                return self._llm_error(e)
+            
+            result = {"model": client.model, "content": answer}
+            if save is not None:
+                result.update(await save(answer))
+            if client.last_usage:
+                result["usage"] = client.last_usage
+            return JSONResponse(result)
+        
+        async def events() -> AsyncIterator[str]:
+            chunks = []
+            try:
+                async for delta in client.stream_response(content):
+                    chunks.append(delta)
+                    yield self._event("delta", {"content": delta})
+            except LLMRequestError as e:
+                yield self._event("error", {"error": str(e), "status_code": e.status_code, "retryable": e.retryable})
+                return
+            
+            answer = "".join(chunks)
+            result = {"model": client.model, "content": answer}
+            if save is not None:
+                result.update(await save(answer))
+            if client.last_usage:
+                result["usage"] = client.last_usage
+            yield self._event("done", result)
+        
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            # Keep proxies from buffering the stream
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    def _client(self, body: Dict[str, Any], model: str) -> AsyncChatClient:
+        """Create a chat client for a request, applying its sampling parameters"""
+        temperature = body.get("temperature")
+        if temperature is not None and (
+            isinstance(temperature, bool) or not isinstance(temperature, (int, float)) or not 0 <= temperature <= 2
+        ):
+            raise APIError(400, "temperature must be a number from 0 to 2")
+        max_tokens = body.get("max_tokens")
+        if max_tokens is not None and (isinstance(max_tokens, bool) or not isinstance(max_tokens, int) or max_tokens < 1):
+            raise APIError(400, "max_tokens must be a positive integer")
+        
+        client = self.client_factory()
+        client.model = model
+        if temperature is not None:
+            client.temperature = temperature
+        if max_tokens is not None:
+            client.max_tokens = max_tokens
+        return client
+    
+    async def _load(self, conversation_id: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Load a conversation and its messages, raising a 404 error if it doesn't exist"""
+        conversation, messages = await run_in_threadpool(self.db_manager.get_conversation, conversation_id)
+        if conversation is None:
+            raise APIError(404, "Conversation not found")
+        return conversation, messages
+    
+    @staticmethod
+    async def _json(request: Request) -> Dict[str, Any]:
+        """Parse a JSON object request body (an empty body counts as an empty object)"""
+        raw = await request.body()
+        if not raw:
+            return {}
+        try:
+            body = json.loads(raw)
+        except json.JSONDecodeError:
+            raise APIError(400, "The request body is not valid JSON")
+        if not isinstance(body, dict):
+            raise APIError(400, "The request body must be a JSON object")
+        return body
+    
+    @staticmethod
+    def _content(body: Dict[str, Any]) -> str:
+        """Get the message text of a request body"""
+        content = body.get("content")
+        if not isinstance(content, str) or not content:
+            raise APIError(400, "content must be a non-empty string")
+        return content
+    
+    @staticmethod
+    def _event(name: str, data: Dict[str, Any]) -> str:
+        """Format a server-sent event"""
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    @staticmethod
+    def _llm_error(error: LLMRequestError) -> Response:
+        """Build the response for a failed provider request"""
+        headers = {}
+        if error.retry_after:
+            headers["Retry-After"] = str(int(error.retry_after + 0.999))
+        return JSONResponse(
+            {"error": str(error), "status_code": error.status_code, "retryable": error.retryable},
+            status_code=503 if error.retryable else 502,
+            headers=headers
+        )
+    
+    @staticmethod
+    def _encode_cursor(cursor: Optional[Tuple[str, str]]) -> Optional[str]:
+        """Turn a list_conversations() cursor into an opaque string"""
+        if cursor is None:
+            return None
+        return base64.urlsafe_b64encode(json.dumps(list(cursor)).encode()).decode()
+    
+    @staticmethod
+    def _decode_cursor(value: Optional[str]) -> Optional[Tuple[str, str]]:
+        """Turn a cursor string back into a list_conversations() cursor"""
+        if not value:
+            return None
+        try:
+            # Valid base64 and JSON can still hold something other than two strings
+            updated_at, conversation_id = json.loads(base64.urlsafe_b64decode(value.encode()))
+        except (TypeError, ValueError):
+            raise APIError(400, "Invalid cursor")
+        if not isinstance(updated_at, str) or not isinstance(conversation_id, str):
+            raise APIError(400, "Invalid cursor")
+        return updated_at, conversation_id
+
+async def _api_error(request: Request, error: APIError) -> Response:
+    """Return an APIError as a JSON body"""
+    return JSONResponse({"error": str(error)}, status_code=error.status_code)
+
+def create_app(db_manager: Optional[DBManager] = None, default_model: str = "gpt-3.5-turbo",
+               client_factory: Callable[[], AsyncChatClient] = AsyncChatClient) -> Starlette:
+    """
+    Create the ASGI application
+    
+    Args:
+        db_manager: Database the conversations are stored in (default: None, the app's database)
+        default_model: Model used when neither the request nor the conversation names one (default: gpt-3.5-turbo)
+        client_factory: Function creating the chat client used for each request (default: AsyncChatClient)
+    
+    Returns:
+        The Starlette application; run it with any ASGI server, e.g. uvicorn
+    """
+    owns_db = db_manager is None
+    api = ChatAPI(db_manager or DBManager(), default_model, client_factory)
+    
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        yield
+        # Only close a database this function opened
+        if owns_db:
+            api.db_manager.close()
+    
+    return Starlette(
+        routes=api.routes(),
+        exception_handlers={APIError: _api_error},
+        lifespan=lifespan
+    )
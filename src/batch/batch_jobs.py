@@ -0,0 +1,405 @@
+"""
+Offline jobs through the providers' batch APIs
+Packs requests into provider batches, tracks the jobs in SQLite and saves the results as conversations
+"""
+import io
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from src.db.db_manager import DBManager
+from src.llm.chat_client import ChatClient
+from src.llm.client_registry import get_registry
+from src.llm.scheduler import LLMRequestError, get_scheduler
+from src.monitoring.logs import log_event
+
+logger = logging.getLogger(__name__)
+
+class BatchJobManager:
+    """Submits requests to provider batch endpoints, polls them and collects the results"""
+    
+    # Largest number of requests each provider accepts in one batch
+    MAX_REQUESTS_PER_BATCH = {"openai": 50000, "anthropic": 100000}
+    
+    # Local job states that haven't produced results yet. Jobs are recorded as
+    # 'submitting' before they are sent, so a job interrupted mid-submission is
+    # sent again by the next run. Finished jobs are 'ended' until their results
+    # are saved, then 'collected'; jobs the provider rejected are 'failed'.
+    PENDING_STATES = ("submitting", "submitted", "in_progress")
+    
+    def __init__(self, db_manager: DBManager, openai_api_key: str = None, anthropic_api_key: str = None,
+                 openai_base_url: str = None, anthropic_base_url: str = None,
+                 temperature: float = 0.7, max_tokens: int = 1000,
+                 poll_interval: float = 10.0, max_poll_interval: float = 300.0):
+        """
+        Initialize the batch job manager
+        
+        Args:
+            db_manager: Database that tracks the jobs and receives the results
+            openai_api_key: OpenAI API key (default: None, uses OPENAI_API_KEY)
+            anthropic_api_key: Anthropic API key (default: None, uses ANTHROPIC_API_KEY)
+            openai_base_url: Override for the OpenAI API base URL (default: None, uses OPENAI_BASE_URL or the SDK default)
+            anthropic_base_url: Override for the Anthropic API base URL (default: None, uses ANTHROPIC_BASE_URL or the SDK default)
+            temperature: Sampling temperature for every request (default: 0.7)
+            max_tokens: Maximum response length for every request (default: 1000)
+            poll_interval: Seconds between the first status checks (default: 10)
+            max_poll_interval: Longest wait between status checks (default: 300)
+        """
+        self.db_manager = db_manager
+        self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
+        self.anthropic_api_key = anthropic_api_key or os.getenv("ANTHROPIC_API_KEY")
+        self.openai_base_url = openai_base_url
+        self.anthropic_base_url = anthropic_base_url
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        
+        self._clients: Dict[str, Any] = {}
+    
+    def run(self, items: Iterable[Dict[str, Any]], model: str, run: str, timeout: float = None) -> Dict[str, int]:
+        """
+        Send items through the batch APIs and save their results, resuming an earlier run
+        
+        Items already saved by this run, or waiting in one of its jobs, are not
+        submitted again, so an interrupted run just picks up where it left off.
+        
+        Args:
+            items: Items with 'id' and 'messages' and optionally 'model' and 'title'
+            model: Model for items that don't name one
+            run: Name of the run, used to find its earlier jobs and saved results
+            timeout: Seconds to wait for the jobs before giving up (default: None, no limit)
+        
+        Returns:
+            A dictionary with the number of submitted, succeeded, failed and skipped items
+        """
+        completed = self.db_manager.get_batch_item_ids(run)
+        queued = set()
+        for job in self.db_manager.list_batch_jobs(run=run, statuses=self.PENDING_STATES + ("ended",)):
+            queued.update(request["custom_id"] for request in self.db_manager.get_batch_job_requests(job["id"]))
+        
+        stats = {"submitted": 0, "succeeded": 0, "failed": 0, "skipped": 0}
+        by_model: Dict[str, List[Dict[str, Any]]] = {}
+        for item in items:
+            if item["id"] in completed or item["id"] in queued:
+                stats["skipped"] += 1
+                continue
+            by_model.setdefault(item.get("model") or model, []).append(item)
+        
+        for item_model, model_items in by_model.items():
+            self.submit(model_items, item_model, run=run)
+            stats["submitted"] += len(model_items)
+        
+        # Send jobs an earlier run recorded but didn't manage to submit
+        for job in self.db_manager.list_batch_jobs(run=run, statuses=["submitting"]):
+            self._send(job)
+        
+        self.wait(timeout=timeout, run=run)
+        
+        for job in self.db_manager.list_batch_jobs(run=run, statuses=["ended"]):
+            job_stats = self.collect(job["id"])
+            stats["succeeded"] += job_stats["succeeded"]
+            stats["failed"] += job_stats["failed"]
+        
+        return stats
+    
+    def submit(self, items: List[Dict[str, Any]], model: str, run: str = None) -> List[str]:
+        """
+        Submit items to the provider's batch API
+        
+        Items are split into several jobs if they exceed the provider's batch size.
+        
+        Args:
+            items: Items with 'id' and 'messages' (ending with a user message) and optionally 'title'
+            model: Display or API name of the model that answers every item
+            run: Name of the run the jobs belong to (default: None)
+        
+        Returns:
+            The IDs of the created jobs
+        
+        Raises:
+            LLMRequestError: If a batch couldn't be submitted
+        """
+        provider = self._provider(model)
+        size = self.MAX_REQUESTS_PER_BATCH[provider]
+        job_ids = []
+        
+        for start in range(0, len(items), size):
+            requests = [
+                {"custom_id": item["id"], "title": item.get("title"), "messages": item["messages"]}
+                for item in items[start:start + size]
+            ]
+            job_id = self.db_manager.create_batch_job(
+                {"run": run, "provider": provider, "model": model, "status": "submitting"},
+                requests
+            )
+            self._send(self.db_manager.get_batch_job(job_id))
+            job_ids.append(job_id)
+        
+        return job_ids
+    
+    def refresh(self, job_id: str) -> Dict[str, Any]:
+        """
+        Check a job's progress with its provider
+        
+        Args:
+            job_id: ID of the job
+        
+        Returns:
+            The updated job
+        """
+        job = self.db_manager.get_batch_job(job_id)
+        if job is None or job["status"] not in ("submitted", "in_progress"):
+            return job
+        
+        if job["provider"] == "openai":
+            status, error = self._openai_status(job)
+        else:
+            status, error = self._anthropic_status(job)
+        
+        if status != job["status"] or error:
+            self.db_manager.update_batch_job(job_id, status=status, error=error)
+        return self.db_manager.get_batch_job(job_id)
+    
+    def wait(self, job_ids: Optional[Iterable[str]] = None, timeout: float = None, run: str = None) -> List[Dict[str, Any]]:
+        """
+        Poll jobs until they finish, backing off while nothing changes
+        
+        Args:
+            job_ids: Jobs to wait for (default: None, every pending job of the run)
+            timeout: Seconds to wait before giving up (default: None, no limit)
+            run: Run whose pending jobs to wait for when job_ids isn't given (default: None, any run)
+        
+        Returns:
+            The jobs in their latest state
+        """
+        if job_ids is None:
+            job_ids = [job["id"] for job in self.db_manager.list_batch_jobs(run=run, statuses=("submitted", "in_progress"))]
+        job_ids = list(job_ids)
+        
+        deadline = None if timeout is None else time.monotonic() + timeout
+        interval = self.poll_interval
+        
+        while True:
+            jobs = [self.refresh(job_id) for job_id in job_ids]
+            pending = [job for job in jobs if job and job["status"] in ("submitted", "in_progress")]
+            if not pending:
+                return jobs
+            
+            if deadline is not None and time.monotonic() >= deadline:
+                # The jobs keep running at the provider; running again later collects them
+                log_event(logger, "batch_jobs_wait_timeout", logging.WARNING, pending=len(pending))
+                return jobs
+            
+            # Batches take minutes to hours, so slow down the polling (with jitter) as the wait grows
+            delay = interval * random.uniform(0.8, 1.2)
+            if deadline is not None:
+                delay = min(delay, max(0.0, deadline - time.monotonic()))
+            time.sleep(delay)
+            interval = min(self.max_poll_interval, interval * 2)
+    
+    def collect(self, job_id: str) -> Dict[str, int]:
+        """
+        Save the results of a finished job as conversations
+        
+        Collecting is idempotent: results that were already saved are not saved again.
+        
+        Args:
+            job_id: ID of the job
+        
+        Returns:
+            A dictionary with the number of requests that succeeded and failed
+        """
+        job = self.db_manager.get_batch_job(job_id)
+        requests = {request["custom_id"]: request for request in self.db_manager.get_batch_job_requests(job_id)}
+        run = job["run"] or f"batch-job-{job_id}"
+        
+        if job["provider"] == "openai":
+            results = self._openai_results(job)
+        else:
+            results = self._anthropic_results(job)
+        
+        stats = {"succeeded": 0, "failed": 0}
+        for custom_id, text, error in results:
+            request = requests.pop(custom_id, None)
+            if request is None:
+                continue
+            
+            if error is not None:
+                log_event(logger, "batch_request_failed", logging.WARNING, job_id=job_id, custom_id=custom_id, error=error)
+                stats["failed"] += 1
+                continue
+            
+            prompt = request["messages"][-1]["content"]
+            self.db_manager.save_batch_result(
+                run,
+                custom_id,
+                request["title"] or prompt[:50] + ("..." if len(prompt) > 50 else ""),
+                job["model"],
+                request["messages"] + [{"role": "assistant", "content": text}]
+            )
+            stats["succeeded"] += 1
+        
+        # Requests without a result (e.g. the batch expired) count as failed
+        stats["failed"] += len(requests)
+        
+        self.db_manager.update_batch_job(job_id, status="collected", succeeded=stats["succeeded"], failed=stats["failed"])
+        return stats
+    
+    def _send(self, job: Dict[str, Any]):
+        """Submit a recorded job to its provider"""
+        requests = self.db_manager.get_batch_job_requests(job["id"])
+        
+        try:
+            if job["provider"] == "openai":
+                provider_batch_id = self._openai_submit(job, requests)
+            else:
+                provider_batch_id = self._anthropic_submit(job, requests)
+        except LLMRequestError as e:
+            self.db_manager.update_batch_job(job["id"], status="failed", error=str(e))
+            raise
+        
+        self.db_manager.update_batch_job(job["id"], provider_batch_id=provider_batch_id, status="submitted")
+    
+    @staticmethod
+    def _provider(model: str) -> str:
+        """Get the provider serving a model"""
+        if model.startswith("gpt"):
+            return "openai"
+        if model.startswith("claude"):
+            return "anthropic"
+        raise LLMRequestError(f"Unsupported model: {model}. Please select a different model.")
+    
+    def _client(self, provider: str) -> Any:
+        """Get the SDK client for a provider, creating it on first use"""
+        if provider not in self._clients:
+            if provider == "openai":
+                if not self.openai_api_key:
+                    raise LLMRequestError("Error: OpenAI API key not configured. Please add it to your .env file.", provider="openai")
+                self._clients[provider] = get_registry().openai_client(
+                    self.openai_api_key, base_url=self.openai_base_url, max_retries=0
+                )
+            else:
+                if not self.anthropic_api_key:
+                    raise LLMRequestError("Error: Anthropic API key not configured. Please add ANTHROPIC_API_KEY to your .env file.", provider="anthropic")
+                self._clients[provider] = get_registry().anthropic_client(
+                    self.anthropic_api_key, base_url=self.anthropic_base_url, max_retries=0
+                )
+        return self._clients[provider]
+    
+    def _openai_submit(self, job: Dict[str, Any], requests: List[Dict[str, Any]]) -> str:
+        """Upload the requests as a JSONL file and create an OpenAI batch"""
+        client = self._client("openai")
+        scheduler = get_scheduler("openai")
+        
+        lines = [
+            json.dumps({
+                "custom_id": request["custom_id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": job["model"],
+                    "messages": request["messages"],
+                    "temperature": self.temperature,
+                    "max_tokens": self.max_tokens
+                }
+            }, ensure_ascii=False)
+            for request in requests
+        ]
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+        
+        uploaded = scheduler.call(
+            lambda: client.files.create(file=(f"batch-{job['id']}.jsonl", io.BytesIO(payload)), purpose="batch")
+        )
+        batch = scheduler.call(
+            lambda: client.batches.create(
+                input_file_id=uploaded.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h",
+                metadata={"job_id": job["id"]}
+            )
+        )
+        return batch.id
+    
+    def _openai_status(self, job: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        """Map an OpenAI batch's status to a job state"""
+        batch = get_scheduler("openai").call(lambda: self._client("openai").batches.retrieve(job["provider_batch_id"]))
+        
+        if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+            return "in_progress", None
+        if batch.status == "failed":
+            errors = getattr(getattr(batch, "errors", None), "data", None) or []
+            return "failed", "; ".join(str(getattr(error, "message", error)) for error in errors) or "Batch failed"
+        # Completed, expired and cancelled batches may all hold results
+        return "ended", None
+    
+    def _openai_results(self, job: Dict[str, Any]) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+        """Read the output and error files of an OpenAI batch"""
+        client = self._client("openai")
+        scheduler = get_scheduler("openai")
+        batch = scheduler.call(lambda: client.batches.retrieve(job["provider_batch_id"]))
+        
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            
+            content = scheduler.call(lambda: client.files.content(file_id))
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                
+                result = json.loads(line)
+                response = result.get("response") or {}
+                if result.get("error") or response.get("status_code", 200) >= 400:
+                    error = result.get("error") or response.get("body", {}).get("error")
+                    yield result["custom_id"], None, json.dumps(error)
+                else:
+                    yield result["custom_id"], response["body"]["choices"][0]["message"]["content"], None
+    
+    def _anthropic_submit(self, job: Dict[str, Any], requests: List[Dict[str, Any]]) -> str:
+        """Create an Anthropic message batch"""
+        client = self._client("anthropic")
+        model = ChatClient.ANTHROPIC_MODEL_MAP.get(job["model"], job["model"])
+        
+        batch = get_scheduler("anthropic").call(
+            lambda: client.messages.batches.create(requests=[
+                {
+                    "custom_id": request["custom_id"],
+                    "params": {
+                        "model": model,
+                        "max_tokens": self.max_tokens,
+                        "temperature": self.temperature,
+                        "messages": [
+                            {"role": message["role"], "content": message["content"]}
+                            for message in request["messages"]
+                            if message["role"] in ("user", "assistant")
+                        ]
+                    }
+                }
+                for request in requests
+            ])
+        )
+        return batch.id
+    
+    def _anthropic_status(self, job: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        """Map an Anthropic batch's processing status to a job state"""
+        batch = get_scheduler("anthropic").call(
+            lambda: self._client("anthropic").messages.batches.retrieve(job["provider_batch_id"])
+        )
+        return ("ended" if batch.processing_status == "ended" else "in_progress"), None
+    
+    def _anthropic_results(self, job: Dict[str, Any]) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+        """Stream the results of an Anthropic batch"""
+        results = get_scheduler("anthropic").call(
+            lambda: self._client("anthropic").messages.batches.results(job["provider_batch_id"])
+        )
+        
+        for result in results:
+            if result.result.type == "succeeded":
+                text = "".join(block.text for block in result.result.message.content if block.type == "text")
+                yield result.custom_id, text, None
+            else:
+                error = getattr(result.result, "error", None)
+                yield result.custom_id, None, str(error) if error else result.result.type
@@ -0,0 +1,283 @@
+"""
+Headless batch runner for JSONL files of prompts
+Runs every prompt through ChatClient concurrently and saves the results as it goes
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, Optional, Set
+from src.db.db_manager import DBManager
+from src.llm.chat_client import ChatClient
+from src.llm.scheduler import LLMRequestError
+from src.monitoring.logs import log_event
+
+logger = logging.getLogger(__name__)
+
+def read_items(input_path: str, id_field: str = "id", prompt_field: str = "prompt",
+               stats: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Read and validate the items of a JSONL prompt file one line at a time
+    
+    Args:
+        input_path: Path to the JSONL file
+        id_field: Field holding each item's ID (default: 'id'; items without one use their line number)
+        prompt_field: Field holding each item's prompt (default: 'prompt')
+        stats: Counters whose 'invalid' entry is incremented for each unusable line (default: None)
+    
+    Yields:
+        Items with 'id', 'messages', 'model', 'title', 'temperature' and 'max_tokens'
+        (None where the line doesn't set them)
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            
+            try:
+                item = json.loads(line)
+                if "messages" in item:
+                    messages = [{"role": m["role"], "content": m["content"]} for m in item["messages"]]
+                else:
+                    messages = [{"role": "user", "content": item[prompt_field]}]
+                if not messages or messages[-1]["role"] != "user":
+                    raise ValueError("the last message must be from the user")
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                log_event(logger, "batch_item_skipped", logging.WARNING, input=input_path, line=line_number, error=str(e))
+                if stats is not None:
+                    stats["invalid"] += 1
+                continue
+            
+            yield {
+                "id": str(item.get(id_field, f"line-{line_number}")),
+                "messages": messages,
+                "model": item.get("model"),
+                "title": item.get("title"),
+                "temperature": item.get("temperature"),
+                "max_tokens": item.get("max_tokens")
+            }
+
+class BatchRunner:
+    """Runs the prompts of a JSONL file through ChatClient with bounded concurrency"""
+    
+    # Print a progress line after this many items
+    PROGRESS_INTERVAL = 100
+    
+    def __init__(self, model: str = "gpt-3.5-turbo", concurrency: int = 8, output_path: str = None,
+                 db_manager: Optional[DBManager] = None, run_name: str = None,
+                 id_field: str = "id", prompt_field: str = "prompt",
+                 temperature: float = None, max_tokens: int = None,
+                 client_factory: Callable[[], ChatClient] = ChatClient):
+        """
+        Initialize the batch runner
+        
+        Args:
+            model: Model used for items that don't name one (default: gpt-3.5-turbo)
+            concurrency: Number of prompts in flight at once (default: 8)
+            output_path: JSON Lines file to append results to (default: None)
+            db_manager: Database to save each result to as a conversation (default: None)
+            run_name: Name identifying the run in the database (default: None, the input file name)
+            id_field: Field holding each item's ID (default: 'id'; items without one use their line number)
+            prompt_field: Field holding each item's prompt (default: 'prompt')
+            temperature: Sampling temperature (default: None, the ChatClient default)
+            max_tokens: Maximum response length (default: None, the ChatClient default)
+            client_factory: Function creating the ChatClient used by each worker thread (default: ChatClient)
+        """
+        if output_path is None and db_manager is None:
+            raise ValueError("A batch run needs an output file, a database, or both")
+        
+        self.model = model
+        self.concurrency = concurrency
+        self.output_path = output_path
+        self.db_manager = db_manager
+        self.run_name = run_name
+        self.id_field = id_field
+        self.prompt_field = prompt_field
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.client_factory = client_factory
+        
+        self._local = threading.local()
+        self._output_lock = threading.Lock()
+        self._output = None
+    
+    def run(self, input_path: str) -> Dict[str, int]:
+        """
+        Run every item of a JSONL file that hasn't already completed
+        
+        Each line holds either {"id": ..., "prompt": "..."} or
+        {"id": ..., "messages": [{"role": ..., "content": ...}, ...]} ending
+        with a user message, and may set "model", "title", "temperature" and
+        "max_tokens". Results are saved as soon as each item finishes, so an
+        interrupted run can be started again and only sends what's left.
+        
+        Args:
+            input_path: Path to the JSONL file of prompts
+        
+        Returns:
+            A dictionary with the number of items that succeeded, failed, were
+            skipped because they had already completed, and were invalid
+        """
+        if self.run_name is None:
+            self.run_name = os.path.splitext(os.path.basename(input_path))[0]
+        
+        stats = {"succeeded": 0, "failed": 0, "skipped": 0, "invalid": 0}
+        completed = self.completed_ids()
+        start = time.perf_counter()
+        
+        self._open_output()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+                pending = set()
+                try:
+                    for item in self._items(input_path, stats):
+                        if item["id"] in completed:
+                            stats["skipped"] += 1
+                            continue
+                        
+                        # Only a couple of items per worker are queued, so huge files aren't read into memory
+                        if len(pending) >= self.concurrency * 2:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            self._collect(done, stats, start)
+                        pending.add(executor.submit(self._run_item, item))
+                    
+                    self._collect(pending, stats, start)
+                except BaseException:
+                    # Don't start queued items when interrupted; those in flight still finish and are saved
+                    for future in pending:
+                        future.cancel()
+                    raise
+        finally:
+            self._close_output()
+        
+        return stats
+    
+    def completed_ids(self) -> Set[str]:
+        """
+        Get the IDs of the items that already completed in earlier runs
+        
+        When writing to both an output file and a database, an item only
+        counts as completed if it was saved to both.
+        
+        Returns:
+            The set of completed item IDs
+        """
+        completed = None
+        
+        if self.output_path and os.path.exists(self.output_path):
+            completed = set()
+            with open(self.output_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line may have been cut short by a crash
+                        continue
+                    if result.get("error") is None:
+                        completed.add(result["id"])
+        elif self.output_path:
+            completed = set()
+        
+        if self.db_manager is not None:
+            saved = self.db_manager.get_batch_item_ids(self.run_name)
+            completed = saved if completed is None else completed & saved
+        
+        return completed
+    
+    def _items(self, input_path: str, stats: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+        """Read the items of the input file, filling in the runner's defaults"""
+        for item in read_items(input_path, self.id_field, self.prompt_field, stats):
+            item["model"] = item["model"] or self.model
+            if item["temperature"] is None:
+                item["temperature"] = self.temperature
+            item["max_tokens"] = item["max_tokens"] or self.max_tokens
+            yield item
+    
+    def _client(self) -> ChatClient:
+        """Get this worker thread's chat client"""
+        if not hasattr(self._local, "client"):
+            self._local.client = self.client_factory()
+            self._local.defaults = (self._local.client.temperature, self._local.client.max_tokens)
+        return self._local.client
+    
+    def _run_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one item and save its result"""
+        client = self._client()
+        default_temperature, default_max_tokens = self._local.defaults
+        
+        client.model = item["model"]
+        client.temperature = default_temperature if item["temperature"] is None else item["temperature"]
+        client.max_tokens = item["max_tokens"] or default_max_tokens
+        client.conversation_history = [dict(message) for message in item["messages"][:-1]]
+        client.last_usage = {}
+        prompt = item["messages"][-1]["content"]
+        
+        result = {"id": item["id"], "model": item["model"], "response": None, "error": None}
+        start = time.perf_counter()
+        
+        try:
+            result["response"] = client.get_response(prompt)
+        except LLMRequestError as e:
+            result["error"] = str(e)
+            result["status_code"] = e.status_code
+        
+        result["elapsed"] = round(time.perf_counter() - start, 3)
+        if client.last_usage:
+            result["usage"] = client.last_usage
+        
+        if result["error"] is None and self.db_manager is not None:
+            title = item["title"] or prompt[:50] + ("..." if len(prompt) > 50 else "")
+            result["conversation_id"] = self.db_manager.save_batch_result(
+                self.run_name,
+                item["id"],
+                title,
+                item["model"],
+                item["messages"] + [{"role": "assistant", "content": result["response"]}]
+            )
+        
+        self._write_output(result)
+        return result
+    
+    def _collect(self, futures, stats: Dict[str, int], start: float):
+        """Count finished items and report progress"""
+        for future in futures:
+            result = future.result()
+            stats["failed" if result["error"] else "succeeded"] += 1
+            
+            finished = stats["succeeded"] + stats["failed"]
+            if finished % self.PROGRESS_INTERVAL == 0:
+                elapsed = time.perf_counter() - start
+                log_event(logger, "batch_progress", finished=finished, failed=stats["failed"], items_per_second=finished / elapsed)
+    
+    def _open_output(self):
+        """Open the output file for appending, completing a line cut short by a crash"""
+        if not self.output_path:
+            return
+        
+        ends_cleanly = True
+        if os.path.exists(self.output_path) and os.path.getsize(self.output_path) > 0:
+            with open(self.output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                ends_cleanly = f.read(1) == b"\n"
+        
+        self._output = open(self.output_path, "a", encoding="utf-8")
+        if not ends_cleanly:
+            self._output.write("\n")
+    
+    def _write_output(self, result: Dict[str, Any]):
+        """Append a result to the output file"""
+        if self._output is None:
+            return
+        
+        line = json.dumps(result, ensure_ascii=False) + "\n"
+        with self._output_lock:
+            self._output.write(line)
+            self._output.flush()
+    
+    def _close_output(self):
+        """Close the output file"""
+        if self._output is not None:
+            self._output.close()
+            self._output = None
@@ -2,22 +2,94 @@
 Database Manager for the ZeroCode LLM Chat Client
 Handles saving and loading chat histories using SQLite
 """
+import hashlib
+import logging
 import os
+import queue
+import re
 import sqlite3
 import json
-from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
 import uuid
+import zlib
+from src.monitoring.metrics import DB_OPERATION_DURATION, timed
+
+logger = logging.getLogger(__name__)
 
 class DBManager:
     """Database Manager for chat history persistence"""
     
-    def __init__(self, db_path: str = None):
+    # Per-connection settings. The database runs in WAL mode so readers in other
+    # sessions don't block the writer, and synchronous=NORMAL is safe under WAL.
+    CONNECTION_PRAGMAS = {
+        "synchronous": "NORMAL",
+        "cache_size": -64000,      # 64 MB page cache (negative values are KiB)
+        "mmap_size": 268435456,    # 256 MB of memory-mapped I/O
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000       # Wait up to 5 s for a lock instead of failing
+    }
+    
+    # Ordered schema migrations as (version, description, method name). Existing
+    # databases are upgraded in place on startup; never change a released
+    # migration, append a new one instead.
+    MIGRATIONS = [
+        (1, "Create conversations and messages tables", "_migration_initial_schema"),
+        (2, "Index messages by conversation and conversations by update time", "_migration_add_indexes"),
+        (3, "Index conversations for keyset pagination", "_migration_add_listing_index"),
+        (4, "Add full-text search over messages and conversation titles", "_migration_add_full_text_search"),
+        (5, "Record content hashes of imported conversations", "_migration_add_content_hash"),
+        (6, "Track completed batch run items", "_migration_add_batch_items"),
+        (7, "Track provider batch jobs", "_migration_add_batch_jobs"),
+        (8, "Keep message and token counts and the last message on each conversation", "_migration_add_conversation_stats"),
+        (9, "Store large message bodies zlib-compressed", "_migration_add_message_compression"),
+        (10, "Record the archive file of archived conversations", "_migration_add_archive")
+    ]
+    
+    # Rows copied per statement when backfilling the search index
+    FTS_BACKFILL_BATCH_SIZE = 10000
+    
+    # Matches are ranked by relevance in tiers of this many, newest tier first
+    FTS_RANK_WINDOW = 1000
+    
+    # Messages written per transaction by a bulk import
+    IMPORT_BATCH_SIZE = 5000
+    
+    # Statistics kept on each conversation row by triggers, returned with the listing
+    LISTING_STATS = ["message_count", "token_count", "last_message_at", "last_message_preview"]
+    
+    # Message bodies of at least this many bytes (UTF-8) are stored zlib-compressed,
+    # if that makes them smaller; see benchmarks/bench_compression.py
+    COMPRESSION_MIN_BYTES = 1024
+    COMPRESSION_LEVEL = 6
+    
+    # Value of messages.codec for compressed bodies (NULL means plain text in content)
+    ZLIB_CODEC = "zlib"
+    
+    # Characters of a compressed body kept in content_preview, as many as the statistics triggers use
+    PREVIEW_LENGTH = 100
+    
+    # Columns of messages holding a body, in the order _encode_content() returns them
+    CONTENT_COLUMNS = "content, codec, content_blob, content_length, content_preview"
+    
+    # Columns of messages copied to and from archive files
+    MESSAGE_COLUMNS = "id, conversation_id, role, content, timestamp, codec, content_blob"
+    
+    # Conversations moved per transaction by archive_conversations()
+    ARCHIVE_BATCH_SIZE = 100
+    
+    # Free pages given back to the file system per compact() step
+    COMPACT_STEP_PAGES = 256
+    
+    def __init__(self, db_path: str = None, pool_size: int = 8):
         """
         Initialize the database manager
         
         Args:
             db_path: Path to SQLite database file (default: creates 'chat_history.db' in the user's home directory)
+            pool_size: Maximum number of idle connections kept open for reuse (default: 8)
         """
         if db_path is None:
             # Create a data directory in the user's home directory
@@ -27,19 +99,163 @@ class DBManager:
             # Create directory if it doesn't exist
             if not os.path.exists(app_dir):
                 os.makedirs(app_dir)
-                
+            
             self.db_path = os.path.join(app_dir, "chat_history.db")
         else:
             self.db_path = db_path
         
+        # Archived conversations are kept in per-month files next to the database
+        self.archive_dir = os.path.join(os.path.dirname(os.path.abspath(self.db_path)), "archive")
+        
+        # Idle connections, shared by every thread using this manager
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        
+        # Read-only connection used by data_version() to notice changes made through any other connection
+        self._version_conn: Optional[sqlite3.Connection] = None
+        self._version_lock = threading.Lock()
+        
         # Initialize the database
         self._init_db()
     
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a new database connection with the tuned pragmas applied
+        
+        Returns:
+            A new SQLite connection
+        """
+        # The pool hands connections between threads, but only one thread uses a connection at a time
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        
+        for pragma, value in self.CONNECTION_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        
+        return conn
+    
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a pooled connection for the duration of a with-block
+        
+        Yields:
+            An open SQLite connection
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        
+        try:
+            yield conn
+        finally:
+            # Never return a connection to the pool with a transaction still open
+            if conn.in_transaction:
+                conn.rollback()
+            
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    def close(self):
+        """Close all idle pooled connections"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+        
+        with self._version_lock:
+            if self._version_conn is not None:
+                self._version_conn.close()
+                self._version_conn = None
+    
+    def data_version(self) -> int:
+        """
+        Get a number that changes whenever the database is modified
+        
+        This is SQLite's PRAGMA data_version on a connection that never
+        writes, so it changes after every commit made through any other
+        connection, by this manager or by another process. Reading it touches
+        no tables, so the UI checks it on every rerun to decide whether its
+        cached query results are still current.
+        
+        Returns:
+            The current data version, only meaningful compared with earlier values
+        """
+        with self._version_lock:
+            if self._version_conn is None:
+                self._version_conn = self._connect()
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+    
     def _init_db(self):
-        """Initialize the database and create tables if they don't exist"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Initialize the database and bring its schema up to date"""
+        with self._connection() as conn:
+            # Lets compact() give free pages back in small steps. This only takes effect
+            # on a new database; enable_incremental_vacuum() converts an existing one.
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            
+            # WAL is a persistent property of the database file, so it only needs setting once
+            conn.execute("PRAGMA journal_mode = WAL")
+            
+            self._migrate(conn)
+    
+    def _migrate(self, conn: sqlite3.Connection):
+        """
+        Apply any migrations the database hasn't seen yet
         
+        Each migration runs in its own transaction together with its
+        schema_version row, so a failed migration leaves the database at the
+        previous version.
+        
+        Args:
+            conn: Connection to migrate
+        """
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP
+        )
+        ''')
+        
+        for version, description, method in self.MIGRATIONS:
+            if version <= self._schema_version(conn):
+                continue
+            
+            # Take the write lock first so concurrent processes don't apply the same migration twice
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if version > self._schema_version(conn):
+                    getattr(self, method)(conn.cursor())
+                    conn.execute(
+                        "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                        (version, description, datetime.now().isoformat())
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    @staticmethod
+    def _schema_version(conn: sqlite3.Connection) -> int:
+        """Get the latest migration version applied to the database"""
+        return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+    
+    def get_schema_version(self) -> int:
+        """
+        Get the schema version of the database
+        
+        Returns:
+            The latest migration version applied
+        """
+        with self._connection() as conn:
+            return self._schema_version(conn)
+    
+    def _migration_initial_schema(self, cursor: sqlite3.Cursor):
+        """Create the original tables (a no-op for databases that predate migrations)"""
         # Create conversations table
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS conversations (
@@ -63,10 +279,334 @@ class DBManager:
             FOREIGN KEY (conversation_id) REFERENCES conversations (id)
         )
         ''')
+    
+    def _migration_add_indexes(self, cursor: sqlite3.Cursor):
+        """Add indexes so per-conversation lookups and the sidebar ordering don't scan whole tables"""
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, id)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_conversations_updated_at ON conversations (updated_at)"
+        )
+    
+    def _migration_add_listing_index(self, cursor: sqlite3.Cursor):
+        """Replace the updated_at index with one that also orders ties by ID for keyset pagination"""
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_conversations_updated_at_id ON conversations (updated_at, id)"
+        )
+        cursor.execute("DROP INDEX IF EXISTS idx_conversations_updated_at")
+    
+    def _migration_add_full_text_search(self, cursor: sqlite3.Cursor):
+        """Create FTS5 indexes kept in sync by triggers, and backfill them from existing rows"""
+        # Message bodies are indexed without a second copy of the text (external content)
+        cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            content,
+            content='messages',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''')
+        
+        # Conversation IDs are text, and the implicit rowid of conversations isn't stable
+        # across VACUUM, so titles are stored alongside the ID instead
+        cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+            title,
+            conversation_id UNINDEXED,
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''')
+        
+        # Keep both indexes in sync with every write
+        triggers = [
+            '''CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+                INSERT INTO conversations_fts (title, conversation_id) VALUES (new.title, new.id);
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+                DELETE FROM conversations_fts WHERE conversation_id = old.id;
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE OF title ON conversations BEGIN
+                UPDATE conversations_fts SET title = new.title WHERE conversation_id = old.id;
+            END'''
+        ]
+        for trigger in triggers:
+            cursor.execute(trigger)
+        
+        # Backfill existing rows in batches to bound the memory used by each statement
+        last_id = 0
+        while True:
+            cursor.execute(
+                "SELECT MAX(id) FROM (SELECT id FROM messages WHERE id > ? ORDER BY id LIMIT ?)",
+                (last_id, self.FTS_BACKFILL_BATCH_SIZE)
+            )
+            batch_end = cursor.fetchone()[0]
+            if batch_end is None:
+                break
+            
+            cursor.execute(
+                "INSERT INTO messages_fts (rowid, content) SELECT id, content FROM messages WHERE id > ? AND id <= ?",
+                (last_id, batch_end)
+            )
+            last_id = batch_end
+        
+        cursor.execute(
+            "INSERT INTO conversations_fts (title, conversation_id) SELECT title, id FROM conversations"
+        )
+    
+    def _migration_add_content_hash(self, cursor: sqlite3.Cursor):
+        """Add a content hash column so bulk imports can skip conversations they've already imported"""
+        cursor.execute("ALTER TABLE conversations ADD COLUMN content_hash TEXT")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_conversations_content_hash ON conversations (content_hash)"
+        )
+    
+    def _migration_add_batch_items(self, cursor: sqlite3.Cursor):
+        """Record which batch run items have been saved, so interrupted runs can resume"""
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS batch_items (
+            run TEXT,
+            item_id TEXT,
+            conversation_id TEXT,
+            completed_at TIMESTAMP,
+            PRIMARY KEY (run, item_id),
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+        )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_batch_items_conversation ON batch_items (conversation_id)"
+        )
+    
+    def _migration_add_batch_jobs(self, cursor: sqlite3.Cursor):
+        """Record jobs submitted to provider batch APIs and the requests packed into them"""
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS batch_jobs (
+            id TEXT PRIMARY KEY,
+            run TEXT,
+            provider TEXT,
+            model TEXT,
+            provider_batch_id TEXT,
+            status TEXT,
+            request_count INTEGER,
+            succeeded INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS batch_job_requests (
+            job_id TEXT,
+            custom_id TEXT,
+            title TEXT,
+            messages TEXT,
+            PRIMARY KEY (job_id, custom_id),
+            FOREIGN KEY (job_id) REFERENCES batch_jobs (id)
+        )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_batch_jobs_run ON batch_jobs (run, status)"
+        )
+    
+    def _migration_add_conversation_stats(self, cursor: sqlite3.Cursor):
+        """Add per-conversation statistics kept up to date by triggers, and backfill them"""
+        columns = [
+            "message_count INTEGER NOT NULL DEFAULT 0",
+            "token_count INTEGER NOT NULL DEFAULT 0",
+            "last_message_at TIMESTAMP",
+            "last_message_preview TEXT"
+        ]
+        for column in columns:
+            cursor.execute(f"ALTER TABLE conversations ADD COLUMN {column}")
+        
+        # Updated in the same statement as each message write, whichever code path
+        # makes it. Tokens are estimated at 4 characters each, like ContextWindow does
+        # for models without a tokenizer, and previews keep the first 100 characters.
+        triggers = [
+            '''CREATE TRIGGER IF NOT EXISTS conversation_stats_insert AFTER INSERT ON messages BEGIN
+                UPDATE conversations SET
+                    message_count = message_count + 1,
+                    token_count = token_count + (length(new.content) + 3) / 4,
+                    last_message_at = new.timestamp,
+                    last_message_preview = substr(new.content, 1, 100)
+                WHERE id = new.conversation_id;
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS conversation_stats_delete AFTER DELETE ON messages BEGIN
+                UPDATE conversations SET
+                    message_count = message_count - 1,
+                    token_count = token_count - (length(old.content) + 3) / 4,
+                    (last_message_at, last_message_preview) = (
+                        SELECT timestamp, substr(content, 1, 100) FROM messages
+                        WHERE conversation_id = old.conversation_id ORDER BY id DESC LIMIT 1
+                    )
+                WHERE id = old.conversation_id;
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS conversation_stats_update AFTER UPDATE OF content ON messages BEGIN
+                UPDATE conversations SET
+                    token_count = token_count - (length(old.content) + 3) / 4 + (length(new.content) + 3) / 4,
+                    last_message_preview = (
+                        SELECT substr(content, 1, 100) FROM messages
+                        WHERE conversation_id = new.conversation_id ORDER BY id DESC LIMIT 1
+                    )
+                WHERE id = new.conversation_id;
+            END'''
+        ]
+        for trigger in triggers:
+            cursor.execute(trigger)
+        
+        # Backfill from existing messages, one index range per conversation
+        cursor.execute('''
+        UPDATE conversations SET
+            (message_count, token_count) = (
+                SELECT COUNT(*), COALESCE(SUM((length(content) + 3) / 4), 0) FROM messages
+                WHERE conversation_id = conversations.id
+            ),
+            (last_message_at, last_message_preview) = (
+                SELECT timestamp, substr(content, 1, 100) FROM messages
+                WHERE conversation_id = conversations.id ORDER BY id DESC LIMIT 1
+            )
+        ''')
+    
+    def _migration_add_message_compression(self, cursor: sqlite3.Cursor):
+        """Add compressed body columns, and make the triggers skip or read around compressed rows"""
+        cursor.execute("ALTER TABLE messages ADD COLUMN codec TEXT")
+        cursor.execute("ALTER TABLE messages ADD COLUMN content_blob BLOB")
         
-        conn.commit()
-        conn.close()
+        # Compressed rows carry the length of their text and a preview, so the
+        # statistics triggers never need to decompress them
+        cursor.execute("ALTER TABLE messages ADD COLUMN content_length INTEGER")
+        cursor.execute("ALTER TABLE messages ADD COLUMN content_preview TEXT")
+        
+        # Existing rows stay as they are; codec is NULL for them
+        for trigger in ["messages_fts_insert", "messages_fts_delete", "messages_fts_update",
+                        "conversation_stats_insert", "conversation_stats_delete", "conversation_stats_update"]:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        
+        # Plain-text rows are indexed here. DBManager indexes compressed rows
+        # itself, with the text it has in hand when it writes them.
+        triggers = [
+            '''CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages WHEN new.codec IS NULL BEGIN
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END''',
+            '''CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages WHEN old.codec IS NULL BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END''',
+            '''CREATE TRIGGER messages_fts_update AFTER UPDATE OF content, codec ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content)
+                SELECT 'delete', old.id, old.content WHERE old.codec IS NULL;
+                INSERT INTO messages_fts (rowid, content)
+                SELECT new.id, new.content WHERE new.codec IS NULL;
+            END''',
+            '''CREATE TRIGGER conversation_stats_insert AFTER INSERT ON messages BEGIN
+                UPDATE conversations SET
+                    message_count = message_count + 1,
+                    token_count = token_count + (COALESCE(new.content_length, length(new.content), 0) + 3) / 4,
+                    last_message_at = new.timestamp,
+                    last_message_preview = substr(COALESCE(new.content, new.content_preview), 1, 100)
+                WHERE id = new.conversation_id;
+            END''',
+            '''CREATE TRIGGER conversation_stats_delete AFTER DELETE ON messages BEGIN
+                UPDATE conversations SET
+                    message_count = message_count - 1,
+                    token_count = token_count - (COALESCE(old.content_length, length(old.content), 0) + 3) / 4,
+                    (last_message_at, last_message_preview) = (
+                        SELECT timestamp, substr(COALESCE(content, content_preview), 1, 100) FROM messages
+                        WHERE conversation_id = old.conversation_id ORDER BY id DESC LIMIT 1
+                    )
+                WHERE id = old.conversation_id;
+            END''',
+            '''CREATE TRIGGER conversation_stats_update AFTER UPDATE OF content, content_length, content_preview ON messages BEGIN
+                UPDATE conversations SET
+                    token_count = token_count
+                        - (COALESCE(old.content_length, length(old.content), 0) + 3) / 4
+                        + (COALESCE(new.content_length, length(new.content), 0) + 3) / 4,
+                    last_message_preview = (
+                        SELECT substr(COALESCE(content, content_preview), 1, 100) FROM messages
+                        WHERE conversation_id = new.conversation_id ORDER BY id DESC LIMIT 1
+                    )
+                WHERE id = new.conversation_id;
+            END'''
+        ]
+        for trigger in triggers:
+            cursor.execute(trigger)
+    
+    def _migration_add_archive(self, cursor: sqlite3.Cursor):
+        """Add the column naming the archive file that holds a conversation's messages"""
+        cursor.execute("ALTER TABLE conversations ADD COLUMN archive TEXT")
     
+    @classmethod
+    def _encode_content(cls, content: str) -> Tuple[Optional[str], Optional[str], Optional[bytes], Optional[int], Optional[str]]:
+        """
+        Choose how to store a message body
+        
+        Args:
+            content: The message text
+        
+        Returns:
+            The values of CONTENT_COLUMNS: the text and nothing else, or no
+            text, the codec, the compressed UTF-8 bytes, the length of the
+            text and its first PREVIEW_LENGTH characters
+        """
+        plain = (content, None, None, None, None)
+        if content is None or len(content) < cls.COMPRESSION_MIN_BYTES // 4:
+            # Too short to reach the threshold even at 4 bytes per character
+            return plain
+        
+        data = content.encode("utf-8")
+        if len(data) < cls.COMPRESSION_MIN_BYTES:
+            return plain
+        
+        compressed = zlib.compress(data, cls.COMPRESSION_LEVEL)
+        if len(compressed) >= len(data):
+            # Already compressed or random data
+            return plain
+        return None, cls.ZLIB_CODEC, compressed, len(content), content[:cls.PREVIEW_LENGTH]
+    
+    @classmethod
+    def _message_text(cls, content: Optional[str], codec: Optional[str], content_blob: Optional[bytes]) -> Optional[str]:
+        """
+        Get the text of a stored message body
+        
+        Args:
+            content: The content column
+            codec: The codec column (None for plain text)
+            content_blob: The content_blob column
+        
+        Returns:
+            The message text
+        
+        Raises:
+            ValueError: If the codec is unknown
+        """
+        if codec is None:
+            return content
+        if codec != cls.ZLIB_CODEC:
+            raise ValueError(f"Unknown message codec: {codec}")
+        return zlib.decompress(content_blob).decode("utf-8")
+    
+    @classmethod
+    def _message_from_row(cls, row: sqlite3.Row) -> Dict[str, Any]:
+        """Convert a messages row to a dictionary, decompressing its body"""
+        message = dict(row)
+        codec = message.pop("codec", None)
+        content_blob = message.pop("content_blob", None)
+        message.pop("content_length", None)
+        message.pop("content_preview", None)
+        message["content"] = cls._message_text(message.get("content"), codec, content_blob)
+        return message
+    
+    @timed(DB_OPERATION_DURATION)
     def create_conversation(self, title: str = None, model: str = "gpt-3.5-turbo") -> str:
         """
         Create a new conversation
@@ -74,7 +614,7 @@ class DBManager:
         Args:
             title: Title for the conversation (default: timestamp)
             model: The model used for the conversation
-            
+        
         Returns:
             The ID of the created conversation
         """
@@ -84,19 +624,19 @@ class DBManager:
         conversation_id = str(uuid.uuid4())
         now = datetime.now().isoformat()
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "INSERT INTO conversations (id, title, model, created_at, updated_at, summary) VALUES (?, ?, ?, ?, ?, ?)",
-            (conversation_id, title, model, now, now, "")
-        )
-        
-        conn.commit()
-        conn.close()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                "INSERT INTO conversations (id, title, model, created_at, updated_at, summary) VALUES (?, ?, ?, ?, ?, ?)",
+                (conversation_id, title, model, now, now, "")
+            )
+            
+            conn.commit()
         
         return conversation_id
     
+    @timed(DB_OPERATION_DURATION)
     def add_message(self, conversation_id: str, role: str, content: str) -> int:
         """
         Add a message to a conversation
@@ -105,90 +645,192 @@ class DBManager:
             conversation_id: ID of the conversation to add the message to
             role: Role of the sender (user or assistant)
             content: Content of the message
-            
+        
         Returns:
             The ID of the created message
         """
         now = datetime.now().isoformat()
         
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        with self._connection() as conn:
+            message_id, archive = self._insert_message(conn.cursor(), conversation_id, role, content, now)
+            if archive is None:
+                conn.commit()
+                return message_id
+            conn.rollback()
         
-        # Add the message
-        cursor.execute(
-            "INSERT INTO messages (conversation_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
-            (conversation_id, role, content, now)
-        )
+        # The conversation is archived: move its messages back, then write again
+        self.restore_conversation(conversation_id)
+        return self.add_message(conversation_id, role, content)
+    
+    @timed(DB_OPERATION_DURATION)
+    def add_messages(self, messages: Iterable[Tuple[str, str, str]]) -> List[int]:
+        """
+        Add several messages, to any conversations, in a single transaction
         
-        message_id = cursor.lastrowid
+        One commit for the whole group costs a single sync to disk, which is
+        what makes the write-behind writer cheaper than separate add_message() calls.
         
-        # Update the conversation's updated_at timestamp
-        cursor.execute(
-            "UPDATE conversations SET updated_at = ? WHERE id = ?",
-            (now, conversation_id)
-        )
+        Args:
+            messages: (conversation ID, role, content) of each message, in order
+        
+        Returns:
+            The IDs of the created messages, in the same order
+        """
+        messages = list(messages)
+        now = datetime.now().isoformat()
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            message_ids, archived = [], set()
+            for conversation_id, role, content in messages:
+                message_id, archive = self._insert_message(cursor, conversation_id, role, content, now)
+                message_ids.append(message_id)
+                if archive is not None:
+                    archived.add(conversation_id)
+            if not archived:
+                conn.commit()
+                return message_ids
+            conn.rollback()
+        
+        # Some conversations are archived: move their messages back, then write again
+        for conversation_id in archived:
+            self.restore_conversation(conversation_id)
+        return self.add_messages(messages)
+    
+    @classmethod
+    def _insert_message(cls, cursor: sqlite3.Cursor, conversation_id: str, role: str, content: str,
+                        now: str) -> Tuple[int, Optional[str]]:
+        """
+        Insert a message and update its conversation, without committing
+        
+        Args:
+            cursor: Cursor of the connection to write with
+            conversation_id: ID of the conversation to add the message to
+            role: Role of the sender (user or assistant)
+            content: Content of the message
+            now: Timestamp of the message
         
-        # If this is the first user message, use it as a summary
+        Returns:
+            The ID of the created message, and the conversation's archive file;
+            if that isn't None, the caller must roll back and restore the
+            conversation first
+        """
+        # Add the message, compressing a large body
+        stored = cls._encode_content(content)
         cursor.execute(
-            "SELECT COUNT(*) FROM messages WHERE conversation_id = ?",
-            (conversation_id,)
+            f"INSERT INTO messages (conversation_id, role, {cls.CONTENT_COLUMNS}, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (conversation_id, role, *stored, now)
         )
-        count = cursor.fetchone()[0]
         
-        if count == 1 and role == "user":
-            # Use the first few words as a summary
-            summary = content[:50] + ("..." if len(content) > 50 else "")
-            cursor.execute(
-                "UPDATE conversations SET summary = ? WHERE id = ?",
-                (summary, conversation_id)
-            )
-            
-        conn.commit()
-        conn.close()
+        message_id = cursor.lastrowid
+        if stored[1] is not None:
+            cls._index_compressed(cursor, [(message_id, content)])
+        
+        # Update the conversation's updated_at timestamp, and if this is the first
+        # user message, use its first few words as a summary. The insert trigger
+        # has already counted the message.
+        # The same statement tells whether the conversation is archived, so the
+        # common case costs no extra lookup
+        summary = content[:50] + ("..." if len(content) > 50 else "")
+        row = cursor.execute(
+            """UPDATE conversations SET
+                   updated_at = ?,
+                   summary = CASE WHEN message_count = 1 AND ? = 'user' THEN ? ELSE summary END
+               WHERE id = ?
+               RETURNING archive""",
+            (now, role, summary, conversation_id)
+        ).fetchone()
         
-        return message_id
+        return message_id, row[0] if row else None
     
-    def get_conversation(self, conversation_id: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    @timed(DB_OPERATION_DURATION)
+    def get_conversation(self, conversation_id: str,
+                         message_limit: Optional[int] = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
         """
         Get a conversation and its messages
         
         Args:
             conversation_id: ID of the conversation to retrieve
-            
+            message_limit: Only return this many of the most recent messages (default: None, returns them all)
+        
         Returns:
             A tuple containing the conversation metadata and list of messages
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            # Get conversation metadata
+            cursor.execute(
+                "SELECT * FROM conversations WHERE id = ?",
+                (conversation_id,)
+            )
+            conversation_row = cursor.fetchone()
+            
+            if not conversation_row:
+                return None, []
+            
+            conversation = dict(conversation_row)
+            
+            # Get messages (IDs are assigned in the order messages were added)
+            with self._messages_table(conn, conversation["archive"]) as table:
+                if message_limit is None:
+                    cursor.execute(
+                        f"SELECT * FROM {table} WHERE conversation_id = ? ORDER BY id",
+                        (conversation_id,)
+                    )
+                    message_rows = cursor.fetchall()
+                else:
+                    cursor.execute(
+                        f"SELECT * FROM {table} WHERE conversation_id = ? ORDER BY id DESC LIMIT ?",
+                        (conversation_id, message_limit)
+                    )
+                    message_rows = cursor.fetchall()[::-1]
         
-        # Get conversation metadata
-        cursor.execute(
-            "SELECT * FROM conversations WHERE id = ?",
-            (conversation_id,)
-        )
-        conversation_row = cursor.fetchone()
+        messages = [self._message_from_row(row) for row in message_rows]
         
-        if not conversation_row:
-            conn.close()
-            return None, []
+        return conversation, messages
+    
+    @timed(DB_OPERATION_DURATION)
+    def get_messages(self, conversation_id: str, limit: int = 50,
+                     before_id: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Get the most recent messages of a conversation, one page at a time from the end
         
-        conversation = dict(conversation_row)
+        Pages are keyed on the message ID, which follows the order messages
+        were added, so each page is read straight from the (conversation_id, id)
+        index and costs the same however long the conversation is.
         
-        # Get messages
-        cursor.execute(
-            "SELECT * FROM messages WHERE conversation_id = ? ORDER BY timestamp",
-            (conversation_id,)
-        )
-        message_rows = cursor.fetchall()
+        Args:
+            conversation_id: ID of the conversation
+            limit: Maximum number of messages to return (default: 50)
+            before_id: Cursor returned with the previous page (default: None, returns the last messages)
         
-        messages = [dict(row) for row in message_rows]
+        Returns:
+            A tuple containing the messages in the order they were added and
+            the cursor for the page before them, or None if this is the first page
+        """
+        with self._connection() as conn:
+            row = conn.execute("SELECT archive FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            with self._messages_table(conn, row["archive"] if row else None) as table:
+                if before_id is None:
+                    rows = conn.execute(
+                        f"SELECT * FROM {table} WHERE conversation_id = ? ORDER BY id DESC LIMIT ?",
+                        (conversation_id, limit + 1)
+                    ).fetchall()
+                else:
+                    rows = conn.execute(
+                        f"SELECT * FROM {table} WHERE conversation_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                        (conversation_id, before_id, limit + 1)
+                    ).fetchall()
         
-        conn.close()
+        messages = [self._message_from_row(row) for row in reversed(rows[:limit])]
         
-        return conversation, messages
+        # The extra row only tells us whether an earlier page exists
+        earlier_cursor = messages[0]["id"] if len(rows) > limit else None
+        
+        return messages, earlier_cursor
     
+    @timed(DB_OPERATION_DURATION)
     def get_all_conversations(self) -> List[Dict[str, Any]]:
         """
         Get all conversations
@@ -196,89 +838,898 @@ class DBManager:
         Returns:
             A list of all conversations with metadata
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT * FROM conversations ORDER BY updated_at DESC"
-        )
-        conversation_rows = cursor.fetchall()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                "SELECT * FROM conversations ORDER BY updated_at DESC"
+            )
+            conversation_rows = cursor.fetchall()
         
         conversations = [dict(row) for row in conversation_rows]
         
-        conn.close()
-        
         return conversations
     
-    def delete_conversation(self, conversation_id: str) -> bool:
+    @timed(DB_OPERATION_DURATION)
+    def list_conversations(self, limit: int = 50, cursor: Optional[Tuple[str, str]] = None) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
         """
-        Delete a conversation and all its messages
+        Get one page of conversations, most recently updated first
+        
+        Pages are keyed on (updated_at, id) rather than an offset, so every
+        page costs the same no matter how far into the history it is.
         
         Args:
-            conversation_id: ID of the conversation to delete
-            
+            limit: Maximum number of conversations to return (default: 50)
+            cursor: Cursor returned with the previous page (default: None, returns the first page)
+        
         Returns:
-            True if successful, False otherwise
+            A tuple containing the conversations (id, title, updated_at, archive
+            and the statistics in LISTING_STATS only) and the cursor for the
+            next page, or None if this is the last page
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        columns = ", ".join(["id", "title", "updated_at", "archive"] + self.LISTING_STATS)
+        with self._connection() as conn:
+            if cursor is None:
+                rows = conn.execute(
+                    f"SELECT {columns} FROM conversations ORDER BY updated_at DESC, id DESC LIMIT ?",
+                    (limit + 1,)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"""SELECT {columns} FROM conversations
+                       WHERE (updated_at, id) < (?, ?)
+                       ORDER BY updated_at DESC, id DESC LIMIT ?""",
+                    (cursor[0], cursor[1], limit + 1)
+                ).fetchall()
         
-        try:
-            # Delete messages first due to foreign key constraint
-            cursor.execute(
-                "DELETE FROM messages WHERE conversation_id = ?",
-                (conversation_id,)
-            )
-            
-            # Delete the conversation
-            cursor.execute(
-                "DELETE FROM conversations WHERE id = ?",
-                (conversation_id,)
-            )
-            
-            conn.commit()
-            result = True
-        except Exception as e:
-            print(f"Error deleting conversation: {e}")
-            conn.rollback()
-            result = False
+        conversations = [dict(row) for row in rows[:limit]]
         
-        conn.close()
+        # The extra row only tells us whether another page exists
+        next_cursor = None
+        if len(rows) > limit:
+            last = conversations[-1]
+            next_cursor = (last["updated_at"], last["id"])
         
-        return result
+        return conversations, next_cursor
     
-    def update_conversation_title(self, conversation_id: str, title: str) -> bool:
+    @timed(DB_OPERATION_DURATION)
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
         """
-        Update the title of a conversation
+        Search message contents and conversation titles
+        
+        Every word in the query must match. To keep very common words fast,
+        matches are ranked in tiers: the newest FTS_RANK_WINDOW message and
+        title matches are ranked first, then the next FTS_RANK_WINDOW older
+        ones, and so on, so a page only ranks the tiers up to its offset.
+        Messages of archived conversations are searched too, and read back
+        from their archive file.
         
         Args:
-            conversation_id: ID of the conversation to update
-            title: New title for the conversation
-            
+            query: Words to search for
+            limit: Maximum number of results to return (default: 20)
+            offset: Number of results to skip, for paging (default: 0)
+        
         Returns:
-            True if successful, False otherwise
+            A list of results, best match first, each with conversation_id,
+            title, message_id (None for title matches), role, a snippet and a
+            score (the relevance relative to the best match of its kind in its tier, up to 1.0)
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        
+        # Quote every word so user input can't be parsed as FTS5 query syntax
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        
+        with self._connection() as conn:
+            hits = []
+            tier = 0
+            sources = {"message": "messages_fts", "title": "conversations_fts"}
+            while sources and len(hits) < offset + limit:
+                tier_hits = []
+                for kind, table in list(sources.items()):
+                    # FTS5 walks matches newest first, so only this tier's matches are ranked
+                    key = "rowid" if kind == "message" else "conversation_id"
+                    rows = conn.execute(
+                        f"""SELECT hit, rank FROM (
+                                SELECT rowid AS position, {key} AS hit, rank FROM {table} WHERE {table} MATCH ?
+                                ORDER BY rowid DESC LIMIT ? OFFSET ?
+                            ) ORDER BY rank, position DESC""",
+                        (match, self.FTS_RANK_WINDOW, tier * self.FTS_RANK_WINDOW)
+                    ).fetchall()
+                    if len(rows) < self.FTS_RANK_WINDOW:
+                        del sources[kind]
+                    
+                    # bm25 scores depend on each table's statistics, so they are only
+                    # compared after scaling by the best score of the same table
+                    best = rows[0][1] if rows else 0
+                    tier_hits += [(kind, row[0], row[1] / best if best else 1.0) for row in rows]
+                
+                hits += sorted(tier_hits, key=lambda hit: -hit[2])
+                tier += 1
+            
+            # Keep only the requested page
+            hits = hits[offset:offset + limit]
+            
+            # Details are only fetched for the rows being returned
+            message_ids = [key for kind, key, _ in hits if kind == "message"]
+            conversation_ids = [key for kind, key, _ in hits if kind == "title"]
+            
+            messages = {}
+            if message_ids:
+                placeholders = ", ".join("?" * len(message_ids))
+                for row in conn.execute(
+                    f"""SELECT m.id, m.conversation_id, m.role, m.content, m.codec, m.content_blob, c.title
+                        FROM messages m JOIN conversations c ON c.id = m.conversation_id
+                        WHERE m.id IN ({placeholders})""",
+                    message_ids
+                ):
+                    messages[row["id"]] = row
+            
+            # The rest belong to archived conversations (see _archive_batch())
+            missing = [message_id for message_id in message_ids if message_id not in messages]
+            if missing:
+                archives = [row[0] for row in conn.execute(
+                    "SELECT DISTINCT archive FROM conversations WHERE archive IS NOT NULL"
+                ).fetchall()]
+                for archive in archives:
+                    if not missing:
+                        break
+                    if not os.path.exists(os.path.join(self.archive_dir, archive)):
+                        continue
+                    
+                    with self._attached(conn, archive):
+                        placeholders = ", ".join("?" * len(missing))
+                        rows = conn.execute(
+                            f"""SELECT m.id, m.conversation_id, m.role, m.content, m.codec, m.content_blob, c.title
+                                FROM archive.messages m JOIN main.conversations c ON c.id = m.conversation_id AND c.archive = ?
+                                WHERE m.id IN ({placeholders})""",
+                            [archive, *missing]
+                        ).fetchall()
+                    for row in rows:
+                        messages[row["id"]] = row
+                    missing = [message_id for message_id in missing if message_id not in messages]
+            
+            titles = {}
+            if conversation_ids:
+                placeholders = ", ".join("?" * len(conversation_ids))
+                for row in conn.execute(
+                    f"SELECT id, title FROM conversations WHERE id IN ({placeholders})",
+                    conversation_ids
+                ):
+                    titles[row["id"]] = row
+        
+        results = []
+        for kind, key, score in hits:
+            if kind == "message" and key in messages:
+                row = messages[key]
+                results.append({
+                    "conversation_id": row["conversation_id"],
+                    "title": row["title"],
+                    "message_id": row["id"],
+                    "role": row["role"],
+                    "snippet": self._snippet(self._message_text(row["content"], row["codec"], row["content_blob"]), terms),
+                    "score": score
+                })
+            elif kind == "title" and key in titles:
+                row = titles[key]
+                results.append({
+                    "conversation_id": row["id"],
+                    "title": row["title"],
+                    "message_id": None,
+                    "role": None,
+                    "snippet": self._snippet(row["title"], terms),
+                    "score": score
+                })
+        
+        return results
+    
+    @staticmethod
+    def _snippet(text: str, terms: List[str], width: int = 80) -> str:
+        """
+        Cut a short excerpt of text around the first search term it contains
+        
+        Args:
+            text: Text to excerpt
+            terms: Search terms to look for
+            width: Approximate number of characters to keep on each side of the match (default: 80)
+        
+        Returns:
+            The excerpt, with "..." where text was cut
+        """
+        lowered = text.lower()
+        positions = [lowered.find(term.lower()) for term in terms]
+        position = min([p for p in positions if p >= 0], default=0)
+        
+        start = max(position - width, 0)
+        end = min(position + width, len(text))
+        
+        return ("..." if start > 0 else "") + " ".join(text[start:end].split()) + ("..." if end < len(text) else "")
+    
+    @timed(DB_OPERATION_DURATION)
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """
+        Delete a conversation and all its messages
+        
+        Args:
+            conversation_id: ID of the conversation to delete
+        
+        Returns:
+            True if the conversation was deleted, False if it doesn't exist or the delete failed
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            row = cursor.execute("SELECT archive FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            archive = row["archive"] if row else None
+            if archive and not os.path.exists(os.path.join(self.archive_dir, archive)):
+                # Its index entries can't be read back; rebuild_search_index() drops them
+                archive = None
+            
+            with self._attached(conn, archive) if archive else nullcontext():
+                try:
+                    if archive:
+                        # Archived messages are still in the search index (see _archive_batch())
+                        cursor.execute(
+                            """INSERT INTO main.messages_fts (messages_fts, rowid, content)
+                               SELECT 'delete', id, content FROM archive.messages WHERE codec IS NULL AND conversation_id = ?""",
+                            (conversation_id,)
+                        )
+                        self._unindex_compressed(cursor, "conversation_id = ?", [conversation_id], table="archive.messages")
+                    
+                    # Delete messages first due to foreign key constraint
+                    self._unindex_compressed(cursor, "conversation_id = ?", [conversation_id])
+                    cursor.execute(
+                        "DELETE FROM main.messages WHERE conversation_id = ?",
+                        (conversation_id,)
+                    )
+                    
+                    # Forget any batch item saved as this conversation, so a rerun sends it again
+                    cursor.execute(
+                        "DELETE FROM main.batch_items WHERE conversation_id = ?",
+                        (conversation_id,)
+                    )
+                    
+                    # Delete the conversation
+                    cursor.execute(
+                        "DELETE FROM main.conversations WHERE id = ?",
+                        (conversation_id,)
+                    )
+                    deleted = cursor.rowcount > 0
+                    
+                    conn.commit()
+                except Exception as e:
+                    logger.error("Error deleting conversation: %s", e)
+                    conn.rollback()
+                    return False
+                
+                # Only then delete the archived copy (see _archive_batch()); if this
+                # fails, the copy is left behind but nothing refers to it any more
+                if archive:
+                    try:
+                        cursor.execute("DELETE FROM archive.messages WHERE conversation_id = ?", (conversation_id,))
+                        cursor.execute("DELETE FROM archive.conversations WHERE id = ?", (conversation_id,))
+                        conn.commit()
+                    except Exception as e:
+                        logger.error("Error deleting archived messages of conversation %s: %s", conversation_id, e)
+        
+        return deleted
+    
+    @timed(DB_OPERATION_DURATION)
+    def update_conversation_title(self, conversation_id: str, title: str) -> bool:
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        Update the title of a conversation
+        
+        Args:
+            conversation_id: ID of the conversation to update
+            title: New title for the conversation
+        
+        Returns:
+            True if the conversation was renamed, False if it doesn't exist or the update failed
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute(
+                    "UPDATE conversations SET title = ? WHERE id = ?",
+                    (title, conversation_id)
+                )
+                
+                conn.commit()
+                result = cursor.rowcount > 0
+            except Exception as e:
+                logger.error("Error updating conversation title: %s", e)
+                conn.rollback()
+                result = False
+        
+        return result
+    
+    @timed(DB_OPERATION_DURATION)
+    def archive_conversations(self, idle_days: float, limit: Optional[int] = None) -> Dict[str, int]:
+        """
+        Move the messages of conversations idle for longer than idle_days to archive files
+        
+        Archived conversations keep their row, title and statistics in this
+        database, so they are still listed and opened as before; only their
+        messages move, to one file per month of last activity in archive_dir.
+        Archive files are plain SQLite databases with conversations and
+        messages tables, which can be queried with ATTACH.
+        
+        Args:
+            idle_days: Archive conversations not updated for this many days
+            limit: Maximum number of conversations to archive (default: None, archives all of them)
+        
+        Returns:
+            A dictionary with the number of conversations and messages archived
+            and the number of archive files written to
+        """
+        cutoff = (datetime.now() - timedelta(days=idle_days)).isoformat()
+        stats = {"conversations": 0, "messages": 0, "files": 0}
+        
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT id, updated_at FROM conversations WHERE updated_at < ? AND archive IS NULL ORDER BY updated_at, id LIMIT ?",
+                (cutoff, -1 if limit is None else limit)
+            ).fetchall()
+            
+            by_file = {}
+            for row in rows:
+                by_file.setdefault(self._archive_name(row["updated_at"]), []).append(row["id"])
+            
+            for name, conversation_ids in by_file.items():
+                with self._attached(conn, name, create=True):
+                    for start in range(0, len(conversation_ids), self.ARCHIVE_BATCH_SIZE):
+                        conversations, messages = self._archive_batch(
+                            conn, name, conversation_ids[start:start + self.ARCHIVE_BATCH_SIZE], cutoff
+                        )
+                        stats["conversations"] += conversations
+                        stats["messages"] += messages
+                stats["files"] += 1
+        
+        return stats
+    
+    def _archive_batch(self, conn: sqlite3.Connection, name: str, conversation_ids: List[str], cutoff: str) -> Tuple[int, int]:
+        """
+        Move some conversations' messages to the attached archive
+        
+        The messages are copied and committed before they are deleted here.
+        Transactions over several files aren't atomic across them in WAL
+        mode, and this way a crash can only leave a copy behind, which the
+        next run replaces.
+        
+        Args:
+            conn: Connection with the archive attached
+            name: File name of the archive
+            conversation_ids: Conversations to archive
+            cutoff: Conversations updated since this time are left alone
+        
+        Returns:
+            The number of conversations and messages archived
+        """
+        placeholders = ", ".join("?" * len(conversation_ids))
+        now = datetime.now().isoformat()
+        
+        conn.execute(
+            f"""INSERT OR REPLACE INTO archive.conversations (id, title, model, created_at, updated_at, summary, archived_at)
+                SELECT id, title, model, created_at, updated_at, summary, ? FROM main.conversations WHERE id IN ({placeholders})""",
+            [now, *conversation_ids]
+        )
+        conn.execute(
+            f"""INSERT OR REPLACE INTO archive.messages ({self.MESSAGE_COLUMNS})
+                SELECT {self.MESSAGE_COLUMNS} FROM main.messages WHERE conversation_id IN ({placeholders})""",
+            conversation_ids
+        )
+        conn.commit()
         
+        conn.execute("BEGIN IMMEDIATE")
+        # Skip conversations that got a message while they were being copied
+        rows = conn.execute(
+            f"""SELECT id, message_count, token_count, last_message_at, last_message_preview FROM main.conversations
+                WHERE id IN ({placeholders}) AND updated_at < ? AND archive IS NULL""",
+            [*conversation_ids, cutoff]
+        ).fetchall()
+        archived = [row["id"] for row in rows]
+        
+        moved = 0
+        if archived:
+            placeholders = ", ".join("?" * len(archived))
+            moved = conn.execute(f"DELETE FROM main.messages WHERE conversation_id IN ({placeholders})", archived).rowcount
+            # Archived messages stay searchable. The delete trigger has just removed
+            # the plain-text ones from the index, so they are added back from the
+            # copy; compressed ones were never touched by the trigger.
+            conn.execute(
+                f"""INSERT INTO main.messages_fts (rowid, content)
+                    SELECT id, content FROM archive.messages WHERE codec IS NULL AND conversation_id IN ({placeholders})""",
+                archived
+            )
+            # The delete trigger has reset the statistics, which still describe the archived messages
+            conn.executemany(
+                """UPDATE main.conversations SET archive = ?, message_count = ?, token_count = ?,
+                   last_message_at = ?, last_message_preview = ? WHERE id = ?""",
+                [(name, row["message_count"], row["token_count"], row["last_message_at"],
+                  row["last_message_preview"], row["id"]) for row in rows]
+            )
+        conn.commit()
+        
+        return len(archived), moved
+    
+    @timed(DB_OPERATION_DURATION)
+    def restore_conversation(self, conversation_id: str) -> bool:
+        """
+        Move an archived conversation's messages back into this database
+        
+        add_message() does this before writing to an archived conversation.
+        
+        Args:
+            conversation_id: ID of the conversation
+        
+        Returns:
+            True if the conversation was restored, False if it wasn't archived
+        
+        Raises:
+            FileNotFoundError: If its archive file is missing
+        """
+        with self._connection() as conn:
+            row = conn.execute("SELECT archive FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            if row is None or row["archive"] is None:
+                return False
+            
+            with self._attached(conn, row["archive"]):
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT archive FROM main.conversations WHERE id = ?", (conversation_id,)).fetchone()
+                if row["archive"] is None:
+                    # Restored by another thread in the meantime
+                    conn.rollback()
+                    return False
+                
+                # The insert trigger counts the messages again, from zero
+                conn.execute(
+                    "UPDATE main.conversations SET message_count = 0, token_count = 0 WHERE id = ?",
+                    (conversation_id,)
+                )
+                
+                # Archived messages are still in the search index, so the plain-text
+                # ones are taken out before the insert trigger adds them again
+                conn.execute(
+                    """INSERT INTO main.messages_fts (messages_fts, rowid, content)
+                       SELECT 'delete', id, content FROM archive.messages WHERE codec IS NULL AND conversation_id = ?""",
+                    (conversation_id,)
+                )
+                
+                # Compressed bodies are decompressed once, for their length and preview
+                rows = []
+                for row in conn.execute(
+                    f"SELECT {self.MESSAGE_COLUMNS} FROM archive.messages WHERE conversation_id = ? ORDER BY id",
+                    (conversation_id,)
+                ):
+                    content_length = content_preview = None
+                    if row["codec"] is not None:
+                        text = self._message_text(None, row["codec"], row["content_blob"])
+                        content_length, content_preview = len(text), text[:self.PREVIEW_LENGTH]
+                    rows.append((*row, content_length, content_preview))
+                conn.executemany(
+                    f"""INSERT INTO main.messages ({self.MESSAGE_COLUMNS}, content_length, content_preview)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    rows
+                )
+                conn.execute("UPDATE main.conversations SET archive = NULL WHERE id = ?", (conversation_id,))
+                conn.commit()
+                
+                # Only then drop the archived copy (see _archive_batch())
+                conn.execute("DELETE FROM archive.messages WHERE conversation_id = ?", (conversation_id,))
+                conn.execute("DELETE FROM archive.conversations WHERE id = ?", (conversation_id,))
+                conn.commit()
+        
+        return True
+    
+    def _archive_name(self, updated_at: Optional[str]) -> str:
+        """Get the archive file name for a conversation last updated at the given time"""
+        stem = os.path.splitext(os.path.basename(self.db_path))[0]
+        month = (updated_at or "")[:7]
+        if not re.fullmatch(r"\d{4}-\d{2}", month):
+            month = "undated"
+        return f"{stem}-{month}.db"
+    
+    @contextmanager
+    def _attached(self, conn: sqlite3.Connection, name: str, create: bool = False) -> Iterator[None]:
+        """
+        Attach an archive file as the 'archive' schema for the duration of a with-block
+        
+        Args:
+            conn: Connection to attach it to, with no query open
+            name: File name of the archive in archive_dir
+            create: Create the file and its tables if they don't exist (default: False)
+        
+        Raises:
+            FileNotFoundError: If the file doesn't exist and create is False
+        """
+        path = os.path.join(self.archive_dir, name)
+        if create:
+            os.makedirs(self.archive_dir, exist_ok=True)
+        elif not os.path.exists(path):
+            raise FileNotFoundError(f"Archive file not found: {path}")
+        
+        conn.execute("ATTACH DATABASE ? AS archive", (path,))
         try:
+            if create:
+                conn.execute('''
+                CREATE TABLE IF NOT EXISTS archive.conversations (
+                    id TEXT PRIMARY KEY,
+                    title TEXT,
+                    model TEXT,
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP,
+                    summary TEXT,
+                    archived_at TIMESTAMP
+                )
+                ''')
+                conn.execute('''
+                CREATE TABLE IF NOT EXISTS archive.messages (
+                    id INTEGER PRIMARY KEY,
+                    conversation_id TEXT,
+                    role TEXT,
+                    content TEXT,
+                    timestamp TIMESTAMP,
+                    codec TEXT,
+                    content_blob BLOB
+                )
+                ''')
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS archive.idx_messages_conversation ON messages (conversation_id, id)"
+                )
+            yield
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute("DETACH DATABASE archive")
+    
+    @contextmanager
+    def _messages_table(self, conn: sqlite3.Connection, archive: Optional[str]) -> Iterator[str]:
+        """
+        Get the table holding a conversation's messages for the duration of a with-block
+        
+        Args:
+            conn: Connection to read with, with no query open
+            archive: The conversation's archive column
+        
+        Yields:
+            'main.messages', or 'archive.messages' with its archive file attached
+        """
+        if archive is None:
+            yield "main.messages"
+        elif not os.path.exists(os.path.join(self.archive_dir, archive)):
+            # Show the conversation without its messages rather than fail
+            logger.error("Archive file not found: %s", os.path.join(self.archive_dir, archive))
+            yield "main.messages"
+        else:
+            with self._attached(conn, archive):
+                yield "archive.messages"
+    
+    @timed(DB_OPERATION_DURATION)
+    def compact(self, max_pages: Optional[int] = None) -> int:
+        """
+        Give free pages back to the file system, a few at a time
+        
+        Deleted and archived data leaves free pages in the file. With
+        incremental auto-vacuum, each call releases up to max_pages of them
+        in one short write transaction, so compaction can run in the
+        background without holding the write lock for long.
+        
+        Args:
+            max_pages: Pages to release (default: None, uses COMPACT_STEP_PAGES)
+        
+        Returns:
+            The number of pages released; 0 once none are left, or if
+            incremental auto-vacuum isn't enabled
+        """
+        with self._connection() as conn:
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not before:
+                return 0
+            # execute() stops after the first page this pragma releases, while
+            # executescript() steps it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages or self.COMPACT_STEP_PAGES)})")
+            return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    
+    def enable_incremental_vacuum(self) -> bool:
+        """
+        Switch a database created without incremental auto-vacuum over to it
+        
+        This rewrites the whole file with VACUUM, which blocks every other
+        reader and writer until it's done, so run it during maintenance.
+        
+        Returns:
+            True if the database was converted, False if it already used incremental auto-vacuum
+        """
+        with self._connection() as conn:
+            # 2 is INCREMENTAL
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return False
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        return True
+    
+    @timed(DB_OPERATION_DURATION)
+    def rebuild_search_index(self) -> int:
+        """
+        Rebuild the message search index from the messages table
+        
+        FTS5's own 'rebuild' reads the content column, which is NULL for
+        compressed rows, so they are indexed again from their decompressed
+        text. It doesn't read the archive files either, so the messages of
+        archived conversations are indexed again from there. This also drops
+        index entries left behind by compressed rows that were deleted
+        through a plain sqlite3 connection.
+        
+        Returns:
+            The number of compressed messages indexed
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO main.messages_fts (messages_fts) VALUES ('rebuild')")
+            count = self._reindex_compressed(cursor, "main.messages", "1", [])
+            conn.commit()
+            
+            archives = [row[0] for row in cursor.execute(
+                "SELECT DISTINCT archive FROM main.conversations WHERE archive IS NOT NULL"
+            ).fetchall()]
+            for archive in archives:
+                if not os.path.exists(os.path.join(self.archive_dir, archive)):
+                    logger.error("Archive file not found: %s", os.path.join(self.archive_dir, archive))
+                    continue
+                
+                with self._attached(conn, archive):
+                    # Only conversations still archived there; a failed delete can leave copies behind
+                    condition = "conversation_id IN (SELECT id FROM main.conversations WHERE archive = ?)"
+                    cursor.execute(
+                        f"""INSERT INTO main.messages_fts (rowid, content)
+                           SELECT id, content FROM archive.messages WHERE codec IS NULL AND {condition}""",
+                        (archive,)
+                    )
+                    count += self._reindex_compressed(cursor, "archive.messages", condition, [archive])
+                    conn.commit()
+        
+        return count
+    
+    def _reindex_compressed(self, cursor: sqlite3.Cursor, table: str, condition: str, params: List[Any]) -> int:
+        """
+        Add the compressed messages of a table to the search index, in batches
+        
+        Args:
+            cursor: Cursor to use, inside the caller's transaction
+            table: Qualified name of the messages table to read
+            condition: SQL condition selecting the messages to index
+            params: Parameters of the condition
+        
+        Returns:
+            The number of messages indexed
+        """
+        count = 0
+        last_id = 0
+        while True:
+            rows = cursor.execute(
+                f"""SELECT id, codec, content_blob FROM {table}
+                   WHERE codec IS NOT NULL AND {condition} AND id > ? ORDER BY id LIMIT ?""",
+                [*params, last_id, self.FTS_BACKFILL_BATCH_SIZE]
+            ).fetchall()
+            if not rows:
+                break
+            self._index_compressed(cursor, [(row[0], self._message_text(None, row[1], row[2])) for row in rows])
+            count += len(rows)
+            last_id = rows[-1][0]
+        return count
+    
+    @timed(DB_OPERATION_DURATION)
+    def save_batch_result(self, run: str, item_id: str, title: str, model: str, messages: List[Dict[str, Any]]) -> str:
+        """
+        Save the result of a batch run item as a conversation
+        
+        The conversation, its messages and the completed item are written in
+        one transaction, so an interrupted run never leaves half an item behind.
+        
+        Args:
+            run: Name of the batch run
+            item_id: ID of the item within the run
+            title: Title for the conversation
+            model: The model that answered
+            messages: The full exchange, ending with the assistant's response
+        
+        Returns:
+            The ID of the conversation (the existing one if the item was already saved)
+        """
+        now = datetime.now().isoformat()
+        conversation_id = str(uuid.uuid4())
+        first_user = next((message["content"] for message in messages if message["role"] == "user"), "")
+        summary = first_user[:50] + ("..." if len(first_user) > 50 else "")
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            row = cursor.execute(
+                "SELECT conversation_id FROM batch_items WHERE run = ? AND item_id = ?",
+                (run, item_id)
+            ).fetchone()
+            if row:
+                return row[0]
+            
             cursor.execute(
-                "UPDATE conversations SET title = ? WHERE id = ?",
-                (title, conversation_id)
+                "INSERT INTO conversations (id, title, model, created_at, updated_at, summary) VALUES (?, ?, ?, ?, ?, ?)",
+                (conversation_id, title, model, now, now, summary)
+            )
+            self._insert_new_messages(cursor, conversation_id, messages, now)
+            cursor.execute(
+                "INSERT INTO batch_items (run, item_id, conversation_id, completed_at) VALUES (?, ?, ?, ?)",
+                (run, item_id, conversation_id, now)
             )
             
             conn.commit()
-            result = True
-        except Exception as e:
-            print(f"Error updating conversation title: {e}")
-            conn.rollback()
-            result = False
         
-        conn.close()
+        return conversation_id
+    
+    @timed(DB_OPERATION_DURATION)
+    def get_batch_item_ids(self, run: str) -> Set[str]:
+        """
+        Get the IDs of the items of a batch run that have been saved
         
-        return result
+        Args:
+            run: Name of the batch run
+        
+        Returns:
+            The set of completed item IDs
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT item_id FROM batch_items WHERE run = ?", (run,))
+            return {row[0] for row in cursor}
     
+    @timed(DB_OPERATION_DURATION)
+    def create_batch_job(self, job: Dict[str, Any], requests: List[Dict[str, Any]]) -> str:
+        """
+        Record a provider batch job together with the requests packed into it
+        
+        Args:
+            job: Job fields ('run', 'provider', 'model', 'provider_batch_id', 'status')
+            requests: Requests with 'custom_id', 'title' and 'messages'
+        
+        Returns:
+            The ID of the created job
+        """
+        job_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                """INSERT INTO batch_jobs
+                   (id, run, provider, model, provider_batch_id, status, request_count, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    job_id,
+                    job.get("run"),
+                    job["provider"],
+                    job["model"],
+                    job.get("provider_batch_id"),
+                    job.get("status", "submitted"),
+                    len(requests),
+                    now,
+                    now
+                )
+            )
+            cursor.executemany(
+                "INSERT INTO batch_job_requests (job_id, custom_id, title, messages) VALUES (?, ?, ?, ?)",
+                (
+                    (job_id, request["custom_id"], request.get("title"), json.dumps(request["messages"], ensure_ascii=False))
+                    for request in requests
+                )
+            )
+            
+            conn.commit()
+        
+        return job_id
+    
+    @timed(DB_OPERATION_DURATION)
+    def update_batch_job(self, job_id: str, **fields) -> bool:
+        """
+        Update the state of a provider batch job
+        
+        Args:
+            job_id: ID of the job
+            **fields: Columns to set, e.g. status='completed'
+        
+        Returns:
+            True if the job exists, False otherwise
+        """
+        columns = {"provider_batch_id", "status", "succeeded", "failed", "error"}
+        unknown = set(fields) - columns
+        if unknown:
+            raise ValueError(f"Unknown batch job fields: {', '.join(sorted(unknown))}")
+        
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        values = list(fields.values()) + [datetime.now().isoformat(), job_id]
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE batch_jobs SET {assignments + ', ' if assignments else ''}updated_at = ? WHERE id = ?",
+                values
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+    
+    @timed(DB_OPERATION_DURATION)
+    def get_batch_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a provider batch job
+        
+        Args:
+            job_id: ID of the job
+        
+        Returns:
+            The job, or None if it doesn't exist
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM batch_jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    @timed(DB_OPERATION_DURATION)
+    def list_batch_jobs(self, run: str = None, statuses: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        List provider batch jobs, oldest first
+        
+        Args:
+            run: Only list the jobs of this run (default: None, all runs)
+            statuses: Only list jobs in these states (default: None, any state)
+        
+        Returns:
+            A list of jobs
+        """
+        conditions = []
+        params = []
+        if run is not None:
+            conditions.append("run = ?")
+            params.append(run)
+        if statuses is not None:
+            statuses = list(statuses)
+            conditions.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        
+        query = "SELECT * FROM batch_jobs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at, id"
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+    
+    @timed(DB_OPERATION_DURATION)
+    def get_batch_job_requests(self, job_id: str) -> List[Dict[str, Any]]:
+        """
+        Get the requests packed into a provider batch job
+        
+        Args:
+            job_id: ID of the job
+        
+        Returns:
+            Requests with 'custom_id', 'title' and 'messages', in submission order
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT custom_id, title, messages FROM batch_job_requests WHERE job_id = ? ORDER BY rowid",
+                (job_id,)
+            )
+            return [
+                {"custom_id": row["custom_id"], "title": row["title"], "messages": json.loads(row["messages"])}
+                for row in cursor.fetchall()
+            ]
+    
+    @timed(DB_OPERATION_DURATION)
     def export_conversation(self, conversation_id: str, file_path: str) -> bool:
         """
         Export a conversation to a JSON file
@@ -286,7 +1737,7 @@ class DBManager:
         Args:
             conversation_id: ID of the conversation to export
             file_path: Path to save the JSON file
-            
+        
         Returns:
             True if successful, False otherwise
         """
@@ -305,16 +1756,17 @@ class DBManager:
                 json.dump(export_data, f, indent=2)
             return True
         except Exception as e:
-            print(f"Error exporting conversation: {e}")
+            logger.error("Error exporting conversation: %s", e)
             return False
     
+    @timed(DB_OPERATION_DURATION)
     def import_conversation(self, file_path: str) -> Optional[str]:
         """
         Import a conversation from a JSON file
         
         Args:
             file_path: Path to the JSON file
-            
+        
         Returns:
             The ID of the imported conversation if successful, None otherwise
         """
@@ -328,44 +1780,266 @@ class DBManager:
             # Create a new conversation ID
             conversation_id = str(uuid.uuid4())
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Insert the conversation
-            now = datetime.now().isoformat()
-            cursor.execute(
-                """INSERT INTO conversations 
-                   (id, title, model, created_at, updated_at, summary) 
-                   VALUES (?, ?, ?, ?, ?, ?)""",
-                (
-                    conversation_id, 
-                    conversation.get("title", f"Imported {now}"),
-                    conversation.get("model", "unknown"),
-                    conversation.get("created_at", now),
-                    now,
-                    conversation.get("summary", "")
-                )
-            )
-            
-            # Insert messages
-            for message in messages:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                # Insert the conversation
+                now = datetime.now().isoformat()
                 cursor.execute(
-                    """INSERT INTO messages 
-                       (conversation_id, role, content, timestamp) 
-                       VALUES (?, ?, ?, ?)""",
+                    """INSERT INTO conversations
+                       (id, title, model, created_at, updated_at, summary)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
                     (
                         conversation_id,
-                        message.get("role", "user"),
-                        message.get("content", ""),
-                        message.get("timestamp", now)
+                        conversation.get("title", f"Imported {now}"),
+                        conversation.get("model", "unknown"),
+                        conversation.get("created_at", now),
+                        now,
+                        conversation.get("summary", "")
                     )
                 )
-            
-            conn.commit()
-            conn.close()
+                
+                # Insert messages
+                self._insert_new_messages(cursor, conversation_id, messages, now)
+                
+                conn.commit()
             
             return conversation_id
-            
+        
         except Exception as e:
-            print(f"Error importing conversation: {e}")
+            logger.error("Error importing conversation: %s", e)
             return None
+    
+    @timed(DB_OPERATION_DURATION)
+    def export_all(self, file_path: str, conversation_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        Export conversations to a JSON Lines file
+        
+        Each line holds one conversation in the same shape as
+        export_conversation() plus a hash of its current content. Conversations are
+        streamed one at a time, so memory use doesn't grow with the history.
+        
+        Args:
+            file_path: Path to save the JSONL file
+            conversation_ids: IDs of the conversations to export (default: None, exports every conversation)
+        
+        Returns:
+            The number of conversations exported
+        """
+        count = 0
+        
+        with self._connection() as conn, open(file_path, "w", encoding="utf-8") as f:
+            if conversation_ids is None:
+                conversations = conn.execute("SELECT * FROM conversations ORDER BY created_at, id")
+            else:
+                conversations = (
+                    row for row in (
+                        conn.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+                        for conversation_id in conversation_ids
+                    )
+                    if row is not None
+                )
+            
+            for conversation_row in conversations:
+                conversation = dict(conversation_row)
+                if conversation["archive"]:
+                    # An archive can't be detached from a connection with a query still open
+                    _, messages = self.get_conversation(conversation["id"])
+                else:
+                    messages = [
+                        self._message_from_row(row) for row in conn.execute(
+                            "SELECT * FROM messages WHERE conversation_id = ? ORDER BY id",
+                            (conversation["id"],)
+                        )
+                    ]
+                
+                f.write(json.dumps({
+                    "conversation": conversation,
+                    "messages": messages,
+                    # Always hashed from the current messages: a stored hash is from when the
+                    # conversation was imported and misses anything added since
+                    "content_hash": self._content_hash(conversation, messages)
+                }, separators=(",", ":")))
+                f.write("\n")
+                count += 1
+        
+        return count
+    
+    @timed(DB_OPERATION_DURATION)
+    def import_all(self, file_path: str) -> Optional[Dict[str, int]]:
+        """
+        Import conversations from a JSON Lines file written by export_all()
+        
+        The file is parsed one line at a time and messages are written with
+        executemany in transactions of roughly IMPORT_BATCH_SIZE messages.
+        Conversations whose content hash is already in the database are
+        skipped, so an interrupted import can simply be run again.
+        
+        Args:
+            file_path: Path to the JSONL file
+        
+        Returns:
+            A dictionary with the number of conversations imported and skipped,
+            the number of messages imported and the number of unreadable lines,
+            or None if the import failed part way (completed batches are kept)
+        """
+        stats = {"imported": 0, "skipped": 0, "messages": 0, "errors": 0}
+        pending = 0
+        
+        with self._connection() as conn, open(file_path, "r", encoding="utf-8") as f:
+            cursor = conn.cursor()
+            
+            try:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    
+                    try:
+                        import_data = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        logger.error("Error importing conversation: %s", e)
+                        stats["errors"] += 1
+                        continue
+                    
+                    conversation = import_data.get("conversation", {})
+                    messages = import_data.get("messages", [])
+                    content_hash = import_data.get("content_hash") or self._content_hash(conversation, messages)
+                    
+                    cursor.execute("SELECT 1 FROM conversations WHERE content_hash = ?", (content_hash,))
+                    if cursor.fetchone():
+                        stats["skipped"] += 1
+                        continue
+                    
+                    conversation_id = str(uuid.uuid4())
+                    now = datetime.now().isoformat()
+                    
+                    cursor.execute(
+                        """INSERT INTO conversations
+                           (id, title, model, created_at, updated_at, summary, content_hash)
+                           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                        (
+                            conversation_id,
+                            conversation.get("title", f"Imported {now}"),
+                            conversation.get("model", "unknown"),
+                            conversation.get("created_at", now),
+                            conversation.get("updated_at", now),
+                            conversation.get("summary", ""),
+                            content_hash
+                        )
+                    )
+                    self._insert_new_messages(cursor, conversation_id, messages, now)
+                    
+                    stats["imported"] += 1
+                    stats["messages"] += len(messages)
+                    pending += len(messages) + 1
+                    
+                    # Only commit between conversations, so a crash never leaves a half-imported one behind
+                    if pending >= self.IMPORT_BATCH_SIZE:
+                        conn.commit()
+                        pending = 0
+                
+                conn.commit()
+            except Exception as e:
+                logger.error("Error importing conversations: %s", e)
+                conn.rollback()
+                return None
+        
+        return stats
+    
+    @classmethod
+    def _insert_new_messages(cls, cursor: sqlite3.Cursor, conversation_id: str,
+                             messages: List[Dict[str, Any]], default_timestamp: str):
+        """
+        Insert the messages of a conversation created in the same transaction, without committing
+        
+        Args:
+            cursor: Cursor of the connection to write with
+            conversation_id: ID of the new conversation
+            messages: Message dictionaries with role, content and optionally timestamp
+            default_timestamp: Timestamp of messages that don't have one
+        """
+        compressed = []
+        cursor.executemany(
+            f"INSERT INTO messages (conversation_id, role, {cls.CONTENT_COLUMNS}, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            cls._message_rows(conversation_id, messages, default_timestamp, compressed)
+        )
+        
+        if compressed:
+            # The conversation is new, so its compressed rows are these ones, in order
+            message_ids = [
+                row[0] for row in cursor.execute(
+                    "SELECT id FROM messages WHERE conversation_id = ? AND codec IS NOT NULL ORDER BY id",
+                    (conversation_id,)
+                )
+            ]
+            cls._index_compressed(cursor, zip(message_ids, compressed))
+    
+    @classmethod
+    def _message_rows(cls, conversation_id: str, messages: List[Dict[str, Any]], default_timestamp: str,
+                      compressed: List[str]) -> Iterator[Tuple]:
+        """Turn message dictionaries into rows for the messages table, collecting the text of the compressed ones"""
+        for message in messages:
+            content = message.get("content", "")
+            stored = cls._encode_content(content)
+            if stored[1] is not None:
+                compressed.append(content)
+            yield (conversation_id, message.get("role", "user"), *stored, message.get("timestamp", default_timestamp))
+    
+    @staticmethod
+    def _index_compressed(cursor: sqlite3.Cursor, messages: Iterable[Tuple[int, str]]):
+        """
+        Add compressed messages to the search index
+        
+        The triggers only index plain-text rows, since SQL can't read a
+        compressed body; the text is indexed here while it's still at hand.
+        
+        Args:
+            cursor: Cursor of the connection that inserted the messages
+            messages: (message ID, text) of each message
+        """
+        cursor.executemany("INSERT INTO main.messages_fts (rowid, content) VALUES (?, ?)", messages)
+    
+    @classmethod
+    def _unindex_compressed(cls, cursor: sqlite3.Cursor, condition: str, params: Iterable[Any],
+                            table: str = "main.messages"):
+        """
+        Remove compressed messages from the search index before they are deleted
+        
+        FTS5 needs the indexed text to remove a row, so these bodies are
+        decompressed; plain-text rows are removed by the delete trigger.
+        
+        Args:
+            cursor: Cursor of the connection that will delete the messages
+            condition: SQL condition on the table selecting the messages
+            params: Parameters of the condition
+            table: Table holding the messages (default: main.messages)
+        """
+        rows = cursor.execute(
+            f"SELECT id, codec, content_blob FROM {table} WHERE codec IS NOT NULL AND {condition}",
+            list(params)
+        ).fetchall()
+        cursor.executemany(
+            "INSERT INTO main.messages_fts (messages_fts, rowid, content) VALUES ('delete', ?, ?)",
+            [(row[0], cls._message_text(None, row[1], row[2])) for row in rows]
+        )
+    
+    @staticmethod
+    def _content_hash(conversation: Dict[str, Any], messages: List[Dict[str, Any]]) -> str:
+        """
+        Fingerprint a conversation by its creation time and messages
+        
+        Args:
+            conversation: Conversation metadata
+            messages: The conversation's messages
+        
+        Returns:
+            A hex SHA-256 digest
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(conversation.get("created_at")).encode("utf-8"))
+        for message in messages:
+            digest.update(json.dumps(
+                [message.get("role"), message.get("content"), message.get("timestamp")],
+                ensure_ascii=False
+            ).encode("utf-8"))
+        return digest.hexdigest()
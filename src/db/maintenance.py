@@ -0,0 +1,84 @@
+"""
+Background database maintenance
+Archives idle conversations and compacts the database file in small steps
+"""
+import logging
+import threading
+from typing import Any, Dict, Optional
+from src.db.db_manager import DBManager
+from src.monitoring.logs import log_event
+
+logger = logging.getLogger(__name__)
+
+# Default seconds between maintenance runs, overridable through environment variables by the app
+DEFAULT_INTERVAL = 3600.0
+
+class DBMaintenance:
+    """Runs archival and compaction in a background thread"""
+    
+    def __init__(self, db_manager: DBManager, archive_after_days: Optional[float] = None,
+                 interval: float = DEFAULT_INTERVAL, step_pages: int = DBManager.COMPACT_STEP_PAGES,
+                 step_pause: float = 0.05):
+        """
+        Initialize the maintenance worker (call start() to run it in the background)
+        
+        Args:
+            db_manager: Database manager to maintain
+            archive_after_days: Archive conversations idle for this many days (default: None, never archives)
+            interval: Seconds between runs (default: 3600)
+            step_pages: Free pages released per compaction step (default: DBManager.COMPACT_STEP_PAGES)
+            step_pause: Seconds between compaction steps, so other writers get the lock (default: 0.05)
+        """
+        self.db_manager = db_manager
+        self.archive_after_days = archive_after_days
+        self.interval = interval
+        self.step_pages = step_pages
+        self.step_pause = step_pause
+        
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Start running maintenance every interval, beginning now"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Stop the thread, finishing the current compaction step first; safe to call more than once"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def run_once(self) -> Dict[str, Any]:
+        """
+        Archive idle conversations, then compact until no free pages are left
+        
+        Returns:
+            A dictionary with the archive_conversations() counts (None if
+            archival is off) and the number of pages released
+        """
+        archived = None
+        if self.archive_after_days is not None:
+            archived = self.db_manager.archive_conversations(self.archive_after_days)
+        
+        pages = 0
+        while not self._stop.is_set():
+            released = self.db_manager.compact(self.step_pages)
+            if not released:
+                break
+            pages += released
+            self._stop.wait(self.step_pause)
+        
+        log_event(logger, "db_maintenance", archived=archived, pages_released=pages)
+        return {"archived": archived, "pages_released": pages}
+    
+    def _run(self):
+        """Run maintenance until stopped"""
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Database maintenance failed")
+            self._stop.wait(self.interval)
@@ -0,0 +1,154 @@
+"""
+Write-behind persistence of chat messages
+Messages are queued and saved by a background thread, many per transaction
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+from src.db.db_manager import DBManager
+
+logger = logging.getLogger(__name__)
+
+# Default limits, overridable through environment variables by the app
+DEFAULT_MAX_PENDING = 1000
+DEFAULT_MAX_BATCH = 500
+
+class WriteBehindWriter:
+    """Saves messages from a bounded queue in a background thread, committing them in groups"""
+    
+    def __init__(self, db_manager: DBManager, max_pending: int = DEFAULT_MAX_PENDING,
+                 max_batch: int = DEFAULT_MAX_BATCH):
+        """
+        Initialize the writer and start its thread
+        
+        Args:
+            db_manager: Database manager to save the messages with
+            max_pending: Messages that can wait in the queue before add_message() blocks (default: 1000)
+            max_batch: Maximum number of messages committed in one transaction (default: 500)
+        """
+        self.db_manager = db_manager
+        self.max_batch = max_batch
+        
+        # Queue items are (conversation ID, role, content, future); flush markers
+        # have no conversation ID, and None tells the thread to stop
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._closed = False
+        
+        # Counters: transactions committed and messages saved
+        self.batches = 0
+        self.written = 0
+        
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+    
+    def add_message(self, conversation_id: str, role: str, content: str) -> Future:
+        """
+        Queue a message to be saved
+        
+        Messages are saved in the order they are queued. If the queue is
+        full, this waits for room, which slows writers down to the pace of
+        the disk instead of growing the queue without limit.
+        
+        Args:
+            conversation_id: ID of the conversation to add the message to
+            role: Role of the sender (user or assistant)
+            content: Content of the message
+        
+        Returns:
+            A future resolving to the message ID once it is committed
+        
+        Raises:
+            RuntimeError: If the writer has been closed
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The write-behind writer is closed")
+            self._queue.put((conversation_id, role, content, future))
+        return future
+    
+    def flush(self, timeout: Optional[float] = None):
+        """
+        Wait until every message queued so far has been saved
+        
+        Args:
+            timeout: Maximum number of seconds to wait (default: None, waits as long as needed)
+        
+        Raises:
+            concurrent.futures.TimeoutError: If the messages weren't saved in time
+        """
+        marker = Future()
+        with self._lock:
+            if self._closed:
+                # close() has already saved everything
+                return
+            self._queue.put((None, None, None, marker))
+        marker.result(timeout)
+    
+    def close(self):
+        """Save every queued message and stop the thread; safe to call more than once"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            # Queued under the lock, so nothing can be added after the stop signal
+            self._queue.put(None)
+        
+        self._thread.join()
+    
+    def _run(self):
+        """Drain the queue, saving everything that has arrived in one transaction"""
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            if self._write(batch):
+                return
+    
+    def _write(self, batch: List[Optional[Tuple]]) -> bool:
+        """
+        Save the messages of a batch and resolve its futures
+        
+        Args:
+            batch: Queue items taken together
+        
+        Returns:
+            Whether the batch included the stop signal
+        """
+        messages = [item for item in batch if item is not None and item[0] is not None]
+        if messages:
+            try:
+                message_ids = self.db_manager.add_messages([item[:3] for item in messages])
+            except Exception:
+                logger.exception("Error saving %d queued messages; saving them one at a time", len(messages))
+                self._write_one_by_one(messages)
+            else:
+                for item, message_id in zip(messages, message_ids):
+                    item[3].set_result(message_id)
+                self.batches += 1
+                self.written += len(messages)
+        
+        # Flushes wait for everything queued before them, which has now been saved
+        for item in batch:
+            if item is not None and item[0] is None:
+                item[3].set_result(None)
+        
+        return any(item is None for item in batch)
+    
+    def _write_one_by_one(self, messages: List[Tuple]):
+        """Save messages separately, so one bad message doesn't lose the rest of its batch"""
+        for conversation_id, role, content, future in messages:
+            try:
+                future.set_result(self.db_manager.add_message(conversation_id, role, content))
+                self.batches += 1
+                self.written += 1
+            except Exception as e:
+                logger.error("Error saving message to conversation %s: %s", conversation_id, e)
+                future.set_exception(e)
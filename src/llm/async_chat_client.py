@@ -0,0 +1,317 @@
+"""
+Asyncio-based Chat Client for interacting with LLMs
+"""
+import asyncio
+import time
+from typing import List, Dict, Any, AsyncIterator, Iterable, Tuple
+from src.llm.chat_client import ChatClient
+from src.llm.client_registry import get_registry
+from src.llm.context_window import RollingSummaryStrategy
+from src.llm.scheduler import LLMRequestError, get_scheduler
+
+class AsyncChatClient(ChatClient):
+    """Async variant of ChatClient that can query several models concurrently"""
+    
+    def __init__(self, api_key: str = None, model: str = "gpt-3.5-turbo",
+                 openai_base_url: str = None, anthropic_base_url: str = None):
+        """
+        Initialize the async chat client
+        
+        Args:
+            api_key: API key for the LLM provider (default: None, will use environment variables)
+            model: Model to use for chat (default: gpt-3.5-turbo)
+            openai_base_url: OpenAI API base URL, e.g. of a local mock provider (default: None, uses OPENAI_BASE_URL or the real API)
+            anthropic_base_url: Anthropic API base URL (default: None, uses ANTHROPIC_BASE_URL or the real API)
+        """
+        # Response caching is only supported by the synchronous client
+        super().__init__(api_key, model, response_cache=None,
+                         openai_base_url=openai_base_url, anthropic_base_url=anthropic_base_url)
+    
+    def _init_clients(self):
+        """
+        Skip the synchronous provider clients
+        
+        Async clients are bound to an event loop, so a fresh one is taken from
+        the registry's pool for the running loop on every request instead.
+        """
+        self.openai_client = None
+        self.anthropic_client = None
+    
+    async def get_response(self, user_message: str) -> str:
+        """
+        Get a response from the LLM
+        
+        Args:
+            user_message: The user's message
+        
+        Returns:
+            The LLM's response as a string
+        
+        Raises:
+            LLMRequestError: If the request failed; the user message is then removed from the history
+        """
+        # Add the user message to the history
+        self.add_message("user", user_message)
+        
+        try:
+            response_text, _ = await self._send(self.model, self.conversation_history)
+        except LLMRequestError:
+            # Failed turns are not kept, so they can simply be sent again
+            self.conversation_history.pop()
+            raise
+        
+        # Add the assistant's response to history
+        self.add_message("assistant", response_text)
+        
+        return response_text
+    
+    async def stream_response(self, user_message: str) -> AsyncIterator[str]:
+        """
+        Stream a response from the LLM as it is generated
+        
+        The full response is added to the conversation history once the
+        stream has been consumed, exactly as get_response() would. If the
+        stream fails or is closed early, the user message is removed again.
+        
+        Args:
+            user_message: The user's message
+        
+        Yields:
+            Chunks of the LLM's response text as they arrive
+        
+        Raises:
+            LLMRequestError: If the request failed; the user message is then removed from the history
+        """
+        # Add the user message to the history
+        self.add_message("user", user_message)
+        user_turn = self.conversation_history[-1]
+        completed = False
+        
+        chunks = []
+        try:
+            async for delta in self._send_stream(self.model, self.conversation_history):
+                chunks.append(delta)
+                yield delta
+            
+            # Add the assistant's full response to history
+            self.add_message("assistant", "".join(chunks))
+            completed = True
+        finally:
+            # Failed turns, and streams abandoned part way (e.g. by a client disconnecting),
+            # are not kept, so they can simply be sent again
+            if not completed and self.conversation_history and self.conversation_history[-1] is user_turn:
+                self.conversation_history.pop()
+    
+    async def compare(self, user_message: str, models: Iterable[str]) -> Dict[str, str]:
+        """
+        Send the same conversation to several models at once
+        
+        The requests run concurrently, so the call takes as long as the
+        slowest model rather than the sum of all of them. The conversation
+        history, last_usage and last_metrics are left unchanged.
+        
+        Args:
+            user_message: The user's message
+            models: Display names of the models to compare
+        
+        Returns:
+            A dictionary mapping each model to its response
+        """
+        return {model: response async for model, response, _ in self.compare_as_completed(user_message, models)}
+    
+    async def compare_as_completed(self, user_message: str,
+                                   models: Iterable[str]) -> AsyncIterator[Tuple[str, str, Dict[str, int]]]:
+        """
+        Send the same conversation to several models and yield each answer as it completes
+        
+        Each answer comes with its own token usage, since the requests share
+        this client and last_usage could only hold one of them.
+        
+        Args:
+            user_message: The user's message
+            models: Display names of the models to compare
+        
+        Yields:
+            (model, response, usage) tuples in order of completion; usage is
+            empty if the request failed
+        """
+        history = self.conversation_history + [{"role": "user", "content": user_message}]
+        
+        async def run(model: str) -> Tuple[str, str, Dict[str, int]]:
+            return (model, *await self._complete(model, history))
+        
+        for finished in asyncio.as_completed([run(model) for model in models]):
+            yield await finished
+    
+    async def _complete(self, model: str, history: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+        """
+        Get a single completion for the given model and history, without touching last_usage or last_metrics
+        
+        Args:
+            model: Display name of the model to use
+            history: Messages to send to the model
+        
+        Returns:
+            The LLM's response, or an error message, as a string, and its token usage
+        """
+        try:
+            return await self._send(model, history, update_last=False)
+        except LLMRequestError as e:
+            return str(e), {}
+    
+    async def _send(self, model: str, history: List[Dict[str, Any]],
+                    update_last: bool = True) -> Tuple[str, Dict[str, int]]:
+        """
+        Send the history to a model through the provider's scheduler
+        
+        Args:
+            model: Display name of the model to use
+            history: Messages to send to the model
+            update_last: Keep the usage and timings in last_usage and last_metrics (default: True)
+        
+        Returns:
+            The LLM's response, and its token usage
+        
+        Raises:
+            LLMRequestError: If the request failed
+        """
+        history = self._context_messages(model, history)
+        tokens = self.token_counter.count_messages(model, history) + self.max_tokens
+        timings = {}
+        started = time.perf_counter()
+        
+        try:
+            provider, kwargs = self._request_args(model, history)
+            client = self._sdk_client(provider)
+            create = client.chat.completions.create if provider == "openai" else client.messages.create
+            response = await get_scheduler(provider).call_async(lambda: create(**kwargs), tokens, timings)
+            response_text, usage = self._parse_response(provider, response)
+            usage = self._record_usage(usage, provider, model, update_last=update_last)
+        except LLMRequestError:
+            self._record_request("complete", started, timings, "error", model=model, update_last=update_last)
+            raise
+        
+        self._record_request("complete", started, timings, "ok", first_token=time.perf_counter(), model=model,
+                             update_last=update_last)
+        return response_text, usage
+    
+    async def _send_stream(self, model: str, history: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """
+        Stream the answer of a model to the history through the provider's scheduler
+        
+        Args:
+            model: Display name of the model to use
+            history: Messages to send to the model
+        
+        Yields:
+            Chunks of the response text as they arrive
+        
+        Raises:
+            LLMRequestError: If the request failed
+        """
+        history = self._context_messages(model, history)
+        tokens = self.token_counter.count_messages(model, history) + self.max_tokens
+        
+        provider, kwargs = self._request_args(model, history, stream=True)
+        client = self._sdk_client(provider)
+        
+        if provider == "openai":
+            async def deltas():
+                usage = None
+                async for chunk in await client.chat.completions.create(**kwargs):
+                    text, chunk_usage = self._parse_chunk(chunk)
+                    if text:
+                        yield text
+                    if chunk_usage is not None:
+                        usage = chunk_usage
+                self._record_usage(usage, provider, model)
+        
+        else:
+            async def deltas():
+                async with client.messages.stream(**kwargs) as stream:
+                    async for text in stream.text_stream:
+                        yield text
+                    self._record_usage((await stream.get_final_message()).usage, provider, model)
+        
+        timings = {}
+        started = time.perf_counter()
+        first_token = None
+        try:
+            async for delta in get_scheduler(provider).stream_async(deltas, tokens, timings):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                yield delta
+        except LLMRequestError:
+            self._record_request("stream", started, timings, "error", model=model)
+            raise
+        self._record_request("stream", started, timings, "ok", first_token=first_token, model=model)
+    
+    def _context_messages(self, model: str = None, history: List[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Select the part of the conversation history to send to the provider
+        
+        Args:
+            model: Model the messages will be sent to (default: None, uses self.model)
+            history: Messages to trim (default: None, uses the conversation history)
+        
+        Returns:
+            The messages that fit the model's context budget
+        
+        Raises:
+            LLMRequestError: If the context strategy is a RollingSummaryStrategy
+        """
+        # Summaries are written by blocking requests, which would stall the event loop
+        if isinstance(self.context_strategy, RollingSummaryStrategy):
+            raise LLMRequestError("Error: Rolling summaries are not supported by the async client. Please use another context strategy.")
+        return super()._context_messages(model, history)
+    
+    def use_rolling_summary(self, summary_share: float = 0.25) -> RollingSummaryStrategy:
+        """
+        Refuse rolling summaries, which are written with blocking requests
+        
+        Raises:
+            LLMRequestError: Always
+        """
+        raise LLMRequestError("Error: Rolling summaries are not supported by the async client. Please use another context strategy.")
+    
+    def _sdk_client(self, provider: str):
+        """
+        Get the async SDK client of a provider, on the running event loop's connection pool
+        
+        Args:
+            provider: 'openai' or 'anthropic'
+        
+        Raises:
+            LLMRequestError: If the provider's API key or library is missing
+        """
+        if provider == "anthropic":
+            return self._get_async_anthropic_client()
+        return self._get_async_openai_client()
+    
+    def _get_async_openai_client(self):
+        """
+        Get an AsyncOpenAI client on the running event loop's connection pool
+        
+        Raises:
+            LLMRequestError: If no OpenAI API key is configured
+        """
+        if not self.openai_api_key:
+            raise LLMRequestError("Error: OpenAI API key not configured. Please add it to your .env file.", provider="openai")
+        
+        return get_registry().async_openai_client(self.openai_api_key, base_url=self.openai_base_url, max_retries=0)
+    
+    def _get_async_anthropic_client(self):
+        """
+        Get an AsyncAnthropic client on the running event loop's connection pool
+        
+        Raises:
+            LLMRequestError: If no Anthropic API key is configured or the library is not installed
+        """
+        if not self.anthropic_api_key:
+            raise LLMRequestError("Error: Anthropic API key not configured. Please add ANTHROPIC_API_KEY to your .env file.", provider="anthropic")
+        
+        try:
+            # The Anthropic library is only imported when needed
+            return get_registry().async_anthropic_client(self.anthropic_api_key, base_url=self.anthropic_base_url, max_retries=0)
+        except ImportError:
+            raise LLMRequestError("Error: The Anthropic Python library is not installed. Please run: pip install anthropic", provider="anthropic")
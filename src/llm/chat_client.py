@@ -1,10 +1,17 @@
 """
 Chat Client for interacting with LLMs
 """
-from openai import OpenAI
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+import logging
 import os
-import streamlit as st
+import time
+from src.llm.client_registry import get_registry
+from src.llm.context_window import ContextStrategy, RollingSummaryStrategy, SlidingWindowStrategy, TokenCounter, context_window
+from src.llm.response_cache import ResponseCache
+from src.llm.scheduler import LLMRequestError, get_scheduler
+from src.monitoring.metrics import LLM_REQUEST_DURATION, LLM_REQUESTS, LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS
+
+logger = logging.getLogger(__name__)
 
 class ChatClient:
     """Client for interacting with LLM APIs"""
@@ -17,26 +24,74 @@ class ChatClient:
         "claude-3-7-sonnet": "claude-3-7-sonnet-20250219"
     }
     
-    def __init__(self, api_key: str = None, model: str = "gpt-3.5-turbo"):
+    # OpenAI models offered in the UI
+    OPENAI_MODELS = ["gpt-3.5-turbo", "gpt-4"]
+    
+    # Anthropic doesn't cache prompts shorter than this, so breakpoints are
+    # only added once the conversation is long enough
+    PROMPT_CACHE_MIN_TOKENS = 1024
+    
+    # Token usage counters reported by the provider
+    USAGE_FIELDS = ["input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"]
+    
+    # Names of the OpenAI usage fields that match USAGE_FIELDS
+    OPENAI_USAGE_FIELDS = {"input_tokens": "prompt_tokens", "output_tokens": "completion_tokens"}
+    
+    def __init__(self, api_key: str = None, model: str = "gpt-3.5-turbo", response_cache: Optional[ResponseCache] = None,
+                 openai_base_url: str = None, anthropic_base_url: str = None):
         """
         Initialize the chat client
         
         Args:
             api_key: API key for the LLM provider (default: None, will use environment variables)
             model: Model to use for chat (default: gpt-3.5-turbo)
+            response_cache: Cache to answer repeated prompts from (default: None, caching disabled)
+            openai_base_url: OpenAI API base URL, e.g. of a local mock provider (default: None, uses OPENAI_BASE_URL or the real API)
+            anthropic_base_url: Anthropic API base URL (default: None, uses ANTHROPIC_BASE_URL or the real API)
         """
         self.openai_api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
+        self.openai_base_url = openai_base_url or os.getenv("OPENAI_BASE_URL") or None
+        self.anthropic_base_url = anthropic_base_url or os.getenv("ANTHROPIC_BASE_URL") or None
         self.model = model
         self.conversation_history = []
         
-        # Initialize OpenAI client
+        # Sampling parameters
+        self.temperature = 0.7
+        self.max_tokens = 1000
+        
+        # The history sent to the provider is trimmed to the model's context window
+        # (or to context_budget tokens, if set) by the context strategy
+        self.context_strategy: Optional[ContextStrategy] = SlidingWindowStrategy()
+        self.context_budget: Optional[int] = None
+        self.token_counter = TokenCounter()
+        
+        # Optional response cache, and whether the last response came from it
+        self.response_cache = response_cache
+        self.last_response_cached = False
+        
+        # Mark the stable prefix of Anthropic requests for provider-side caching
+        self.prompt_caching = os.getenv("ANTHROPIC_PROMPT_CACHING", "true").lower() not in ("0", "false", "no")
+        
+        # Token usage of the last response, and totals for this client
+        self.last_usage: Dict[str, int] = {}
+        self.usage_totals: Dict[str, int] = dict.fromkeys(self.USAGE_FIELDS, 0)
+        
+        # Timings of the last request: queue_wait, time_to_first_token and duration in seconds, and retries
+        self.last_metrics: Dict[str, Any] = {}
+        
+        self._init_clients()
+    
+    def _init_clients(self):
+        """Create the provider clients"""
+        # Initialize OpenAI client on the shared connection pool
         if self.openai_api_key:
-            self.openai_client = OpenAI(api_key=self.openai_api_key)
+            self.openai_client = get_registry().openai_client(self.openai_api_key, base_url=self.openai_base_url, max_retries=0)
         else:
             self.openai_client = None
-            
-        # We'll initialize other clients as needed
+        
+        # The Anthropic client is created on first use
+        self.anthropic_client = None
     
     def add_message(self, role: str, content: str):
         """
@@ -54,75 +109,497 @@ class ChatClient:
         
         Args:
             user_message: The user's message
-            
+        
         Returns:
             The LLM's response as a string
+        
+        Raises:
+            LLMRequestError: If the request failed; the user message is then removed from the history
+        """
+        # Add the user message to the history
+        self.add_message("user", user_message)
+        
+        # Only the part of the history that fits the context budget is sent
+        messages = self._context_messages()
+        
+        # Answer repeated prompts from the cache
+        cache_key = self._cache_key(messages)
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            self._record_cached_request()
+            self.add_message("assistant", cached)
+            return cached
+        
+        try:
+            response_text = self._request(messages)
+        except LLMRequestError:
+            # Failed turns are not kept, so they can simply be sent again
+            self.conversation_history.pop()
+            raise
+        
+        if cache_key:
+            self.response_cache.put(cache_key, self.model, response_text)
+        
+        # Add the assistant's response to history
+        self.add_message("assistant", response_text)
+        
+        return response_text
+    
+    def _request(self, messages: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> str:
+        """
+        Send messages to the current model and wait for the whole response
+        
+        Requests go through the provider's scheduler, which applies its rate
+        limits and retries rate-limited and failed requests. The request's
+        timings are kept in last_metrics.
+        
+        Args:
+            messages: Messages to send
+            max_tokens: Maximum response length (default: None, uses self.max_tokens)
+        
+        Returns:
+            The response text
+        
+        Raises:
+            LLMRequestError: If the request failed
+        """
+        max_tokens = max_tokens or self.max_tokens
+        tokens = self.token_counter.count_messages(self.model, messages) + max_tokens
+        timings = {}
+        started = time.perf_counter()
+        
+        try:
+            provider, kwargs = self._request_args(self.model, messages, max_tokens)
+            client = self._sdk_client(provider)
+            create = client.chat.completions.create if provider == "openai" else client.messages.create
+            response = get_scheduler(provider).call(lambda: create(**kwargs), tokens, timings)
+            response_text, usage = self._parse_response(provider, response)
+            self._record_usage(usage, provider)
+        except LLMRequestError:
+            self._record_request("complete", started, timings, "error")
+            raise
+        
+        # Without streaming, the first token arrives with the rest of the response
+        self._record_request("complete", started, timings, "ok", first_token=time.perf_counter())
+        return response_text
+    
+    def stream_response(self, user_message: str) -> Iterator[str]:
+        """
+        Stream a response from the LLM as it is generated
+        
+        The full response is added to the conversation history once the
+        stream has been consumed, exactly as get_response() would. If the
+        stream fails or is closed early, the user message is removed again.
+        
+        Args:
+            user_message: The user's message
+        
+        Yields:
+            Chunks of the LLM's response text as they arrive
+        
+        Raises:
+            LLMRequestError: If the request failed; the user message is then removed from the history
         """
         # Add the user message to the history
         self.add_message("user", user_message)
+        user_turn = self.conversation_history[-1]
+        completed = False
         
-        # Determine which provider to use based on the model
-        if self.model.startswith("gpt"):
-            # Using OpenAI
-            if not self.openai_client:
-                return "Error: OpenAI API key not configured. Please add it to your .env file."
+        try:
+            # Only the part of the history that fits the context budget is sent
+            messages = self._context_messages()
             
-            try:
-                response = self.openai_client.chat.completions.create(
-                    model=self.model,
-                    messages=self.conversation_history,
-                    temperature=0.7,
-                    max_tokens=1000
-                )
-                
-                response_text = response.choices[0].message.content
-            except Exception as e:
-                response_text = f"Error calling OpenAI API: {str(e)}"
-                
-        elif self.model.startswith("claude"):
-            # Claude models
-            if not self.anthropic_api_key:
-                return "Error: Anthropic API key not configured. Please add ANTHROPIC_API_KEY to your .env file."
+            # Answer repeated prompts from the cache in a single chunk
+            cache_key = self._cache_key(messages)
+            cached = self._cached_response(cache_key)
+            if cached is not None:
+                self._record_cached_request()
+                yield cached
+                self.add_message("assistant", cached)
+                completed = True
+                return
+            
+            chunks = []
+            tokens = self.token_counter.count_messages(self.model, messages) + self.max_tokens
+            timings = {}
+            started = time.perf_counter()
+            first_token = None
             
             try:
-                # Import Anthropic library only when needed
-                import anthropic
+                provider, kwargs = self._request_args(self.model, messages, stream=True)
+                client = self._sdk_client(provider)
                 
-                # Convert conversation history to Anthropic format
-                messages = []
-                for msg in self.conversation_history:
-                    if msg["role"] == "user":
-                        messages.append({"role": "user", "content": msg["content"]})
-                    elif msg["role"] == "assistant":
-                        messages.append({"role": "assistant", "content": msg["content"]})
+                if provider == "openai":
+                    def deltas():
+                        usage = None
+                        for chunk in client.chat.completions.create(**kwargs):
+                            text, chunk_usage = self._parse_chunk(chunk)
+                            if text:
+                                yield text
+                            if chunk_usage is not None:
+                                usage = chunk_usage
+                        self._record_usage(usage, provider)
                 
-                # Create Anthropic client
-                anthropic_client = anthropic.Anthropic(api_key=self.anthropic_api_key)
+                else:
+                    def deltas():
+                        with client.messages.stream(**kwargs) as stream:
+                            yield from stream.text_stream
+                            self._record_usage(stream.get_final_message().usage, provider)
                 
-                # Map the display model name to the actual API model name
-                actual_model = self.ANTHROPIC_MODEL_MAP.get(self.model, self.model)
-                
-                # Debug information
-                print(f"Using Anthropic model: {actual_model}")
-                
-                response = anthropic_client.messages.create(
-                    model=actual_model,
-                    messages=messages,
-                    max_tokens=1000
+                for delta in get_scheduler(provider).stream(deltas, tokens, timings):
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    chunks.append(delta)
+                    yield delta
+            except LLMRequestError:
+                self._record_request("stream", started, timings, "error")
+                raise
+            
+            self._record_request("stream", started, timings, "ok", first_token=first_token)
+            response_text = "".join(chunks)
+            if cache_key:
+                self.response_cache.put(cache_key, self.model, response_text)
+            
+            # Add the assistant's full response to history
+            self.add_message("assistant", response_text)
+            completed = True
+        finally:
+            # Failed turns, and streams abandoned part way (e.g. by a Streamlit rerun),
+            # are not kept, so they can simply be sent again
+            if not completed and self.conversation_history and self.conversation_history[-1] is user_turn:
+                self.conversation_history.pop()
+    
+    def _context_messages(self, model: str = None, history: List[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Select the part of the conversation history to send to the provider
+        
+        The history itself is left intact; only the request payload is trimmed.
+        
+        Args:
+            model: Model the messages will be sent to (default: None, uses self.model)
+            history: Messages to trim (default: None, uses the conversation history)
+        
+        Returns:
+            The messages that fit the model's context budget
+        """
+        model = model or self.model
+        history = self.conversation_history if history is None else history
+        if self.context_strategy is None:
+            return history
+        
+        budget = self.context_budget or context_window(model) - self.max_tokens
+        return self.context_strategy.fit(
+            history,
+            budget,
+            lambda message: self.token_counter.count(model, message)
+        )
+    
+    def use_rolling_summary(self, summary_share: float = 0.25) -> RollingSummaryStrategy:
+        """
+        Replace older turns with a running summary written by the current model
+        
+        Args:
+            summary_share: Fraction of the context budget reserved for the summary (default: 0.25)
+        
+        Returns:
+            The new context strategy
+        """
+        self.context_strategy = RollingSummaryStrategy(self._summarize, summary_share)
+        return self.context_strategy
+    
+    def _summarize(self, summary: str, messages: List[Dict[str, Any]], max_tokens: int) -> str:
+        """
+        Fold messages into a running conversation summary using the current model
+        
+        Args:
+            summary: The summary so far (may be empty)
+            messages: Messages to add to the summary
+            max_tokens: Maximum length of the new summary
+        
+        Returns:
+            The updated summary, or the previous one if the request failed
+        """
+        transcript = "\n\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        prompt = (
+            "Update the summary of a conversation with the new messages below. "
+            "Keep facts, decisions and open questions; be concise.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"
+        )
+        
+        try:
+            return self._request([{"role": "user", "content": prompt}], max_tokens=max_tokens)
+        except LLMRequestError:
+            return summary
+    
+    def _cache_key(self, messages: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        Build the response cache key for a request
+        
+        Args:
+            messages: Messages being sent
+        
+        Returns:
+            The cache key, or None if caching is disabled
+        """
+        self.last_response_cached = False
+        if self.response_cache is None:
+            return None
+        return ResponseCache.make_key(self.model, messages, self.temperature, self.max_tokens)
+    
+    def _cached_response(self, cache_key: Optional[str]) -> Optional[str]:
+        """
+        Look up a cached response for the current request
+        
+        Args:
+            cache_key: Key returned by _cache_key()
+        
+        Returns:
+            The cached response, or None if there isn't one
+        """
+        if cache_key is None:
+            return None
+        
+        cached = self.response_cache.get(cache_key)
+        self.last_response_cached = cached is not None
+        return cached
+    
+    def _request_args(self, model: str, messages: List[Dict[str, Any]], max_tokens: Optional[int] = None,
+                      stream: bool = False) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build the arguments of a chat request, shared by ChatClient and AsyncChatClient
+        
+        Args:
+            model: Display name of the model to use
+            messages: Messages to send
+            max_tokens: Maximum response length (default: None, uses self.max_tokens)
+            stream: Whether the response will be streamed (default: False)
+        
+        Returns:
+            The provider ('openai' or 'anthropic') and the keyword arguments for
+            its SDK's create() (or, for streamed Anthropic requests, stream())
+        
+        Raises:
+            LLMRequestError: If the model isn't supported
+        """
+        provider = self._provider(model)
+        max_tokens = max_tokens or self.max_tokens
+        
+        if provider == "openai":
+            kwargs = {"model": model, "messages": messages, "temperature": self.temperature, "max_tokens": max_tokens}
+            if stream:
+                # The last chunk then carries the token usage
+                kwargs.update(stream=True, stream_options={"include_usage": True})
+            return provider, kwargs
+        
+        if provider == "anthropic":
+            # Map the display model name to the actual API model name
+            actual_model = self.ANTHROPIC_MODEL_MAP.get(model, model)
+            logger.debug("Using Anthropic model %s", actual_model)
+            return provider, {"model": actual_model, "messages": self._anthropic_messages(messages), "max_tokens": max_tokens}
+        
+        raise LLMRequestError(f"Unsupported model: {model}. Please select a different model.")
+    
+    @staticmethod
+    def _parse_response(provider: str, response: Any) -> Tuple[str, Any]:
+        """
+        Read the text and usage of a complete response
+        
+        Args:
+            provider: 'openai' or 'anthropic'
+            response: The SDK's response object
+        
+        Returns:
+            The response text, and the usage object for _record_usage() (None if the provider sent none)
+        """
+        if provider == "openai":
+            return response.choices[0].message.content, getattr(response, "usage", None)
+        return response.content[0].text, response.usage
+    
+    @staticmethod
+    def _parse_chunk(chunk: Any) -> Tuple[Optional[str], Any]:
+        """
+        Read the text and usage of an OpenAI stream chunk
+        
+        Args:
+            chunk: The SDK's chunk object
+        
+        Returns:
+            The text delta (None if the chunk has none), and the usage object,
+            which only the last chunk carries
+        """
+        text = chunk.choices[0].delta.content if chunk.choices else None
+        return text, getattr(chunk, "usage", None)
+    
+    def _sdk_client(self, provider: str):
+        """
+        Get the SDK client of a provider
+        
+        Args:
+            provider: 'openai' or 'anthropic'
+        
+        Raises:
+            LLMRequestError: If the provider's API key or library is missing
+        """
+        if provider == "anthropic":
+            return self._get_anthropic_client()
+        if not self.openai_client:
+            raise LLMRequestError("Error: OpenAI API key not configured. Please add it to your .env file.", provider="openai")
+        return self.openai_client
+    
+    def _get_anthropic_client(self):
+        """
+        Get the Anthropic client, creating it on the shared connection pool on first use
+        
+        Returns:
+            An anthropic.Anthropic client
+        
+        Raises:
+            LLMRequestError: If the API key or the Anthropic library is missing
+        """
+        if not self.anthropic_api_key:
+            raise LLMRequestError("Error: Anthropic API key not configured. Please add ANTHROPIC_API_KEY to your .env file.", provider="anthropic")
+        
+        if self.anthropic_client is None:
+            try:
+                # The Anthropic library is only imported when needed
+                self.anthropic_client = get_registry().anthropic_client(
+                    self.anthropic_api_key, base_url=self.anthropic_base_url, max_retries=0
                 )
-                
-                response_text = response.content[0].text
             except ImportError:
-                response_text = "Error: The Anthropic Python library is not installed. Please run: pip install anthropic"
-            except Exception as e:
-                response_text = f"Error calling Anthropic API: {str(e)}"
-        else:
-            response_text = f"Unsupported model: {self.model}. Please select a different model."
+                raise LLMRequestError("Error: The Anthropic Python library is not installed. Please run: pip install anthropic", provider="anthropic")
+        return self.anthropic_client
+    
+    def _anthropic_messages(self, history: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        Convert the conversation history to the Anthropic message format
         
-        # Add the assistant's response to history
-        self.add_message("assistant", response_text)
+        Args:
+            history: Messages to convert (default: the conversation history)
         
-        return response_text
+        Returns:
+            A list of user/assistant messages suitable for the Messages API
+        """
+        if history is None:
+            history = self.conversation_history
+        
+        messages = []
+        for msg in history:
+            if msg["role"] == "user":
+                messages.append({"role": "user", "content": msg["content"]})
+            elif msg["role"] == "assistant":
+                messages.append({"role": "assistant", "content": msg["content"]})
+        
+        if self.prompt_caching and messages:
+            tokens = self.token_counter.count_messages("claude", history)
+            if tokens >= self.PROMPT_CACHE_MIN_TOKENS:
+                self._add_cache_breakpoints(messages)
+        return messages
+    
+    @staticmethod
+    def _add_cache_breakpoints(messages: List[Dict[str, Any]]):
+        """
+        Mark the stable prefix of a request for Anthropic prompt caching
+        
+        The last message is marked so the whole prompt is written to the cache,
+        and the previous user message is marked too because that is where the
+        previous request ended, so the prefix cached then is read back now.
+        
+        Args:
+            messages: Messages in the Anthropic format, updated in place
+        """
+        breakpoints = [len(messages) - 1]
+        for i in range(len(messages) - 2, -1, -1):
+            if messages[i]["role"] == "user":
+                breakpoints.append(i)
+                break
+        
+        for i in breakpoints:
+            messages[i] = {
+                "role": messages[i]["role"],
+                "content": [{
+                    "type": "text",
+                    "text": messages[i]["content"],
+                    "cache_control": {"type": "ephemeral"}
+                }]
+            }
+    
+    def _provider(self, model: str = None) -> str:
+        """Name of a model's provider (default: the current model's), as used in metric labels"""
+        model = model or self.model
+        if model.startswith("gpt"):
+            return "openai"
+        if model.startswith("claude"):
+            return "anthropic"
+        return "unknown"
+    
+    def _record_request(self, mode: str, started: float, timings: Dict[str, float], outcome: str,
+                        first_token: Optional[float] = None, model: str = None, update_last: bool = True):
+        """
+        Record the timings of a finished request in last_metrics and the metrics registry
+        
+        Args:
+            mode: 'complete' or 'stream'
+            started: time.perf_counter() when the request was made
+            timings: Queue wait and retries collected by the scheduler
+            outcome: 'ok' or 'error'
+            first_token: time.perf_counter() when the first response text arrived (default: None)
+            model: Model the request was sent to (default: None, the current model)
+            update_last: Keep the timings in last_metrics (default: True); concurrent requests
+                to several models leave it alone
+        """
+        model = model or self.model
+        provider = self._provider(model)
+        duration = time.perf_counter() - started
+        
+        if update_last:
+            self.last_metrics = {
+                "queue_wait": timings.get("queue_wait", 0.0),
+                "time_to_first_token": first_token - started if first_token is not None else None,
+                "duration": duration,
+                "retries": timings.get("retries", 0)
+            }
+        
+        LLM_REQUESTS.inc(provider=provider, model=model, outcome=outcome)
+        LLM_REQUEST_DURATION.observe(duration, provider=provider, model=model, mode=mode)
+        # Without streaming the first token arrives with the whole response, which is already in the duration
+        if mode == "stream" and first_token is not None:
+            LLM_TIME_TO_FIRST_TOKEN.observe(first_token - started, provider=provider, model=model)
+    
+    def _record_cached_request(self):
+        """Record a request answered from the response cache"""
+        self.last_usage = {}
+        self.last_metrics = {"queue_wait": 0.0, "time_to_first_token": 0.0, "duration": 0.0, "retries": 0}
+        LLM_REQUESTS.inc(provider=self._provider(), model=self.model, outcome="cached")
+    
+    def _record_usage(self, usage: Any, provider: str = "anthropic", model: str = None,
+                      update_last: bool = True) -> Dict[str, int]:
+        """
+        Record the token usage reported with a response
+        
+        Args:
+            usage: The response's usage object (None if the provider sent none)
+            provider: 'anthropic' or 'openai', whose usage fields are named differently (default: anthropic)
+            model: Model that answered (default: None, the current model)
+            update_last: Keep the usage in last_usage (default: True); concurrent requests
+                to several models leave it alone
+        
+        Returns:
+            The token counts, keyed by USAGE_FIELDS
+        """
+        counts = {}
+        for field in self.USAGE_FIELDS:
+            if provider == "openai":
+                value = getattr(usage, self.OPENAI_USAGE_FIELDS.get(field, field), None)
+            else:
+                value = getattr(usage, field, None)
+            counts[field] = value if isinstance(value, int) else 0
+            self.usage_totals[field] = self.usage_totals.get(field, 0) + counts[field]
+            if counts[field]:
+                LLM_TOKENS.inc(counts[field], provider=provider, model=model or self.model, type=field)
+        
+        if update_last:
+            self.last_usage = counts
+        return counts
     
     def clear_history(self):
         """Clear the conversation history"""
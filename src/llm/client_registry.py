@@ -0,0 +1,243 @@
+"""
+Process-wide registry of pooled HTTP connections for the LLM provider clients
+"""
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default pool and timeout settings, overridable through environment variables
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+DEFAULT_TIMEOUT = 600.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+
+# Base URLs used to pre-warm connections when none is configured
+DEFAULT_BASE_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "anthropic": "https://api.anthropic.com",
+}
+
+class ClientRegistry:
+    """Registry of keep-alive HTTP pools shared by every provider client in the process"""
+    
+    def __init__(self, max_connections: int = None, max_keepalive_connections: int = None,
+                 keepalive_expiry: float = None, timeout: float = None, connect_timeout: float = None):
+        """
+        Initialize the client registry
+        
+        Args:
+            max_connections: Maximum number of open connections per provider (default: LLM_POOL_MAX_CONNECTIONS or 100)
+            max_keepalive_connections: Maximum number of idle connections kept open per provider (default: LLM_POOL_MAX_KEEPALIVE or 20)
+            keepalive_expiry: Seconds an idle connection is kept open (default: LLM_POOL_KEEPALIVE_EXPIRY or 60)
+            timeout: Overall request timeout in seconds (default: LLM_TIMEOUT or 600)
+            connect_timeout: Connection timeout in seconds (default: LLM_CONNECT_TIMEOUT or 5)
+        """
+        # httpx comes with the provider SDKs; like them, it is only imported once a provider is used
+        import httpx
+        
+        self.limits = httpx.Limits(
+            max_connections=max_connections or int(os.getenv("LLM_POOL_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+            max_keepalive_connections=max_keepalive_connections or int(os.getenv("LLM_POOL_MAX_KEEPALIVE", DEFAULT_MAX_KEEPALIVE_CONNECTIONS)),
+            keepalive_expiry=keepalive_expiry or float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY)),
+        )
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT", DEFAULT_TIMEOUT))
+        self.connect_timeout = connect_timeout or float(os.getenv("LLM_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT))
+        
+        self._lock = threading.Lock()
+        self._http_clients: Dict[str, Any] = {}
+        # Async pools are bound to the event loop they were created on
+        self._async_http_clients = weakref.WeakKeyDictionary()
+        self._prewarmed = False
+    
+    def openai_client(self, api_key: str, base_url: Optional[str] = None, max_retries: Optional[int] = None) -> "openai.OpenAI":
+        """
+        Create an OpenAI client that uses the shared connection pool
+        
+        Args:
+            api_key: OpenAI API key
+            base_url: Override for the API base URL (default: None, uses the SDK default)
+            max_retries: Retries made by the SDK itself (default: None, uses the SDK default)
+        
+        Returns:
+            An OpenAI client
+        """
+        import openai
+        
+        return openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=openai.DEFAULT_MAX_RETRIES if max_retries is None else max_retries,
+            timeout=self._timeout("openai"),
+            http_client=self._http_client("openai"),
+        )
+    
+    def async_openai_client(self, api_key: str, base_url: Optional[str] = None, max_retries: Optional[int] = None) -> "openai.AsyncOpenAI":
+        """
+        Create an AsyncOpenAI client that uses the current event loop's shared connection pool
+        
+        Args:
+            api_key: OpenAI API key
+            base_url: Override for the API base URL (default: None, uses the SDK default)
+            max_retries: Retries made by the SDK itself (default: None, uses the SDK default)
+        
+        Returns:
+            An AsyncOpenAI client
+        """
+        import openai
+        
+        return openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=openai.DEFAULT_MAX_RETRIES if max_retries is None else max_retries,
+            timeout=self._timeout("openai"),
+            http_client=self._async_http_client("openai"),
+        )
+    
+    def anthropic_client(self, api_key: str, base_url: Optional[str] = None, max_retries: Optional[int] = None) -> Any:
+        """
+        Create an Anthropic client that uses the shared connection pool
+        
+        Args:
+            api_key: Anthropic API key
+            base_url: Override for the API base URL (default: None, uses the SDK default)
+            max_retries: Retries made by the SDK itself (default: None, uses the SDK default)
+        
+        Returns:
+            An anthropic.Anthropic client
+        """
+        # Import Anthropic library only when needed
+        import anthropic
+        
+        return anthropic.Anthropic(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=anthropic.DEFAULT_MAX_RETRIES if max_retries is None else max_retries,
+            timeout=self._timeout("anthropic"),
+            http_client=self._http_client("anthropic"),
+        )
+    
+    def async_anthropic_client(self, api_key: str, base_url: Optional[str] = None, max_retries: Optional[int] = None) -> Any:
+        """
+        Create an AsyncAnthropic client that uses the current event loop's shared connection pool
+        
+        Args:
+            api_key: Anthropic API key
+            base_url: Override for the API base URL (default: None, uses the SDK default)
+            max_retries: Retries made by the SDK itself (default: None, uses the SDK default)
+        
+        Returns:
+            An anthropic.AsyncAnthropic client
+        """
+        # Import Anthropic library only when needed
+        import anthropic
+        
+        return anthropic.AsyncAnthropic(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=anthropic.DEFAULT_MAX_RETRIES if max_retries is None else max_retries,
+            timeout=self._timeout("anthropic"),
+            http_client=self._async_http_client("anthropic"),
+        )
+    
+    def prewarm(self, providers: Iterable[str] = None, background: bool = True):
+        """
+        Open a connection to each provider ahead of the first request
+        
+        Only the first call does any work, so this is safe to call on every
+        Streamlit rerun.
+        
+        Args:
+            providers: Providers to warm up (default: every provider with an API key configured)
+            background: Whether to connect in a daemon thread instead of blocking (default: True)
+        """
+        with self._lock:
+            if self._prewarmed:
+                return
+            self._prewarmed = True
+        
+        if providers is None:
+            providers = [
+                provider for provider, key in (("openai", "OPENAI_API_KEY"), ("anthropic", "ANTHROPIC_API_KEY"))
+                if os.getenv(key)
+            ]
+        
+        def warm():
+            for provider in providers:
+                base_url = os.getenv(f"{provider.upper()}_BASE_URL") or DEFAULT_BASE_URLS[provider]
+                try:
+                    # Any response will do; the point is the TLS handshake and the pooled connection
+                    self._http_client(provider).head(base_url)
+                except Exception as e:
+                    logger.warning("Error pre-warming %s connection: %s", provider, e)
+        
+        if background:
+            threading.Thread(target=warm, name="llm-prewarm", daemon=True).start()
+        else:
+            warm()
+    
+    def close(self):
+        """Close every synchronous connection pool held by the registry"""
+        with self._lock:
+            http_clients = list(self._http_clients.values())
+            self._http_clients.clear()
+            self._prewarmed = False
+        
+        for http_client in http_clients:
+            http_client.close()
+    
+    def _http_client(self, provider: str) -> Any:
+        """Get or create the shared synchronous HTTP client for a provider"""
+        with self._lock:
+            if provider not in self._http_clients:
+                self._http_clients[provider] = self._sdk(provider).DefaultHttpxClient(
+                    limits=self.limits,
+                    timeout=self._timeout(provider),
+                )
+            return self._http_clients[provider]
+    
+    def _async_http_client(self, provider: str) -> Any:
+        """Get or create the shared asynchronous HTTP client for a provider on the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pools = self._async_http_clients.setdefault(loop, {})
+            if provider not in pools:
+                pools[provider] = self._sdk(provider).DefaultAsyncHttpxClient(
+                    limits=self.limits,
+                    timeout=self._timeout(provider),
+                )
+            return pools[provider]
+    
+    def _timeout(self, provider: str) -> Any:
+        """Build the request timeout using the provider SDK's own Timeout type"""
+        return self._sdk(provider).Timeout(self.timeout, connect=self.connect_timeout)
+    
+    @staticmethod
+    def _sdk(provider: str) -> Any:
+        """Get the SDK module for a provider, importing it on first use"""
+        if provider == "anthropic":
+            import anthropic
+            return anthropic
+        import openai
+        return openai
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> ClientRegistry:
+    """
+    Get the process-wide client registry, creating it on first use
+    
+    Returns:
+        The shared ClientRegistry instance
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry()
+        return _registry
@@ -0,0 +1,237 @@
+"""
+Context window management for LLM requests
+Counts tokens and trims the history sent to the provider to fit a budget
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Dict, Any
+
+# Context window sizes in tokens, matched by model name prefix (longest prefix wins)
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "claude": 200000
+}
+
+# Used for models that aren't listed above
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Approximate number of tokens each message adds on top of its content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def context_window(model: str) -> int:
+    """
+    Get the context window size of a model
+    
+    Args:
+        model: Display or API name of the model
+    
+    Returns:
+        The context window in tokens
+    """
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model.startswith(prefix)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+class TokenCounter:
+    """Counts message tokens, remembering the count for every message it has seen"""
+    
+    def __init__(self, max_entries: int = 50000):
+        """
+        Initialize the token counter
+        
+        Args:
+            max_entries: Maximum number of message counts kept (default: 50000)
+        """
+        self.max_entries = max_entries
+        self._counts = OrderedDict()
+        self._encodings = {}
+        self._lock = threading.Lock()
+    
+    def count(self, model: str, message: Dict[str, Any]) -> int:
+        """
+        Count the tokens a message uses
+        
+        Args:
+            model: Model the message will be sent to
+            message: A message with 'role' and 'content'
+        
+        Returns:
+            The number of tokens, including the per-message overhead
+        """
+        # Strings cache their own hash, so repeated lookups of the same message are cheap
+        key = (self._family(model), message["content"])
+        
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                return count
+        
+        count = self._count_text(model, message["content"]) + MESSAGE_OVERHEAD_TOKENS
+        
+        with self._lock:
+            self._counts[key] = count
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        
+        return count
+    
+    def count_messages(self, model: str, messages: List[Dict[str, Any]]) -> int:
+        """
+        Count the tokens used by a list of messages
+        
+        Args:
+            model: Model the messages will be sent to
+            messages: Messages with 'role' and 'content'
+        
+        Returns:
+            The total number of tokens
+        """
+        return sum(self.count(model, message) for message in messages)
+    
+    @staticmethod
+    def _family(model: str) -> str:
+        """Group models that share a tokenizer"""
+        return "claude" if model.startswith("claude") else model
+    
+    def _count_text(self, model: str, text: str) -> int:
+        """Count the tokens in a piece of text"""
+        encoding = self._encoding(model)
+        if encoding is None:
+            # Roughly four characters per token for English text
+            return (len(text) + 3) // 4
+        return len(encoding.encode(text, disallowed_special=()))
+    
+    def _encoding(self, model: str) -> Any:
+        """Get the tiktoken encoding for an OpenAI model, or None to estimate"""
+        if not model.startswith("gpt"):
+            return None
+        
+        if model not in self._encodings:
+            try:
+                # tiktoken is optional; without it token counts are estimated
+                import tiktoken
+                self._encodings[model] = tiktoken.encoding_for_model(model)
+            except Exception:
+                self._encodings[model] = None
+        
+        return self._encodings[model]
+
+class ContextStrategy:
+    """Base class for ways of fitting a conversation into a token budget"""
+    
+    def fit(self, messages: List[Dict[str, Any]], budget: int, count: Callable[[Dict[str, Any]], int]) -> List[Dict[str, Any]]:
+        """
+        Choose the messages to send to the provider
+        
+        Args:
+            messages: The full conversation history (never modified)
+            budget: Maximum number of prompt tokens
+            count: Function returning the token count of a message
+        
+        Returns:
+            The messages to send
+        """
+        raise NotImplementedError
+    
+    @staticmethod
+    def _recent(messages: List[Dict[str, Any]], budget: int, count: Callable[[Dict[str, Any]], int]) -> List[Dict[str, Any]]:
+        """
+        Take the most recent messages that fit in the budget
+        
+        The latest message is always kept, and the window never starts with
+        an assistant message because providers expect the user to speak first.
+        """
+        used = 0
+        start = len(messages)
+        while start > 0:
+            size = count(messages[start - 1])
+            if used + size > budget and start < len(messages):
+                break
+            used += size
+            start -= 1
+        
+        while start < len(messages) - 1 and messages[start]["role"] != "user":
+            start += 1
+        
+        return messages[start:]
+
+class SlidingWindowStrategy(ContextStrategy):
+    """Send only the most recent messages that fit"""
+    
+    def fit(self, messages, budget, count):
+        """Keep the most recent messages that fit in the budget"""
+        if sum(count(message) for message in messages) <= budget:
+            return messages
+        return self._recent(messages, budget, count)
+
+class PinFirstStrategy(ContextStrategy):
+    """Always send the first few messages, then as many recent ones as fit"""
+    
+    def __init__(self, pinned: int = 2):
+        """
+        Initialize the strategy
+        
+        Args:
+            pinned: Number of leading messages that are always sent (default: 2)
+        """
+        self.pinned = pinned
+    
+    def fit(self, messages, budget, count):
+        """Keep the pinned messages plus the most recent messages that fit alongside them"""
+        if sum(count(message) for message in messages) <= budget:
+            return messages
+        
+        pinned = messages[:self.pinned]
+        remaining = budget - sum(count(message) for message in pinned)
+        return pinned + self._recent(messages[self.pinned:], remaining, count)
+
+class RollingSummaryStrategy(ContextStrategy):
+    """Replace older turns with a running summary that is extended as more turns fall out of the window"""
+    
+    def __init__(self, summarize: Callable[[str, List[Dict[str, Any]], int], str], summary_share: float = 0.25):
+        """
+        Initialize the strategy
+        
+        Args:
+            summarize: Function taking the previous summary, the messages to fold
+                into it and a token limit, and returning the new summary
+            summary_share: Fraction of the budget reserved for the summary (default: 0.25)
+        """
+        self.summarize = summarize
+        self.summary_share = summary_share
+        self.summary = ""
+        self._covered = 0
+        self._first_message = None
+    
+    def fit(self, messages, budget, count):
+        """Keep the most recent messages and prepend a summary of everything before them"""
+        # Start over when the conversation changes; messages are compared by value
+        # because the history may be rebuilt from the database between requests
+        if not messages or messages[0] != self._first_message or len(messages) < self._covered:
+            self.summary = ""
+            self._covered = 0
+            self._first_message = dict(messages[0]) if messages else None
+        
+        if not self.summary and sum(count(message) for message in messages) <= budget:
+            return messages
+        
+        reserve = int(budget * self.summary_share)
+        recent = self._recent(messages[self._covered:], budget - reserve, count)
+        start = len(messages) - len(recent)
+        
+        # Only the turns that have just left the window are summarized
+        if start > self._covered:
+            self.summary = self.summarize(self.summary, messages[self._covered:start], reserve)
+            self._covered = start
+        
+        if not self.summary:
+            return recent
+        
+        first = dict(recent[0])
+        first["content"] = f"Summary of the earlier conversation:\n{self.summary}\n\n{first['content']}"
+        return [first] + recent[1:]
@@ -3,10 +3,8 @@ Factory class for creating LLM clients based on provider
 """
 import os
 from typing import Optional, Dict, Any
-from openai import OpenAI
-from langchain.chat_models import ChatOpenAI
-from langchain_openai import ChatOpenAI as LangchainChatOpenAI
 from dotenv import load_dotenv
+from src.llm.client_registry import get_registry
 
 # Load environment variables
 load_dotenv()
@@ -35,7 +33,7 @@ class LLMFactory:
             if not model:
                 model = "gpt-3.5-turbo"
                 
-            return OpenAI(api_key=api_key)
+            return get_registry().openai_client(api_key)
         
         elif provider == "anthropic":
             api_key = os.getenv("ANTHROPIC_API_KEY")
@@ -58,7 +56,10 @@ class LLMFactory:
             
             if not model:
                 model = "gpt-3.5-turbo"
-                
+            
+            # LangChain is slow to import, so it is only loaded when asked for
+            from langchain_openai import ChatOpenAI as LangchainChatOpenAI
+            
             return LangchainChatOpenAI(openai_api_key=api_key, model_name=model)
             
         else:
@@ -0,0 +1,434 @@
+"""
+Local stand-in for the OpenAI and Anthropic APIs
+Speaks the chat completions and messages wire formats, including streaming,
+with configurable latency, token rate, injected errors and record/replay, so
+the app can be load-tested and benchmarked without real API calls
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from src.llm.context_window import TokenCounter
+
+# Upstream APIs used when recording
+DEFAULT_UPSTREAM_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "anthropic": "https://api.anthropic.com"
+}
+
+# Request headers passed on to the upstream API when recording
+FORWARDED_HEADERS = ("authorization", "x-api-key", "anthropic-version", "anthropic-beta", "openai-organization")
+
+# Words the synthetic answers are made of
+FILLER_WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et dolore magna aliqua".split()
+
+class Recording:
+    """Recorded provider answers, stored as JSON Lines and looked up by request"""
+    
+    def __init__(self, path: str):
+        """
+        Initialize the recording, loading the answers already in the file
+        
+        Args:
+            path: JSONL file holding the recorded answers
+        """
+        self.path = path
+        self.answers: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        answer = json.loads(line)
+                        self.answers[answer["key"]] = answer
+        except FileNotFoundError:
+            pass
+    
+    @staticmethod
+    def key(provider: str, model: str, messages: List[Dict[str, str]], system: str = "",
+            temperature: float = None, max_tokens: int = None) -> str:
+        """
+        Build the lookup key of a request
+        
+        Args:
+            provider: 'openai' or 'anthropic'
+            model: Model the request was sent to
+            messages: The request's messages, with plain text content
+            system: The Anthropic system prompt, as plain text (default: none)
+            temperature: The request's sampling temperature (default: None, the provider default)
+            max_tokens: The request's maximum response length (default: None, the provider default)
+        
+        Returns:
+            A hash of the provider, model, system prompt, messages and sampling parameters
+        """
+        data = json.dumps([provider, model, system, messages, temperature, max_tokens], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the recorded answer to a request
+        
+        Args:
+            key: Lookup key of the request
+        
+        Returns:
+            The answer, with 'text' and 'usage', or None if it wasn't recorded
+        """
+        return self.answers.get(key)
+    
+    def add(self, key: str, provider: str, model: str, messages: List[Dict[str, str]], text: str, usage: Dict[str, int]):
+        """
+        Record the answer to a request, appending it to the file
+        
+        Args:
+            key: Lookup key of the request
+            provider: 'openai' or 'anthropic'
+            model: Model the request was sent to
+            messages: The request's messages
+            text: The answer text
+            usage: The answer's input and output token counts
+        """
+        answer = {"key": key, "provider": provider, "model": model, "messages": messages, "text": text, "usage": usage}
+        with self._lock:
+            self.answers[key] = answer
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(answer, ensure_ascii=False) + "\n")
+
+class MockProvider:
+    """Answers OpenAI and Anthropic API requests locally"""
+    
+    def __init__(self, latency: float = 0.0, tokens_per_second: float = 0.0, response_tokens: int = None,
+                 rate_limit_rate: float = 0.0, server_error_rate: float = 0.0, retry_after: float = 1.0,
+                 replay_path: str = None, record_path: str = None, upstream_urls: Dict[str, str] = None,
+                 seed: int = None):
+        """
+        Initialize the mock provider
+        
+        Args:
+            latency: Seconds before the first token of every answer (default: 0)
+            tokens_per_second: Rate answers are generated at (default: 0, instant)
+            response_tokens: Length of the synthetic answers in tokens (default: None, echoes the last message)
+            rate_limit_rate: Fraction of requests answered with 429 (default: 0)
+            server_error_rate: Fraction of requests answered with a server error (default: 0)
+            retry_after: Retry-After seconds sent with injected 429s (default: 1)
+            replay_path: JSONL file of recorded answers to replay (default: None)
+            record_path: JSONL file to record the upstream API's answers to (default: None); requests
+                         without a recorded answer are forwarded upstream with the caller's API key
+            upstream_urls: Upstream base URLs by provider (default: None, the real APIs)
+            seed: Seed for the injected errors (default: None, random)
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.retry_after = retry_after
+        self.recording = Recording(record_path or replay_path) if (record_path or replay_path) else None
+        self.recording_enabled = record_path is not None
+        self.upstream_urls = {**DEFAULT_UPSTREAM_URLS, **(upstream_urls or {})}
+        
+        self.stats = {"requests": 0, "streams": 0, "rate_limited": 0, "server_errors": 0, "replayed": 0, "recorded": 0}
+        self.token_counter = TokenCounter()
+        self._random = random.Random(seed)
+        self._upstream: Optional[httpx.AsyncClient] = None
+    
+    def routes(self) -> List[Route]:
+        """
+        Get the routes of both provider APIs
+        
+        Returns:
+            The list of Starlette routes
+        """
+        return [
+            Route("/v1/chat/completions", self.openai_chat, methods=["POST"]),
+            Route("/v1/messages", self.anthropic_messages, methods=["POST"]),
+            Route("/mock/stats", self.get_stats, methods=["GET"]),
+        ]
+    
+    async def get_stats(self, request: Request) -> Response:
+        """GET /mock/stats: counts of requests, injected errors and recorded answers"""
+        return JSONResponse(self.stats)
+    
+    async def openai_chat(self, request: Request) -> Response:
+        """POST /v1/chat/completions in the OpenAI wire format"""
+        body = await request.json()
+        error = self._injected_error("openai")
+        if error is not None:
+            return error
+        
+        model = body.get("model", "gpt-3.5-turbo")
+        messages = [{"role": m["role"], "content": self._text(m.get("content"))} for m in body.get("messages", [])]
+        try:
+            text, usage = await self._answer(request, "openai", body, model, messages)
+        except httpx.HTTPStatusError as e:
+            # Pass errors of the upstream API on unchanged
+            return Response(e.response.content, status_code=e.response.status_code,
+                            media_type=e.response.headers.get("content-type"))
+        except httpx.RequestError as e:
+            # The upstream API couldn't be reached at all
+            return self._error("openai", 502, "api_error", f"Upstream request failed: {e!r}")
+        response_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        
+        if not body.get("stream"):
+            await self._wait_for_answer(usage["output_tokens"])
+            return JSONResponse({
+                "id": response_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": usage["input_tokens"],
+                    "completion_tokens": usage["output_tokens"],
+                    "total_tokens": usage["input_tokens"] + usage["output_tokens"]
+                }
+            })
+        
+        def chunk(delta: Dict[str, Any], finish_reason: str = None) -> str:
+            data = {
+                "id": response_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+        
+        async def events() -> AsyncIterator[str]:
+            yield chunk({"role": "assistant", "content": ""})
+            async for piece in self._pieces(text):
+                yield chunk({"content": piece})
+            yield chunk({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield "data: " + json.dumps({
+                    "id": response_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [],
+                    "usage": {"prompt_tokens": usage["input_tokens"], "completion_tokens": usage["output_tokens"],
+                              "total_tokens": usage["input_tokens"] + usage["output_tokens"]}
+                }) + "\n\n"
+            yield "data: [DONE]\n\n"
+        
+        return self._stream(events())
+    
+    async def anthropic_messages(self, request: Request) -> Response:
+        """POST /v1/messages in the Anthropic wire format"""
+        body = await request.json()
+        error = self._injected_error("anthropic")
+        if error is not None:
+            return error
+        
+        model = body.get("model", "claude-3-haiku-20240307")
+        messages = [{"role": m["role"], "content": self._text(m.get("content"))} for m in body.get("messages", [])]
+        try:
+            text, usage = await self._answer(request, "anthropic", body, model, messages)
+        except httpx.HTTPStatusError as e:
+            # Pass errors of the upstream API on unchanged
+            return Response(e.response.content, status_code=e.response.status_code,
+                            media_type=e.response.headers.get("content-type"))
+        except httpx.RequestError as e:
+            # The upstream API couldn't be reached at all
+            return self._error("anthropic", 502, "api_error", f"Upstream request failed: {e!r}")
+        message_id = f"msg_{uuid.uuid4().hex[:24]}"
+        
+        if not body.get("stream"):
+            await self._wait_for_answer(usage["output_tokens"])
+            return JSONResponse({
+                "id": message_id,
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": usage
+            })
+        
+        def event(name: str, data: Dict[str, Any]) -> str:
+            return f"event: {name}\ndata: {json.dumps({'type': name, **data}, ensure_ascii=False)}\n\n"
+        
+        async def events() -> AsyncIterator[str]:
+            yield event("message_start", {"message": {
+                "id": message_id, "type": "message", "role": "assistant", "model": model, "content": [],
+                "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 1}
+            }})
+            yield event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+            async for piece in self._pieces(text):
+                yield event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": piece}})
+            yield event("content_block_stop", {"index": 0})
+            yield event("message_delta", {
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": usage["output_tokens"]}
+            })
+            yield event("message_stop", {})
+        
+        return self._stream(events())
+    
+    async def close(self):
+        """Close the connection to the upstream APIs"""
+        if self._upstream is not None:
+            await self._upstream.aclose()
+            self._upstream = None
+    
+    async def _answer(self, request: Request, provider: str, body: Dict[str, Any], model: str,
+                      messages: List[Dict[str, str]]) -> Tuple[str, Dict[str, int]]:
+        """
+        Decide the answer to a request: recorded, fetched from upstream, or synthetic
+        
+        Returns:
+            The answer text and its usage ('input_tokens' and 'output_tokens')
+        """
+        if body.get("stream"):
+            self.stats["streams"] += 1
+        
+        if self.recording is not None:
+            key = Recording.key(
+                provider, model, messages,
+                system=self._text(body.get("system")),
+                temperature=body.get("temperature"),
+                max_tokens=body.get("max_tokens") or body.get("max_completion_tokens")
+            )
+            answer = self.recording.get(key)
+            if answer is not None:
+                self.stats["replayed"] += 1
+                return answer["text"], answer["usage"]
+            
+            if self.recording_enabled:
+                text, usage = await self._fetch_upstream(request, provider, body)
+                self.recording.add(key, provider, model, messages, text, usage)
+                self.stats["recorded"] += 1
+                return text, usage
+        
+        if self.response_tokens is None:
+            prompt = messages[-1]["content"] if messages else ""
+            text = f"Mock answer to: {prompt}"
+        else:
+            text = " ".join(FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(self.response_tokens))
+        
+        # Each word is streamed as one token
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens")
+        words = text.split(" ")
+        if max_tokens and len(words) > max_tokens:
+            text = " ".join(words[:max_tokens])
+        
+        usage = {
+            "input_tokens": self.token_counter.count_messages(model, messages),
+            "output_tokens": len(text.split(" "))
+        }
+        return text, usage
+    
+    async def _fetch_upstream(self, request: Request, provider: str, body: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        """Send a request to the real API without streaming and return its answer text and usage"""
+        if self._upstream is None:
+            self._upstream = httpx.AsyncClient(timeout=600)
+        
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+        path = "/chat/completions" if provider == "openai" else "/v1/messages"
+        response = await self._upstream.post(
+            self.upstream_urls[provider].rstrip("/") + path,
+            json={**body, "stream": False},
+            headers=headers
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        if provider == "openai":
+            usage = data.get("usage") or {}
+            return data["choices"][0]["message"]["content"], {
+                "input_tokens": usage.get("prompt_tokens", 0),
+                "output_tokens": usage.get("completion_tokens", 0)
+            }
+        
+        usage = data.get("usage") or {}
+        text = "".join(block.get("text", "") for block in data["content"] if block.get("type") == "text")
+        return text, {"input_tokens": usage.get("input_tokens", 0), "output_tokens": usage.get("output_tokens", 0)}
+    
+    def _injected_error(self, provider: str) -> Optional[Response]:
+        """Pick whether to fail a request, returning the error response if so"""
+        self.stats["requests"] += 1
+        roll = self._random.random()
+        
+        if roll < self.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            return self._error(provider, 429, "rate_limit_error", "Rate limit exceeded (injected by the mock provider)",
+                               {"retry-after": f"{self.retry_after:g}"})
+        
+        if roll < self.rate_limit_rate + self.server_error_rate:
+            self.stats["server_errors"] += 1
+            if provider == "anthropic" and self._random.random() < 0.5:
+                return self._error(provider, 529, "overloaded_error", "Overloaded (injected by the mock provider)")
+            status = self._random.choice([500, 502, 503])
+            return self._error(provider, status, "api_error", f"Server error {status} (injected by the mock provider)")
+        
+        return None
+    
+    @staticmethod
+    def _error(provider: str, status_code: int, error_type: str, message: str, headers: Dict[str, str] = None) -> Response:
+        """Build an error response in the provider's format"""
+        if provider == "openai":
+            body = {"error": {"message": message, "type": error_type, "param": None, "code": None}}
+        else:
+            body = {"type": "error", "error": {"type": error_type, "message": message}}
+        return JSONResponse(body, status_code=status_code, headers=headers)
+    
+    async def _wait_for_answer(self, tokens: int):
+        """Wait as long as generating a whole answer would take"""
+        generation = tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+        await asyncio.sleep(self.latency + generation)
+    
+    async def _pieces(self, text: str) -> AsyncIterator[str]:
+        """Split an answer into one chunk per word, paced at the configured latency and token rate"""
+        await asyncio.sleep(self.latency)
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if i and self.tokens_per_second:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield word if i == len(words) - 1 else word + " "
+    
+    @staticmethod
+    def _stream(events: AsyncIterator[str]) -> Response:
+        """Wrap server-sent events in a streaming response"""
+        return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    
+    @staticmethod
+    def _text(content: Any) -> str:
+        """Flatten message content, which Anthropic also accepts as a list of blocks, into plain text"""
+        if isinstance(content, list):
+            return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+        return content or ""
+
+def create_app(provider: Optional[MockProvider] = None) -> Starlette:
+    """
+    Create the ASGI application of the mock provider
+    
+    Point the clients at it with OPENAI_BASE_URL=http://HOST:PORT/v1 and
+    ANTHROPIC_BASE_URL=http://HOST:PORT.
+    
+    Args:
+        provider: The configured mock provider (default: None, instant echo answers)
+    
+    Returns:
+        The Starlette application
+    """
+    provider = provider or MockProvider()
+    
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        yield
+        await provider.close()
+    
+    app = Starlette(routes=provider.routes(), lifespan=lifespan)
+    app.state.provider = provider
+    return app
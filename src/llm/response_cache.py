@@ -0,0 +1,195 @@
+"""
+Response cache for repeated prompts
+Stores LLM responses in SQLite, next to the chat history database
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+class ResponseCache:
+    """SQLite-backed cache of LLM responses with TTL and LRU eviction"""
+    
+    def __init__(self, db_path: str = None, max_entries: int = None, ttl: float = None, memory_entries: int = 256):
+        """
+        Initialize the response cache
+        
+        Args:
+            db_path: Path to the SQLite cache file (default: 'response_cache.db' next to the chat history database)
+            max_entries: Maximum number of cached responses (default: RESPONSE_CACHE_MAX_ENTRIES or 10000)
+            ttl: Seconds a cached response stays valid (default: RESPONSE_CACHE_TTL or 7 days)
+            memory_entries: Number of recently used responses also kept in memory (default: 256)
+        """
+        if db_path is None:
+            app_dir = os.path.join(os.path.expanduser("~"), ".zerocode-llm-chat")
+            if not os.path.exists(app_dir):
+                os.makedirs(app_dir)
+            db_path = os.path.join(app_dir, "response_cache.db")
+        
+        self.db_path = db_path
+        self.max_entries = max_entries or int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 10000))
+        self.ttl = ttl or float(os.getenv("RESPONSE_CACHE_TTL", 7 * 24 * 3600))
+        self.memory_entries = memory_entries
+        
+        self.hits = 0
+        self.misses = 0
+        
+        # Hot entries are answered from memory without touching SQLite
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # Access times of hits not yet written to SQLite, saved before eviction looks at them
+        self._accessed: Dict[str, float] = {}
+        
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            response TEXT,
+            created_at REAL,
+            last_accessed REAL
+        )
+        ''')
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_accessed ON responses (last_accessed)"
+        )
+        self._conn.commit()
+    
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, Any]], temperature: float, max_tokens: int) -> str:
+        """
+        Build the cache key for a request
+        
+        Messages are normalized so that differences in surrounding whitespace
+        or line endings don't cause a miss. Whitespace inside a message, such
+        as the indentation of code, is kept.
+        
+        Args:
+            model: Model the request is sent to
+            messages: Conversation history sent with the request
+            temperature: Sampling temperature
+            max_tokens: Maximum response length
+        
+        Returns:
+            A hex SHA-256 digest identifying the request
+        """
+        normalized = [[message["role"], str(message["content"]).replace("\r\n", "\n").strip()] for message in messages]
+        payload = json.dumps([model, normalized, round(float(temperature), 3), int(max_tokens)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response
+        
+        Args:
+            key: Key built by make_key()
+        
+        Returns:
+            The cached response, or None on a miss or if the entry has expired
+        """
+        now = time.time()
+        
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self._accessed[key] = now
+                self.hits += 1
+                return entry[0]
+            
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+            
+            if row is None or now - row[1] >= self.ttl:
+                self._memory.pop(key, None)
+                self.misses += 1
+                return None
+            
+            self._accessed[key] = now
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            return row[0]
+    
+    def put(self, key: str, model: str, response: str):
+        """
+        Store a response, evicting expired and least recently used entries if needed
+        
+        Args:
+            key: Key built by make_key()
+            model: Model that produced the response
+            response: The response text
+        """
+        now = time.time()
+        
+        with self._lock:
+            self._accessed.pop(key, None)
+            self._save_accessed()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT key FROM responses WHERE created_at <= ?", (now - self.ttl,)
+            )]
+            self._conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+            evicted = [row[0] for row in self._conn.execute(
+                "SELECT key FROM responses ORDER BY last_accessed DESC LIMIT -1 OFFSET ?", (self.max_entries,)
+            )]
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in evicted])
+            self._conn.commit()
+            
+            for old_key in expired + evicted:
+                self._memory.pop(old_key, None)
+            self._remember(key, response, now)
+    
+    def _save_accessed(self):
+        """Write the access times of hits since the last call, without committing (caller holds the lock)"""
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE responses SET last_accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()]
+            )
+            self._accessed.clear()
+    
+    def _remember(self, key: str, response: str, created_at: float):
+        """Add an entry to the in-memory LRU (caller holds the lock)"""
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the cache counters
+        
+        Returns:
+            A dictionary with the number of hits, misses and stored entries
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+    
+    def clear(self):
+        """Remove every cached response"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._memory.clear()
+            self._accessed.clear()
+    
+    def close(self):
+        """Save pending access times and close the cache database"""
+        with self._lock:
+            self._save_accessed()
+            self._conn.commit()
+            self._conn.close()
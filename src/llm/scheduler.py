@@ -0,0 +1,447 @@
+"""
+Rate-limit-aware scheduling of LLM provider requests
+Applies per-provider request and token budgets, bounded concurrency and retries
+"""
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, Optional
+from src.monitoring.metrics import LLM_ERRORS, LLM_QUEUE_WAIT, LLM_RETRIES
+
+# Default scheduler settings, overridable through environment variables
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+# HTTP status codes worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Connection failures raised by the provider SDKs and by httpx underneath them
+# (matched by name so that both SDKs' exception types are recognized without
+# importing either, or httpx, before a provider is used)
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "TransportError"}
+
+class LLMRequestError(Exception):
+    """A provider request that failed, after any retries"""
+    
+    def __init__(self, message: str, provider: str = None, status_code: int = None,
+                 retryable: bool = False, retry_after: float = None):
+        """
+        Initialize the error
+        
+        Args:
+            message: Description of the failure, suitable for showing to the user
+            provider: Provider the request was sent to (default: None)
+            status_code: HTTP status code of the failed response (default: None)
+            retryable: Whether the request may succeed if sent again (default: False)
+            retry_after: Seconds the provider asked us to wait, if any (default: None)
+        """
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Token bucket that refills continuously at a per-minute rate"""
+    
+    def __init__(self, per_minute: float, capacity: float = None):
+        """
+        Initialize the bucket, full
+        
+        Args:
+            per_minute: Tokens added per minute
+            capacity: Maximum tokens held, i.e. the largest burst (default: None, one minute's worth)
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self, amount: float = 1) -> float:
+        """
+        Take tokens from the bucket, going into debt if there aren't enough
+        
+        Reserving instead of waiting for the tokens keeps callers in order:
+        each one is told how long to wait behind the reservations before it.
+        
+        Args:
+            amount: Number of tokens to take (capped at the bucket capacity)
+        
+        Returns:
+            Seconds to wait before the reserved tokens are available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class RequestScheduler:
+    """Schedules requests to one provider within its rate limits, retrying transient failures"""
+    
+    def __init__(self, provider: str, requests_per_minute: float = None, tokens_per_minute: float = None,
+                 max_concurrency: int = None, max_retries: int = None,
+                 base_delay: float = DEFAULT_BASE_DELAY, max_delay: float = DEFAULT_MAX_DELAY):
+        """
+        Initialize the scheduler
+        
+        Args:
+            provider: Provider name, used in error messages
+            requests_per_minute: Request budget (default: None, unlimited)
+            tokens_per_minute: Token budget (default: None, unlimited)
+            max_concurrency: Maximum requests in flight at once (default: LLM_MAX_CONCURRENCY or 16)
+            max_retries: Retries after the first attempt (default: LLM_MAX_RETRIES or 4)
+            base_delay: Backoff before the first retry, doubled on every retry (default: 1 second)
+            max_delay: Longest backoff between retries (default: 60 seconds)
+        """
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES)) if max_retries is None else max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        
+        self.retries = 0
+        
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        # asyncio semaphores are bound to the event loop they are used on
+        self._async_slots = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+    
+    def call(self, request: Callable[[], Any], tokens: int = 0, timings: Optional[Dict[str, float]] = None) -> Any:
+        """
+        Send a request within the rate limits, retrying transient failures
+        
+        Args:
+            request: Function that sends the request and returns the response
+            tokens: Estimated tokens used by the request (default: 0)
+            timings: Dictionary to add the request's 'queue_wait' seconds and 'retries' to (default: None)
+        
+        Returns:
+            The response
+        
+        Raises:
+            LLMRequestError: If the request failed and can't be retried (any more)
+        """
+        attempt = 0
+        while True:
+            queued = time.monotonic()
+            time.sleep(self._reserve(tokens))
+            try:
+                with self._slot():
+                    self._record_wait(queued, timings)
+                    return request()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, timings)
+            time.sleep(delay)
+            attempt += 1
+    
+    def stream(self, open_stream: Callable[[], Iterable[Any]], tokens: int = 0,
+               timings: Optional[Dict[str, float]] = None) -> Iterator[Any]:
+        """
+        Stream a response within the rate limits, holding a concurrency slot until it ends
+        
+        A failed request is only retried if nothing has been received yet, so
+        callers never see part of a response twice.
+        
+        Args:
+            open_stream: Function that sends the request and returns an iterable of chunks
+            tokens: Estimated tokens used by the request (default: 0)
+            timings: Dictionary to add the request's 'queue_wait' seconds and 'retries' to (default: None)
+        
+        Yields:
+            The response chunks
+        
+        Raises:
+            LLMRequestError: If the request failed and can't be retried (any more)
+        """
+        attempt = 0
+        while True:
+            queued = time.monotonic()
+            time.sleep(self._reserve(tokens))
+            started = False
+            try:
+                with self._slot():
+                    self._record_wait(queued, timings)
+                    for chunk in open_stream():
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                if started:
+                    raise self._fail(self.classify(e)) from e
+                delay = self._retry_delay(e, attempt, timings)
+            time.sleep(delay)
+            attempt += 1
+    
+    async def call_async(self, request: Callable[[], Awaitable[Any]], tokens: int = 0,
+                         timings: Optional[Dict[str, float]] = None) -> Any:
+        """
+        Send an async request within the rate limits, retrying transient failures
+        
+        Args:
+            request: Function returning an awaitable that sends the request
+            tokens: Estimated tokens used by the request (default: 0)
+            timings: Dictionary to add the request's 'queue_wait' seconds and 'retries' to (default: None)
+        
+        Returns:
+            The response
+        
+        Raises:
+            LLMRequestError: If the request failed and can't be retried (any more)
+        """
+        slots = self._async_slots_for_loop()
+        
+        attempt = 0
+        while True:
+            queued = time.monotonic()
+            await asyncio.sleep(self._reserve(tokens))
+            try:
+                async with slots:
+                    self._record_wait(queued, timings)
+                    return await request()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, timings)
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    async def stream_async(self, open_stream: Callable[[], AsyncIterable[Any]], tokens: int = 0,
+                           timings: Optional[Dict[str, float]] = None) -> AsyncIterator[Any]:
+        """
+        Stream an async response within the rate limits, holding a concurrency slot until it ends
+        
+        Like stream(), a failed request is only retried if nothing has been received yet.
+        
+        Args:
+            open_stream: Function that sends the request and returns an async iterable of chunks
+            tokens: Estimated tokens used by the request (default: 0)
+            timings: Dictionary to add the request's 'queue_wait' seconds and 'retries' to (default: None)
+        
+        Yields:
+            The response chunks
+        
+        Raises:
+            LLMRequestError: If the request failed and can't be retried (any more)
+        """
+        slots = self._async_slots_for_loop()
+        
+        attempt = 0
+        while True:
+            queued = time.monotonic()
+            await asyncio.sleep(self._reserve(tokens))
+            started = False
+            try:
+                async with slots:
+                    self._record_wait(queued, timings)
+                    async for chunk in open_stream():
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                if started:
+                    raise self._fail(self.classify(e)) from e
+                delay = self._retry_delay(e, attempt, timings)
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    def pause(self, seconds: float):
+        """
+        Hold back every request to this provider, e.g. after a Retry-After response
+        
+        Args:
+            seconds: How long to pause for
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+    
+    @contextmanager
+    def _slot(self):
+        """Hold one of the concurrency slots"""
+        self._slots.acquire()
+        try:
+            yield
+        finally:
+            self._slots.release()
+    
+    def _async_slots_for_loop(self) -> asyncio.Semaphore:
+        """Get the concurrency slots for the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            return self._async_slots.setdefault(loop, asyncio.Semaphore(self.max_concurrency))
+    
+    def _reserve(self, tokens: int) -> float:
+        """Reserve budget for a request and return how long to wait before sending it"""
+        delay = 0.0
+        if self.requests:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens and tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        with self._lock:
+            return max(delay, self._paused_until - time.monotonic())
+    
+    def _record_wait(self, queued: float, timings: Optional[Dict[str, float]]):
+        """Record how long an attempt waited for its rate-limit budget and concurrency slot"""
+        wait = time.monotonic() - queued
+        LLM_QUEUE_WAIT.observe(wait, provider=self.provider)
+        if timings is not None:
+            timings["queue_wait"] = timings.get("queue_wait", 0.0) + wait
+    
+    def _fail(self, failure: LLMRequestError) -> LLMRequestError:
+        """Count a request that failed for good"""
+        LLM_ERRORS.inc(provider=self.provider, status=failure.status_code or "none")
+        return failure
+    
+    def _retry_delay(self, error: Exception, attempt: int, timings: Optional[Dict[str, float]] = None) -> float:
+        """
+        Decide how long to wait before retrying a failed request
+        
+        Args:
+            error: The exception raised by the request
+            attempt: Number of retries made so far
+            timings: Dictionary of the request's timings; the backoff counts as queue wait (default: None)
+        
+        Returns:
+            Seconds to wait before the next attempt
+        
+        Raises:
+            LLMRequestError: If the request should not be retried
+        """
+        failure = self.classify(error)
+        if not failure.retryable or attempt >= self.max_retries:
+            raise self._fail(failure) from error
+        
+        # Don't keep the user waiting for a long provider-imposed pause
+        if failure.retry_after is not None and failure.retry_after > self.max_delay:
+            raise self._fail(failure) from error
+        
+        with self._lock:
+            self.retries += 1
+        LLM_RETRIES.inc(provider=self.provider)
+        
+        if failure.retry_after is not None:
+            # The provider said when to come back; hold back every other request too
+            self.pause(failure.retry_after)
+            delay = failure.retry_after
+        else:
+            # Exponential backoff with full jitter, so retries from many sessions spread out
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        
+        if timings is not None:
+            timings["queue_wait"] = timings.get("queue_wait", 0.0) + delay
+            timings["retries"] = timings.get("retries", 0) + 1
+        return delay
+    
+    def classify(self, error: Exception) -> LLMRequestError:
+        """
+        Convert an exception raised by a provider SDK into an LLMRequestError
+        
+        Args:
+            error: The exception
+        
+        Returns:
+            The equivalent LLMRequestError
+        """
+        if isinstance(error, LLMRequestError):
+            return error
+        
+        status_code = getattr(error, "status_code", None)
+        if not isinstance(status_code, int):
+            status_code = None
+        
+        retryable = (
+            status_code in RETRYABLE_STATUS_CODES
+            or any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+        )
+        
+        name = "OpenAI" if self.provider == "openai" else self.provider.capitalize()
+        return LLMRequestError(
+            f"Error calling {name} API: {str(error)}",
+            provider=self.provider,
+            status_code=status_code,
+            retryable=retryable,
+            retry_after=self._retry_after(error)
+        )
+    
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """Read the Retry-After header of a failed response, in seconds"""
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            value = headers.get("retry-after")
+            if not value:
+                return None
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                # Retry-After may also be an HTTP date
+                return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+_schedulers: Dict[str, RequestScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(provider: str) -> RequestScheduler:
+    """
+    Get the process-wide scheduler for a provider, creating it on first use
+    
+    Limits are read from {PROVIDER}_RPM and {PROVIDER}_TPM (e.g. OPENAI_RPM);
+    a provider without them is only limited by LLM_MAX_CONCURRENCY.
+    
+    Args:
+        provider: 'openai' or 'anthropic'
+    
+    Returns:
+        The shared RequestScheduler for the provider
+    """
+    with _schedulers_lock:
+        if provider not in _schedulers:
+            prefix = provider.upper()
+            _schedulers[provider] = RequestScheduler(
+                provider,
+                requests_per_minute=float(os.getenv(f"{prefix}_RPM", 0)) or None,
+                tokens_per_minute=float(os.getenv(f"{prefix}_TPM", 0)) or None
+            )
+        return _schedulers[provider]
+
+def configure_scheduler(provider: str, requests_per_minute: float = None, tokens_per_minute: float = None,
+                        max_concurrency: int = None, max_retries: int = None) -> RequestScheduler:
+    """
+    Replace the process-wide scheduler for a provider with one using the given limits
+    
+    Args:
+        provider: 'openai' or 'anthropic'
+        requests_per_minute: Request budget (default: None, unlimited)
+        tokens_per_minute: Token budget (default: None, unlimited)
+        max_concurrency: Maximum requests in flight at once (default: LLM_MAX_CONCURRENCY or 16)
+        max_retries: Retries after the first attempt (default: LLM_MAX_RETRIES or 4)
+    
+    Returns:
+        The new RequestScheduler
+    """
+    with _schedulers_lock:
+        _schedulers[provider] = RequestScheduler(
+            provider,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            max_concurrency=max_concurrency,
+            max_retries=max_retries
+        )
+        return _schedulers[provider]
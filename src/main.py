@@ -1,17 +1,99 @@
 """
 ZeroCode LLM Chat Client - Main Entry Point
 """
+import atexit
 import os
 import streamlit as st
 from dotenv import load_dotenv
 from src.llm.chat_client import ChatClient
 from src.ui.chat_interface import ChatInterface
 from src.db.db_manager import DBManager
+from src.db.maintenance import DEFAULT_INTERVAL, DBMaintenance
+from src.db.write_behind import DEFAULT_MAX_PENDING, WriteBehindWriter
+from src.llm.client_registry import get_registry
+from src.llm.response_cache import ResponseCache
+from src.monitoring.logs import configure_logging
+from src.monitoring.metrics import UI_RERUN_DURATION, get_metrics, start_http_server
+
+@st.cache_resource
+def get_db_manager() -> DBManager:
+    """
+    Get the database manager shared by every session
+    
+    Creating it opens the database and checks its schema, so that only
+    happens on the first script run in the process.
+    
+    Returns:
+        The shared DBManager
+    """
+    return DBManager()
+
+@st.cache_resource
+def get_write_behind(_db_manager: DBManager):
+    """
+    Get the write-behind writer shared by every session
+    
+    Args:
+        _db_manager: Database manager the writer saves messages with (not hashed by Streamlit)
+    
+    Returns:
+        The shared WriteBehindWriter, or None if DB_WRITE_BEHIND is off
+    """
+    if os.getenv("DB_WRITE_BEHIND", "").lower() not in ("1", "true", "yes"):
+        return None
+    writer = WriteBehindWriter(_db_manager, max_pending=int(os.getenv("DB_WRITE_QUEUE_SIZE", DEFAULT_MAX_PENDING)))
+    # Queued messages are saved before the process exits
+    atexit.register(writer.close)
+    return writer
+
+@st.cache_resource
+def get_maintenance(_db_manager: DBManager):
+    """
+    Get the background maintenance worker shared by every session
+    
+    Args:
+        _db_manager: Database manager to maintain (not hashed by Streamlit)
+    
+    Returns:
+        The running DBMaintenance, or None if DB_MAINTENANCE_INTERVAL is 0
+    """
+    interval = float(os.getenv("DB_MAINTENANCE_INTERVAL", DEFAULT_INTERVAL))
+    if interval <= 0:
+        return None
+    archive_after_days = os.getenv("DB_ARCHIVE_AFTER_DAYS")
+    maintenance = DBMaintenance(
+        _db_manager,
+        archive_after_days=float(archive_after_days) if archive_after_days else None,
+        interval=interval
+    )
+    maintenance.start()
+    atexit.register(maintenance.stop)
+    return maintenance
+
+@st.cache_resource
+def get_response_cache(_db_manager: DBManager):
+    """
+    Get the response cache shared by every session
+    
+    Args:
+        _db_manager: Database manager whose directory holds the cache file (not hashed by Streamlit)
+    
+    Returns:
+        The shared ResponseCache, or None if RESPONSE_CACHE_ENABLED is off
+    """
+    if os.getenv("RESPONSE_CACHE_ENABLED", "").lower() in ("1", "true", "yes"):
+        return ResponseCache(os.path.join(os.path.dirname(os.path.abspath(_db_manager.db_path)), "response_cache.db"))
+    return None
 
 def main():
     """Main application entry point"""
     # Load environment variables
     load_dotenv()
+    configure_logging()
+    
+    # Serve the metrics for Prometheus to scrape (only happens once per process)
+    if os.getenv("METRICS_PORT"):
+        start_http_server(int(os.getenv("METRICS_PORT")))
     
     # Set up Streamlit page
     st.set_page_config(
@@ -41,19 +123,38 @@ def main():
         """)
         st.stop()
     
-    # Create database manager
-    db_manager = DBManager()
+    # Open provider connections in the background (only happens once per process)
+    get_registry().prewarm()
+    
+    # The database manager is created once per process
+    db_manager = get_db_manager()
+    
+    # Each session keeps its own chat client, with its history and settings, across reruns
+    if "chat_client" not in st.session_state:
+        # Default to OpenAI if available, otherwise use Anthropic
+        default_model = "gpt-3.5-turbo" if openai_api_key else "claude-3-sonnet"
+        # Repeated prompts are answered from the response cache when it is enabled
+        st.session_state.chat_client = ChatClient(model=default_model, response_cache=get_response_cache(db_manager))
+        # Older turns of long conversations can be summarized instead of dropped
+        if os.getenv("CONTEXT_ROLLING_SUMMARY", "").lower() in ("1", "true", "yes"):
+            st.session_state.chat_client.use_rolling_summary()
+    chat_client = st.session_state.chat_client
     
-    # Create chat client instance
-    # Default to OpenAI if available, otherwise use Anthropic
-    default_model = "gpt-3.5-turbo" if openai_api_key else "claude-3-sonnet"
-    chat_client = ChatClient(model=default_model)
+    # Archival and compaction run in the background
+    get_maintenance(db_manager)
     
     # Initialize the UI
-    chat_interface = ChatInterface(chat_client, db_manager)
+    chat_interface = ChatInterface(chat_client, db_manager, writer=get_write_behind(db_manager))
     
     # Run the interface
     chat_interface.run()
 
 if __name__ == "__main__":
-    main()
+    # st.stop() and st.rerun() end a script run with an exception, which is still timed
+    try:
+        with UI_RERUN_DURATION.time():
+            main()
+    finally:
+        # Refresh the metrics file for the textfile collector after every script run
+        if os.getenv("METRICS_FILE"):
+            get_metrics().write(os.getenv("METRICS_FILE"))
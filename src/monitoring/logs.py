@@ -0,0 +1,90 @@
+"""
+Structured logging for the app
+Log records carry named fields, written as key=value text or as JSON lines
+"""
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Any
+
+# Every module logs under this logger (module loggers are named after their package path)
+ROOT_LOGGER = "src"
+
+class KeyValueFormatter(logging.Formatter):
+    """Formats records as 'time level logger event key=value ...'"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", {})
+        parts = [
+            datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            record.levelname,
+            record.name,
+            record.getMessage()
+        ]
+        parts += [f"{name}={_format_value(value)}" for name, value in fields.items()]
+        line = " ".join(parts)
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, for log collectors"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage()
+        }
+        data.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+def _format_value(value: Any) -> str:
+    """Format a field value for key=value output, rounding durations"""
+    if isinstance(value, float):
+        return f"{value:.4f}".rstrip("0").rstrip(".")
+    text = str(value)
+    return json.dumps(text) if " " in text or not text else text
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields):
+    """
+    Log an event with named fields
+    
+    Args:
+        logger: Logger of the module logging the event
+        event: Short event name, e.g. 'chat_turn'
+        level: Log level (default: INFO)
+        **fields: Values describing the event
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+def configure_logging(level: str = None, log_format: str = None):
+    """
+    Send the app's log records to stderr
+    
+    Safe to call more than once; the handler is only added the first time.
+    
+    Args:
+        level: Log level name (default: None, uses LOG_LEVEL or INFO)
+        log_format: 'text' or 'json' (default: None, uses LOG_FORMAT or text)
+    """
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel((level or os.getenv("LOG_LEVEL") or "INFO").upper())
+    
+    if not any(getattr(handler, "_zerocode", False) for handler in logger.handlers):
+        handler = logging.StreamHandler(sys.stderr)
+        handler._zerocode = True
+        logger.addHandler(handler)
+        # The app's records are handled here only, not again by the root logger
+        logger.propagate = False
+    else:
+        handler = next(handler for handler in logger.handlers if getattr(handler, "_zerocode", False))
+    
+    log_format = (log_format or os.getenv("LOG_FORMAT") or "text").lower()
+    handler.setFormatter(JSONFormatter() if log_format == "json" else KeyValueFormatter())
@@ -0,0 +1,389 @@
+"""
+Request-level metrics in the Prometheus text format
+Counters and histograms kept in memory, exported over HTTP or to a file
+"""
+import bisect
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+# Histogram buckets for durations, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Metric:
+    """Base class of metrics with a name, help text and labels"""
+    
+    TYPE = ""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        Initialize the metric
+        
+        Args:
+            name: Metric name, e.g. 'zerocode_llm_tokens_total'
+            documentation: Help text shown in the export
+            labelnames: Names of the labels every sample carries (default: none)
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Turn keyword labels into a key in labelnames order"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {', '.join(self.labelnames) or '(none)'}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def _format_labels(self, key: Tuple[str, ...], extra: Iterable[Tuple[str, str]] = ()) -> str:
+        """Format label values as {name="value",...}"""
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (
+            f'{name}="' + value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') + '"'
+            for name, value in pairs
+        )
+        return "{" + ",".join(escaped) + "}"
+    
+    def render(self) -> List[str]:
+        """
+        Render the metric in the Prometheus text format
+        
+        Returns:
+            The lines of the export, starting with the HELP and TYPE lines
+        """
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"] + self._samples()
+    
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    """A value that only goes up, such as a number of requests or tokens"""
+    
+    TYPE = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+    
+    def inc(self, amount: float = 1, **labels):
+        """
+        Add to the counter
+        
+        Args:
+            amount: Amount to add (default: 1)
+            **labels: Value of each label
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def value(self, **labels) -> float:
+        """
+        Get the current value of the counter
+        
+        Args:
+            **labels: Value of each label
+        
+        Returns:
+            The total added so far
+        """
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {_number(value)}" for key, value in values]
+
+class Histogram(Metric):
+    """Distribution of observed values, such as request durations, counted in buckets"""
+    
+    TYPE = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Initialize the histogram
+        
+        Args:
+            name: Metric name, e.g. 'zerocode_llm_request_duration_seconds'
+            documentation: Help text shown in the export
+            labelnames: Names of the labels every sample carries (default: none)
+            buckets: Upper bounds of the buckets, in increasing order (default: DEFAULT_BUCKETS)
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: bucket counts (the last one is +Inf), sum and count
+        self._series: Dict[Tuple[str, ...], List] = {}
+    
+    def observe(self, value: float, **labels):
+        """
+        Record a value
+        
+        Args:
+            value: The observed value
+            **labels: Value of each label
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+    
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """
+        Time the body of a with statement
+        
+        Args:
+            **labels: Value of each label
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def summary(self, **labels) -> Tuple[int, float]:
+        """
+        Get the number and sum of the values observed so far
+        
+        Args:
+            **labels: Value of each label
+        
+        Returns:
+            A (count, sum) tuple
+        """
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return (series[2], series[1]) if series else (0, 0.0)
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, [list(counts), total, count]) for key, (counts, total, count) in self._series.items())
+        
+        lines = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """The set of metrics exported together"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """
+        Get a counter, creating it on first use
+        
+        Args:
+            name: Metric name
+            documentation: Help text shown in the export
+            labelnames: Names of the labels every sample carries (default: none)
+        
+        Returns:
+            The counter
+        """
+        return self._get_or_create(Counter, name, documentation, labelnames)
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """
+        Get a histogram, creating it on first use
+        
+        Args:
+            name: Metric name
+            documentation: Help text shown in the export
+            labelnames: Names of the labels every sample carries (default: none)
+            buckets: Upper bounds of the buckets (default: DEFAULT_BUCKETS)
+        
+        Returns:
+            The histogram
+        """
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+    
+    def render(self) -> str:
+        """
+        Export every metric in the Prometheus text format
+        
+        Returns:
+            The exposition text
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+    
+    def write(self, path: str):
+        """
+        Write the export to a file, e.g. for the node_exporter textfile collector
+        
+        The file is replaced atomically, so a scraper never reads half of it.
+        
+        Args:
+            path: Path of the .prom file
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.render())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    
+    def _get_or_create(self, metric_class, name: str, documentation: str, labelnames: Sequence[str], **kwargs) -> Metric:
+        """Get a registered metric, checking it has the expected type and labels"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, metric_class) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with another type or labels")
+            return metric
+
+def _number(value: float) -> str:
+    """Format a sample value the way Prometheus expects"""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+_metrics = MetricsRegistry()
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Get the process-wide metrics registry
+    
+    Returns:
+        The shared MetricsRegistry instance
+    """
+    return _metrics
+
+def timed(histogram: Histogram) -> Callable:
+    """
+    Decorate a method to record its duration, labelled with the method's name
+    
+    Args:
+        histogram: Histogram with a single 'operation' label
+    
+    Returns:
+        The decorator
+    """
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with histogram.time(operation=function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+_http_server = None
+_http_server_lock = threading.Lock()
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> Any:
+    """
+    Serve the process-wide metrics at http://host:port/metrics from a background thread
+    
+    Only one server is started per process, so this is safe to call on every Streamlit rerun.
+    
+    Args:
+        port: Port to listen on
+        host: Address to listen on (default: 127.0.0.1)
+    
+    Returns:
+        The running http.server.ThreadingHTTPServer
+    """
+    # http.server is only imported when the metrics are served
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Serves the export at /metrics"""
+        
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = _metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    global _http_server
+    with _http_server_lock:
+        if _http_server is None:
+            _http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+            threading.Thread(target=_http_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _http_server
+
+# Metrics recorded by the app
+
+LLM_QUEUE_WAIT = _metrics.histogram(
+    "zerocode_llm_queue_wait_seconds",
+    "Time a provider request waited for rate-limit budget and a concurrency slot",
+    ["provider"]
+)
+LLM_TIME_TO_FIRST_TOKEN = _metrics.histogram(
+    "zerocode_llm_time_to_first_token_seconds",
+    "Time from sending a streamed request to receiving the first response text",
+    ["provider", "model"]
+)
+LLM_REQUEST_DURATION = _metrics.histogram(
+    "zerocode_llm_request_duration_seconds",
+    "Total time of a chat request, including queueing and retries",
+    ["provider", "model", "mode"]
+)
+LLM_REQUESTS = _metrics.counter(
+    "zerocode_llm_requests_total",
+    "Chat requests by outcome (ok, error or cached)",
+    ["provider", "model", "outcome"]
+)
+LLM_TOKENS = _metrics.counter(
+    "zerocode_llm_tokens_total",
+    "Tokens reported in the providers' usage fields",
+    ["provider", "model", "type"]
+)
+LLM_RETRIES = _metrics.counter(
+    "zerocode_llm_retries_total",
+    "Provider requests sent again after a transient failure",
+    ["provider"]
+)
+LLM_ERRORS = _metrics.counter(
+    "zerocode_llm_errors_total",
+    "Provider requests that failed for good, by HTTP status",
+    ["provider", "status"]
+)
+DB_OPERATION_DURATION = _metrics.histogram(
+    "zerocode_db_operation_duration_seconds",
+    "Time spent in each DBManager operation",
+    ["operation"]
+)
+UI_RERUN_DURATION = _metrics.histogram(
+    "zerocode_ui_rerun_duration_seconds",
+    "Time taken by each Streamlit script run"
+)
@@ -2,74 +2,212 @@
 Chat Interface for the LLM Chat Client
 """
 import streamlit as st
+import logging
 import os
 import time
+from concurrent.futures import Future
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from src.llm.chat_client import ChatClient
+from src.llm.scheduler import LLMRequestError
 from src.db.db_manager import DBManager
+from src.db.write_behind import WriteBehindWriter
+from src.monitoring.logs import log_event
+
+logger = logging.getLogger(__name__)
+
+# The sidebar queries are cached across reruns and sessions. data_version is part
+# of the key, so any write to the database makes the next rerun query again, and
+# reruns that change nothing (typing, moving a slider) cost no database work.
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _conversation_pages(_db_manager: DBManager, db_path: str, data_version: int,
+                        pages: int, page_size: int) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+    """Get the first pages of the conversation list and the cursor of the next page"""
+    conversations = []
+    cursor = None
+    for _ in range(pages):
+        page, cursor = _db_manager.list_conversations(page_size, cursor)
+        conversations.extend(page)
+        if cursor is None:
+            break
+    return conversations, cursor
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _search(_db_manager: DBManager, db_path: str, data_version: int, query: str, limit: int) -> List[Dict[str, Any]]:
+    """Search the conversations"""
+    return _db_manager.search(query, limit=limit)
 
 class ChatInterface:
     """Streamlit-based chat interface"""
     
-    def __init__(self, chat_client: ChatClient, db_manager: DBManager):
+    # Number of conversations loaded into the sidebar at a time
+    SIDEBAR_PAGE_SIZE = 50
+    
+    # Number of most recent messages shown in the chat pane, and loaded per "Load earlier messages" click
+    CHAT_WINDOW_SIZE = 50
+    CHAT_PAGE_SIZE = 50
+    
+    def __init__(self, chat_client: ChatClient, db_manager: DBManager, writer: Optional[WriteBehindWriter] = None):
         """
         Initialize the chat interface
         
         Args:
             chat_client: Instance of the chat client
             db_manager: Instance of the database manager
+            writer: Write-behind writer to save messages with (default: None, saves them before the turn ends)
         """
         self.chat_client = chat_client
         self.db_manager = db_manager
+        self.writer = writer
         
         # Initialize session state variables if they don't exist
         if "messages" not in st.session_state:
-            st.session_state.messages = []
-            
+            self._reset_messages()
+        
         if "current_conversation_id" not in st.session_state:
             # Create a new conversation by default
             conversation_id = self.db_manager.create_conversation(model=self.chat_client.model)
             st.session_state.current_conversation_id = conversation_id
-            
+        
         if "conversation_title" not in st.session_state:
             st.session_state.conversation_title = f"New Conversation {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-            
+        
         if "show_sidebar" not in st.session_state:
             st.session_state.show_sidebar = True
+        
+        if "sidebar_pages" not in st.session_state:
+            st.session_state.sidebar_pages = 1
     
     def load_conversation(self, conversation_id: str):
-        """Load a conversation from the database"""
-        conversation, messages = self.db_manager.get_conversation(conversation_id)
+        """
+        Load a conversation from the database
+        
+        Only the most recent messages are read, for the chat pane; the full
+        history the model needs is read when the next message is sent.
+        
+        Args:
+            conversation_id: ID of the conversation to load
+        """
+        # The extra message only tells us whether there are earlier ones
+        conversation, messages = self.db_manager.get_conversation(
+            conversation_id, message_limit=self.CHAT_WINDOW_SIZE + 1
+        )
         
         if conversation:
             # Update session state
             st.session_state.current_conversation_id = conversation_id
             st.session_state.conversation_title = conversation["title"]
             
-            # Convert DB messages to the format expected by the UI
-            ui_messages = []
-            for msg in messages:
-                ui_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-            
-            st.session_state.messages = ui_messages
+            self._reset_messages()
+            if len(messages) > self.CHAT_WINDOW_SIZE:
+                messages = messages[1:]
+                st.session_state.earlier_cursor = messages[0]["id"]
+            st.session_state.messages = [self._ui_message(msg) for msg in messages]
             
-            # Update the chat client's conversation history
-            self.chat_client.conversation_history = ui_messages.copy()
+            self.chat_client.clear_history()
+            st.session_state.history_loaded = False
             
             # Update the model if it's different
             if conversation["model"] != self.chat_client.model:
                 self.chat_client.model = conversation["model"]
     
+    def load_earlier_messages(self):
+        """Add the page of messages before the oldest one shown to the chat pane"""
+        # Callbacks run before run(), so queued messages may not be saved yet
+        self._wait_for_writes()
+        messages, cursor = self.db_manager.get_messages(
+            st.session_state.current_conversation_id, self.CHAT_PAGE_SIZE, st.session_state.earlier_cursor
+        )
+        st.session_state.messages[:0] = [self._ui_message(msg) for msg in messages]
+        st.session_state.earlier_cursor = cursor
+        st.session_state.message_window += len(messages)
+    
+    def _load_history(self):
+        """Give the chat client the full history of the current conversation, if it doesn't have it yet"""
+        if st.session_state.history_loaded:
+            return
+        
+        _, messages = self.db_manager.get_conversation(st.session_state.current_conversation_id)
+        self.chat_client.conversation_history = [{"role": msg["role"], "content": msg["content"]} for msg in messages]
+        st.session_state.history_loaded = True
+    
+    def _wait_for_writes(self):
+        """
+        Wait until the messages this session queued with the writer are saved
+        
+        Called before the session reads from the database, so it always sees
+        its own messages. Their IDs replace the futures in the chat pane;
+        messages that couldn't be saved are taken out of it.
+        """
+        if not st.session_state.get("pending_writes"):
+            return
+        
+        failed = []
+        for message in st.session_state.pending_writes:
+            try:
+                message["id"] = message["id"].result()
+            except Exception as e:
+                failed.append(message)
+                error = e
+        st.session_state.pending_writes = []
+        
+        if failed:
+            st.error(f"Failed to save {len(failed)} message(s): {error}")
+            st.session_state.messages = [msg for msg in st.session_state.messages if all(msg is not f for f in failed)]
+            if st.session_state.earlier_cursor is not None and st.session_state.messages:
+                st.session_state.earlier_cursor = st.session_state.messages[0]["id"]
+            # The chat client's history includes the lost messages
+            self.chat_client.clear_history()
+            st.session_state.history_loaded = False
+    
+    def _reset_messages(self):
+        """Empty the chat pane, e.g. for a new conversation"""
+        st.session_state.messages = []
+        # ID of the oldest message shown, if there are earlier ones, and the number of messages kept in the pane
+        st.session_state.earlier_cursor = None
+        st.session_state.message_window = self.CHAT_WINDOW_SIZE
+        # Whether the chat client holds the conversation's full history
+        st.session_state.history_loaded = True
+    
+    def _append_messages(self, messages: List[Dict[str, Any]]):
+        """Add new messages to the chat pane, dropping the oldest ones beyond the window"""
+        st.session_state.messages.extend(messages)
+        excess = len(st.session_state.messages) - st.session_state.message_window
+        if excess > 0:
+            del st.session_state.messages[:excess]
+            # With write-behind, the ID may still be a future
+            message_id = st.session_state.messages[0]["id"]
+            st.session_state.earlier_cursor = message_id.result() if isinstance(message_id, Future) else message_id
+    
+    @staticmethod
+    def _ui_message(message: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a database message to the format shown in the chat pane"""
+        return {"id": message["id"], "role": message["role"], "content": message["content"]}
+    
+    @staticmethod
+    def _conversation_caption(conversation: Dict[str, Any]) -> str:
+        """Describe a listed conversation by whether it is archived, its message count, estimated tokens and last message"""
+        count = conversation["message_count"]
+        if not count:
+            return "No messages yet"
+        archived = "🗄️ Archived · " if conversation.get("archive") else ""
+        
+        tokens = conversation["token_count"]
+        tokens_text = f"{tokens / 1000:.1f}k" if tokens >= 1000 else str(tokens)
+        preview = " ".join((conversation["last_message_preview"] or "").split())
+        if len(preview) > 60:
+            preview = preview[:60] + "..."
+        return f"{archived}{count} message{'s' if count != 1 else ''} · ~{tokens_text} tokens · {preview}"
+    
     def toggle_sidebar(self):
         """Toggle the sidebar visibility"""
         st.session_state.show_sidebar = not st.session_state.show_sidebar
     
     def run(self):
         """Run the chat interface"""
+        self._wait_for_writes()
+        
         # Set up the layout with columns for the chat history sidebar and the main chat
         if st.session_state.show_sidebar:
             sidebar_col, main_col = st.columns([1, 3])
@@ -89,12 +227,31 @@ class ChatInterface:
                     conversation_id = self.db_manager.create_conversation(model=self.chat_client.model)
                     st.session_state.current_conversation_id = conversation_id
                     st.session_state.conversation_title = f"New Conversation {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-                    st.session_state.messages = []
+                    self._reset_messages()
                     self.chat_client.clear_history()
                     st.rerun()
                 
-                # Get all conversations
-                conversations = self.db_manager.get_all_conversations()
+                # Search past conversations
+                search_query = st.text_input("Search conversations", key="search_query")
+                data_version = self.db_manager.data_version()
+                if search_query:
+                    results = _search(
+                        self.db_manager, self.db_manager.db_path, data_version, search_query, self.SIDEBAR_PAGE_SIZE
+                    )
+                    if not results:
+                        st.caption("No matches")
+                    for i, result in enumerate(results):
+                        if st.button(result["title"], key=f"search_{i}_{result['conversation_id']}"):
+                            self.load_conversation(result["conversation_id"])
+                            st.rerun()
+                        st.caption(result["snippet"])
+                    st.divider()
+                
+                # Get the pages of conversations loaded so far
+                conversations, cursor = _conversation_pages(
+                    self.db_manager, self.db_manager.db_path, data_version,
+                    st.session_state.sidebar_pages, self.SIDEBAR_PAGE_SIZE
+                )
                 
                 # Display the list of conversations
                 for conversation in conversations:
@@ -108,6 +265,8 @@ class ChatInterface:
                             if st.button(f"{conversation['title']}", key=f"load_{conversation['id']}"):
                                 self.load_conversation(conversation["id"])
                                 st.rerun()
+                        # Statistics are stored on the conversation row, so they cost nothing to show
+                        st.caption(self._conversation_caption(conversation))
                     
                     # Delete button
                     with col2:
@@ -119,13 +278,19 @@ class ChatInterface:
                                 conversation_id = self.db_manager.create_conversation(model=self.chat_client.model)
                                 st.session_state.current_conversation_id = conversation_id
                                 st.session_state.conversation_title = f"New Conversation {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-                                st.session_state.messages = []
+                                self._reset_messages()
                                 self.chat_client.clear_history()
                             else:
                                 # Just delete the conversation
                                 self.db_manager.delete_conversation(conversation["id"])
                             st.rerun()
                 
+                # Load the next page on demand
+                if cursor is not None:
+                    if st.button("Load more conversations"):
+                        st.session_state.sidebar_pages += 1
+                        st.rerun()
+                
                 # Divider between conversation list and settings
                 st.divider()
                 
@@ -145,9 +310,43 @@ class ChatInterface:
                     else:
                         st.error("Failed to export conversation")
                 
+                # Export every conversation as JSON Lines
+                if st.button("Export All Conversations"):
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    filename = f"conversations_{timestamp}.jsonl"
+                    home_dir = os.path.expanduser("~")
+                    export_path = os.path.join(home_dir, "Downloads", filename)
+                    
+                    try:
+                        count = self.db_manager.export_all(export_path)
+                        st.success(f"{count} conversations exported to {export_path}")
+                    except Exception as e:
+                        st.error(f"Failed to export conversations: {e}")
+                
                 # Import conversation
-                uploaded_file = st.file_uploader("Import Conversation", type=["json"])
+                uploaded_file = st.file_uploader("Import Conversation", type=["json", "jsonl"])
+                # The file stays in the uploader across reruns, so each upload is only imported once
                 if uploaded_file is not None:
+                    if uploaded_file.file_id == st.session_state.get("imported_file_id"):
+                        uploaded_file = None
+                    else:
+                        st.session_state.imported_file_id = uploaded_file.file_id
+                
+                if uploaded_file is not None and uploaded_file.name.endswith(".jsonl"):
+                    # Bulk import of a full history
+                    import tempfile
+                    with tempfile.NamedTemporaryFile(delete=False, suffix=".jsonl") as tmp:
+                        tmp.write(uploaded_file.getvalue())
+                        temp_path = tmp.name
+                    
+                    stats = self.db_manager.import_all(temp_path)
+                    os.unlink(temp_path)
+                    
+                    if stats:
+                        st.success(f"Imported {stats['imported']} conversations ({stats['skipped']} already present)")
+                    else:
+                        st.error("Failed to import conversations")
+                elif uploaded_file is not None:
                     # Save the uploaded file temporarily
                     import tempfile
                     with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as tmp:
@@ -193,16 +392,14 @@ class ChatInterface:
                 
                 # Display appropriate models based on provider
                 if provider == "OpenAI":
-                    openai_models = ["gpt-3.5-turbo", "gpt-4"]
-                    model = st.selectbox("Select Model", openai_models)
+                    model = st.selectbox("Select Model", ChatClient.OPENAI_MODELS)
                     
                     # Check if OpenAI API key is set
                     if not os.getenv("OPENAI_API_KEY"):
                         st.error("OpenAI API key not found. Please set OPENAI_API_KEY in your .env file.")
                 
                 elif provider == "Anthropic":
-                    anthropic_models = ["claude-3-opus", "claude-3-sonnet", "claude-3-haiku", "claude-3-7-sonnet"]
-                    model = st.selectbox("Select Model", anthropic_models)
+                    model = st.selectbox("Select Model", list(ChatClient.ANTHROPIC_MODEL_MAP))
                     
                     # Check if Anthropic API key is set
                     if not os.getenv("ANTHROPIC_API_KEY"):
@@ -216,7 +413,7 @@ class ChatInterface:
                 # Add a button to clear the chat history
                 if st.button("Clear Chat History"):
                     # Clear the chat history but keep the conversation
-                    st.session_state.messages = []
+                    self._reset_messages()
                     self.chat_client.clear_history()
                     
                     # Create a new conversation
@@ -226,12 +423,24 @@ class ChatInterface:
                     )
                     st.session_state.current_conversation_id = conversation_id
                     st.rerun()
-                    
+                
                 # Add temperature slider
                 temperature = st.slider("Temperature", min_value=0.0, max_value=1.0, value=0.7, step=0.1)
+                self.chat_client.temperature = temperature
                 
                 # Add maximum length slider
                 max_tokens = st.slider("Max Response Length", min_value=100, max_value=4000, value=1000, step=100)
+                self.chat_client.max_tokens = max_tokens
+                
+                # Display response cache counters
+                if self.chat_client.response_cache is not None:
+                    stats = self.chat_client.response_cache.stats()
+                    st.caption(f"Response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+                
+                # Display Anthropic prompt cache token counts
+                usage = self.chat_client.usage_totals
+                if usage["cache_read_input_tokens"] or usage["cache_creation_input_tokens"]:
+                    st.caption(f"Prompt cache: {usage['cache_read_input_tokens']} tokens read, {usage['cache_creation_input_tokens']} written")
                 
                 # Display API status
                 st.subheader("API Status")
@@ -239,7 +448,7 @@ class ChatInterface:
                     st.success("OpenAI: Connected")
                 else:
                     st.error("OpenAI: Not configured")
-                    
+                
                 if os.getenv("ANTHROPIC_API_KEY"):
                     st.success("Anthropic: Connected")
                 else:
@@ -248,39 +457,71 @@ class ChatInterface:
             # Divider before the chat
             st.divider()
             
+            # Only the most recent messages are shown, so a rerun costs the same however long the conversation is
+            if st.session_state.earlier_cursor is not None:
+                st.button("Load earlier messages", on_click=self.load_earlier_messages)
+            
             # Display existing chat messages
             for i, message in enumerate(st.session_state.messages):
                 with st.chat_message(message["role"]):
                     st.markdown(message["content"])
+                    if message.get("cached"):
+                        st.caption("⚡ Cached response")
             
             # Handle user input
             if prompt := st.chat_input("Type your message here..."):
-                # Add user message to chat history
-                st.session_state.messages.append({"role": "user", "content": prompt})
-                
-                # Save the message to the database
-                self.db_manager.add_message(
-                    st.session_state.current_conversation_id,
-                    "user",
-                    prompt
-                )
-                
                 # Display user message
                 with st.chat_message("user"):
                     st.markdown(prompt)
                 
-                # Get assistant response with a loading spinner
-                with st.chat_message("assistant"):
-                    with st.spinner(f"Thinking using {model}..."):
-                        response = self.chat_client.get_response(prompt)
-                        st.markdown(response)
+                # The model needs the whole conversation, not just the messages on screen
+                self._load_history()
+                
+                # Stream the assistant response into the chat pane as it arrives
+                try:
+                    with st.chat_message("assistant"):
+                        response = st.write_stream(self.chat_client.stream_response(prompt))
+                        cached = self.chat_client.last_response_cached
+                        if cached:
+                            st.caption("⚡ Cached response")
+                except LLMRequestError as e:
+                    # Failed turns are shown but not saved, so the message can be sent again
+                    st.error(str(e))
+                    return
+                
+                # Save the exchange to the database, or queue it to be saved in the background
+                db_started = time.perf_counter()
+                save = self.writer.add_message if self.writer else self.db_manager.add_message
+                user_message = {
+                    "id": save(st.session_state.current_conversation_id, "user", prompt),
+                    "role": "user",
+                    "content": prompt
+                }
+                assistant_message = {
+                    "id": save(st.session_state.current_conversation_id, "assistant", response),
+                    "role": "assistant",
+                    "content": response,
+                    "cached": cached
+                }
+                if self.writer:
+                    # The IDs are futures until the writer commits them
+                    st.session_state.pending_writes = [user_message, assistant_message]
                 
-                # Add assistant response to chat history
-                st.session_state.messages.append({"role": "assistant", "content": response})
+                # Add the exchange to the chat pane
+                self._append_messages([user_message, assistant_message])
                 
-                # Save the response to the database
-                self.db_manager.add_message(
-                    st.session_state.current_conversation_id,
-                    "assistant",
-                    response
+                metrics = self.chat_client.last_metrics
+                usage = self.chat_client.last_usage
+                log_event(
+                    logger, "chat_turn",
+                    conversation_id=st.session_state.current_conversation_id,
+                    model=self.chat_client.model,
+                    cached=cached,
+                    queue_wait=metrics.get("queue_wait"),
+                    time_to_first_token=metrics.get("time_to_first_token"),
+                    duration=metrics.get("duration"),
+                    retries=metrics.get("retries"),
+                    input_tokens=usage.get("input_tokens"),
+                    output_tokens=usage.get("output_tokens"),
+                    db_seconds=time.perf_counter() - db_started
                 )
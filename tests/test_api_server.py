@@ -0,0 +1,213 @@
+"""
+Tests for the HTTP API server
+"""
+import asyncio
+import base64
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import httpx
+from starlette.testclient import TestClient
+from src.api.server import create_app
+from src.db.db_manager import DBManager
+from src.llm.scheduler import LLMRequestError
+
+class FakeAsyncChatClient:
+    """Async chat client that answers word by word, recording what it was sent"""
+    
+    sent = []
+    delay = 0.0
+    
+    def __init__(self):
+        self.model = "gpt-3.5-turbo"
+        self.temperature = 0.7
+        self.max_tokens = 1000
+        self.conversation_history = []
+        self.last_usage = {}
+    
+    def _answer(self, user_message):
+        FakeAsyncChatClient.sent.append((self.model, list(self.conversation_history), user_message))
+        if user_message == "fail":
+            raise LLMRequestError("Error calling OpenAI API: rate limited", status_code=429, retryable=True, retry_after=2)
+        return f"Answer to {user_message}"
+    
+    async def get_response(self, user_message):
+        await asyncio.sleep(self.delay)
+        return self._answer(user_message)
+    
+    async def stream_response(self, user_message):
+        answer = self._answer(user_message)
+        for word in answer.split(" "):
+            await asyncio.sleep(self.delay)
+            yield word + " "
+
+def parse_events(text):
+    """Parse a server-sent event stream into (event, data) tuples"""
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+class TestAPIServer(unittest.TestCase):
+    """Test cases for the HTTP API server"""
+    
+    def setUp(self):
+        """Create a temporary database and a test client"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DBManager(os.path.join(self.temp_dir, "chat_history.db"))
+        self.app = create_app(self.db_manager, client_factory=FakeAsyncChatClient)
+        self.client = TestClient(self.app)
+        FakeAsyncChatClient.sent = []
+        FakeAsyncChatClient.delay = 0.0
+    
+    def tearDown(self):
+        """Remove the temporary database"""
+        self.client.close()
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_metrics(self):
+        """Test the Prometheus metrics endpoint"""
+        self.client.post("/conversations", json={"title": "Chat"})
+        
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn('zerocode_db_operation_duration_seconds_count{operation="create_conversation"}', response.text)
+    
+    def test_conversation_crud(self):
+        """Test creating, listing, renaming and deleting conversations"""
+        created = [self.client.post("/conversations", json={"title": f"Chat {i}"}).json() for i in range(3)]
+        self.assertEqual(created[0]["model"], "gpt-3.5-turbo")
+        
+        page = self.client.get("/conversations", params={"limit": 2}).json()
+        self.assertEqual(len(page["conversations"]), 2)
+        rest = self.client.get("/conversations", params={"limit": 2, "cursor": page["next_cursor"]}).json()
+        self.assertEqual(len(rest["conversations"]), 1)
+        self.assertIsNone(rest["next_cursor"])
+        
+        conversation_id = created[0]["id"]
+        response = self.client.patch(f"/conversations/{conversation_id}", json={"title": "Renamed"})
+        self.assertEqual(response.json()["title"], "Renamed")
+        
+        self.assertEqual(self.client.delete(f"/conversations/{conversation_id}").status_code, 204)
+        self.assertEqual(self.client.get(f"/conversations/{conversation_id}").status_code, 404)
+        self.assertEqual(self.client.get("/conversations", params={"cursor": "nonsense"}).status_code, 400)
+        
+        # Well-formed base64 and JSON that isn't a cursor, and empty pages, are client errors too
+        for cursor in ([1, 2, 3], 42, [{"a": 1}, "b"]):
+            encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+            self.assertEqual(self.client.get("/conversations", params={"cursor": encoded}).status_code, 400)
+        self.assertEqual(self.client.get("/conversations", params={"limit": 0}).status_code, 400)
+        self.assertEqual(self.client.get("/conversations", params={"limit": -5}).status_code, 400)
+        
+        # Missing conversations can't be renamed or deleted
+        self.assertEqual(self.client.delete("/conversations/missing").status_code, 404)
+        self.assertEqual(self.client.patch("/conversations/missing", json={"title": "Renamed"}).status_code, 404)
+    
+    def test_send_message(self):
+        """Test that messages are answered with the history and saved"""
+        conversation_id = self.client.post("/conversations", json={"model": "gpt-4"}).json()["id"]
+        
+        first = self.client.post(f"/conversations/{conversation_id}/messages", json={"content": "Hello"}).json()
+        self.assertEqual(first["content"], "Answer to Hello")
+        self.client.post(f"/conversations/{conversation_id}/messages", json={"content": "Again"})
+        
+        self.assertEqual(FakeAsyncChatClient.sent[1], (
+            "gpt-4",
+            [{"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Answer to Hello"}],
+            "Again"
+        ))
+        
+        messages = self.client.get(f"/conversations/{conversation_id}").json()["messages"]
+        self.assertEqual([m["content"] for m in messages], ["Hello", "Answer to Hello", "Again", "Answer to Again"])
+        self.assertEqual(messages[1]["id"], first["message_id"])
+    
+    def test_stream_message(self):
+        """Test streaming an answer as server-sent events"""
+        conversation_id = self.client.post("/conversations", json={}).json()["id"]
+        
+        response = self.client.post(f"/conversations/{conversation_id}/messages", json={"content": "Hi there", "stream": True})
+        
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        events = parse_events(response.text)
+        self.assertEqual([name for name, _ in events], ["delta", "delta", "delta", "delta", "done"])
+        self.assertEqual("".join(data["content"] for name, data in events[:-1]), "Answer to Hi there ")
+        self.assertEqual(events[-1][1]["conversation_id"], conversation_id)
+        
+        _, messages = self.db_manager.get_conversation(conversation_id)
+        self.assertEqual(len(messages), 2)
+    
+    def test_errors(self):
+        """Test that failed requests report the provider error and save nothing"""
+        conversation_id = self.client.post("/conversations", json={}).json()["id"]
+        path = f"/conversations/{conversation_id}/messages"
+        
+        response = self.client.post(path, json={"content": "fail"})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["retry-after"], "2")
+        self.assertTrue(response.json()["retryable"])
+        
+        events = parse_events(self.client.post(path, json={"content": "fail", "stream": True}).text)
+        self.assertEqual(events[-1][0], "error")
+        
+        _, messages = self.db_manager.get_conversation(conversation_id)
+        self.assertEqual(messages, [])
+        
+        self.assertEqual(self.client.post(path, json={}).status_code, 400)
+        self.assertEqual(self.client.post(path, content=b"not json").status_code, 400)
+        self.assertEqual(self.client.post("/conversations/missing/messages", json={"content": "Hi"}).status_code, 404)
+    
+    def test_stateless_chat(self):
+        """Test answering a conversation given in full without saving it"""
+        response = self.client.post("/chat", json={"model": "claude-3-haiku", "messages": [
+            {"role": "user", "content": "Hi"},
+            {"role": "assistant", "content": "Hello"},
+            {"role": "user", "content": "Bye"}
+        ]})
+        
+        self.assertEqual(response.json(), {"model": "claude-3-haiku", "content": "Answer to Bye"})
+        self.assertEqual(len(FakeAsyncChatClient.sent[0][1]), 2)
+        self.assertEqual(self.db_manager.get_all_conversations(), [])
+        
+        response = self.client.post("/chat", json={"messages": [{"role": "assistant", "content": "Hello"}]})
+        self.assertEqual(response.status_code, 400)
+        
+        # Sampling parameters are checked before anything is sent
+        messages = [{"role": "user", "content": "Hi"}]
+        for params in ({"temperature": "hot"}, {"temperature": 3}, {"temperature": True},
+                       {"max_tokens": 0}, {"max_tokens": 1.5}, {"max_tokens": "100"}):
+            self.assertEqual(self.client.post("/chat", json={"messages": messages, **params}).status_code, 400)
+        self.assertEqual(len(FakeAsyncChatClient.sent), 1)
+        self.assertEqual(self.client.post("/chat", json={"messages": messages, "temperature": 0, "max_tokens": 5}).status_code, 200)
+    
+    def test_concurrent_streams(self):
+        """Test that hundreds of streams are served concurrently in one process"""
+        FakeAsyncChatClient.delay = 0.05
+        
+        async def stream_all():
+            transport = httpx.ASGITransport(app=self.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+                async def stream(i):
+                    response = await client.post("/chat", json={
+                        "messages": [{"role": "user", "content": f"Prompt {i}"}],
+                        "stream": True
+                    })
+                    return parse_events(response.text)[-1]
+                
+                return await asyncio.gather(*(stream(i) for i in range(200)))
+        
+        start = time.perf_counter()
+        results = asyncio.run(stream_all())
+        
+        # Each stream takes about 0.15 seconds, so they must have overlapped
+        self.assertLess(time.perf_counter() - start, 3)
+        self.assertEqual({name for name, _ in results}, {"done"})
+        self.assertEqual(results[7][1]["content"], "Answer to Prompt 7 ")
+
+if __name__ == "__main__":
+    unittest.main()
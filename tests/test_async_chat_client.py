@@ -0,0 +1,184 @@
+"""
+Tests for the AsyncChatClient class
+"""
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.llm.async_chat_client import AsyncChatClient
+from src.llm.context_window import RollingSummaryStrategy
+from src.llm.scheduler import LLMRequestError, RequestScheduler
+
+def _completion(text):
+    """Build a fake OpenAI chat completion"""
+    completion = MagicMock()
+    completion.choices = [MagicMock()]
+    completion.choices[0].message.content = text
+    return completion
+
+class TestAsyncChatClient(unittest.TestCase):
+    """Test cases for the AsyncChatClient class"""
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        with patch.dict("os.environ", {"ANTHROPIC_API_KEY": ""}):
+            self.chat_client = AsyncChatClient(api_key="test_api_key")
+        self.chat_client.openai_client = MagicMock()
+        self.chat_client._get_async_openai_client = lambda: self.chat_client.openai_client
+    
+    def test_get_response(self):
+        """Test getting a response from the LLM"""
+        self.chat_client.openai_client.chat.completions.create = AsyncMock(
+            return_value=_completion("Test response")
+        )
+        
+        response = asyncio.run(self.chat_client.get_response("Test message"))
+        
+        self.assertEqual(response, "Test response")
+        self.assertEqual(len(self.chat_client.conversation_history), 2)
+        self.assertEqual(self.chat_client.conversation_history[1]["content"], "Test response")
+    
+    def test_compare_runs_concurrently(self):
+        """Test that compare mode takes as long as the slowest model"""
+        async def create(model, **kwargs):
+            await asyncio.sleep(0.2)
+            return _completion(f"Answer from {model}")
+        
+        self.chat_client.openai_client.chat.completions.create = create
+        models = ["gpt-3.5-turbo", "gpt-4", "gpt-4o", "gpt-4o-mini"]
+        
+        async def timed_compare():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            responses = await self.chat_client.compare("Test message", models)
+            return responses, loop.time() - start
+        
+        responses, elapsed = asyncio.run(timed_compare())
+        
+        self.assertEqual(responses, {model: f"Answer from {model}" for model in models})
+        self.assertLess(elapsed, 0.4)
+        
+        # Compare mode leaves the conversation history untouched
+        self.assertEqual(self.chat_client.conversation_history, [])
+    
+    def test_compare_as_completed_order(self):
+        """Test that answers are yielded in order of completion"""
+        delays = {"gpt-4": 0.1, "gpt-3.5-turbo": 0.0}
+        
+        async def create(model, **kwargs):
+            await asyncio.sleep(delays[model])
+            return _completion(model)
+        
+        self.chat_client.openai_client.chat.completions.create = create
+        
+        async def collect():
+            return [model async for model, _, _ in self.chat_client.compare_as_completed("Hi", ["gpt-4", "gpt-3.5-turbo"])]
+        
+        self.assertEqual(asyncio.run(collect()), ["gpt-3.5-turbo", "gpt-4"])
+    
+    def test_compare_usage_per_model(self):
+        """Test that compare mode reports each model's usage with its answer and leaves last_usage alone"""
+        tokens = {"gpt-4": 30, "gpt-3.5-turbo": 10}
+        
+        async def create(model, **kwargs):
+            await asyncio.sleep(0.1 if model == "gpt-4" else 0.0)
+            completion = _completion(model)
+            completion.usage = MagicMock(prompt_tokens=5, completion_tokens=tokens[model])
+            return completion
+        
+        self.chat_client.openai_client.chat.completions.create = create
+        self.chat_client.last_usage = {"output_tokens": 1}
+        self.chat_client.last_metrics = {"duration": 1.0}
+        
+        async def collect():
+            return {model: usage async for model, _, usage in self.chat_client.compare_as_completed("Hi", list(tokens))}
+        
+        usage = asyncio.run(collect())
+        self.assertEqual(usage["gpt-4"]["output_tokens"], 30)
+        self.assertEqual(usage["gpt-3.5-turbo"]["output_tokens"], 10)
+        self.assertEqual(usage["gpt-4"]["input_tokens"], 5)
+        self.assertEqual(self.chat_client.last_usage, {"output_tokens": 1})
+        self.assertEqual(self.chat_client.last_metrics, {"duration": 1.0})
+        self.assertEqual(self.chat_client.usage_totals["output_tokens"], 40)
+    
+    def test_stream_response(self):
+        """Test streaming a response, retrying a request that fails before its first chunk"""
+        attempts = []
+        
+        async def chunks():
+            for text in ["Hel", "lo", None]:
+                chunk = MagicMock()
+                chunk.choices = [MagicMock()]
+                chunk.choices[0].delta.content = text
+                yield chunk
+        
+        async def create(**kwargs):
+            attempts.append(kwargs["stream"])
+            if len(attempts) == 1:
+                raise type("APIConnectionError", (Exception,), {})("reset")
+            return chunks()
+        
+        self.chat_client.openai_client.chat.completions.create = create
+        
+        async def collect():
+            return [delta async for delta in self.chat_client.stream_response("Hi")]
+        
+        scheduler = RequestScheduler("openai", base_delay=0.001)
+        with patch.dict("src.llm.scheduler._schedulers", {"openai": scheduler}):
+            self.assertEqual(asyncio.run(collect()), ["Hel", "lo"])
+        
+        self.assertEqual(attempts, [True, True])
+        self.assertEqual(scheduler.retries, 1)
+        self.assertEqual(self.chat_client.conversation_history[-1], {"role": "assistant", "content": "Hello"})
+    
+    def test_abandoned_stream(self):
+        """Test that a stream closed before it finished leaves the history unchanged"""
+        async def chunks():
+            while True:
+                chunk = MagicMock()
+                chunk.choices = [MagicMock()]
+                chunk.choices[0].delta.content = "Partial"
+                yield chunk
+        
+        self.chat_client.openai_client.chat.completions.create = AsyncMock(return_value=chunks())
+        
+        async def read_one():
+            stream = self.chat_client.stream_response("Hi")
+            delta = await stream.__anext__()
+            await stream.aclose()
+            return delta
+        
+        self.assertEqual(asyncio.run(read_one()), "Partial")
+        self.assertEqual(self.chat_client.conversation_history, [])
+    
+    def test_clients_per_event_loop(self):
+        """Test that each event loop gets a client on its own connection pool"""
+        chat_client = AsyncChatClient(api_key="test_api_key")
+        self.assertIsNone(chat_client.openai_client)
+        
+        async def http_client():
+            return chat_client._get_async_openai_client()._client
+        
+        first, second = asyncio.run(http_client()), asyncio.run(http_client())
+        self.assertIsNot(first, second)
+    
+    def test_rolling_summary_rejected(self):
+        """Test that rolling summaries are refused instead of blocking the event loop"""
+        summarize = MagicMock(return_value="")
+        self.chat_client.context_strategy = RollingSummaryStrategy(summarize)
+        
+        with self.assertRaises(LLMRequestError):
+            asyncio.run(self.chat_client.get_response("Hi"))
+        
+        summarize.assert_not_called()
+        self.assertEqual(self.chat_client.conversation_history, [])
+        
+        with self.assertRaises(LLMRequestError):
+            self.chat_client.use_rolling_summary()
+    
+    def test_missing_anthropic_key(self):
+        """Test that a missing Anthropic key is reported per model"""
+        responses = asyncio.run(self.chat_client.compare("Hi", ["claude-3-haiku"]))
+        self.assertIn("Anthropic API key not configured", responses["claude-3-haiku"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,261 @@
+"""
+Tests for the BatchJobManager class, against a local stand-in for the provider batch APIs
+"""
+import email
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from src.batch.batch_jobs import BatchJobManager
+from src.db.db_manager import DBManager
+
+class StubBatchServer(ThreadingHTTPServer):
+    """Minimal stand-in for the OpenAI and Anthropic batch endpoints"""
+    
+    # Number of status checks a batch stays in progress for
+    POLLS_UNTIL_DONE = 2
+    
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubBatchHandler)
+        self.files = {}
+        self.batches = {}
+        self.polls = {}
+        self.lock = threading.Lock()
+    
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+    
+    @staticmethod
+    def answer(messages):
+        """Answer a request, failing those whose last message is 'fail'"""
+        prompt = messages[-1]["content"]
+        return None if prompt == "fail" else f"Answer to {prompt}"
+
+class StubBatchHandler(BaseHTTPRequestHandler):
+    """Request handler for StubBatchServer"""
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def send_json(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def send_text(self, text):
+        data = text.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+    
+    def poll(self, batch_id):
+        """Count a status check and tell whether the batch is done"""
+        server = self.server
+        with server.lock:
+            server.polls[batch_id] = server.polls.get(batch_id, 0) + 1
+            return server.polls[batch_id] > server.POLLS_UNTIL_DONE
+    
+    def do_POST(self):
+        server = self.server
+        body = self.read_body()
+        
+        if self.path == "/v1/files":
+            message = email.message_from_bytes(
+                b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body
+            )
+            for part in message.get_payload():
+                if part.get_filename():
+                    file_id = f"file-{uuid.uuid4().hex}"
+                    server.files[file_id] = part.get_payload(decode=True).decode()
+                    self.send_json({"id": file_id, "object": "file", "purpose": "batch",
+                                    "filename": part.get_filename(), "bytes": len(body),
+                                    "created_at": 0, "status": "processed"})
+                    return
+        
+        elif self.path == "/v1/batches":
+            request = json.loads(body)
+            batch_id = f"batch_{uuid.uuid4().hex}"
+            server.batches[batch_id] = {"provider": "openai", "input_file_id": request["input_file_id"]}
+            self.send_json(self.openai_batch(batch_id, "validating"))
+            return
+        
+        elif self.path == "/v1/messages/batches":
+            request = json.loads(body)
+            batch_id = f"msgbatch_{uuid.uuid4().hex}"
+            server.batches[batch_id] = {"provider": "anthropic", "requests": request["requests"]}
+            self.send_json(self.anthropic_batch(batch_id, "in_progress"))
+            return
+        
+        self.send_json({"error": {"message": "not found"}}, status=404)
+    
+    def do_GET(self):
+        server = self.server
+        parts = self.path.strip("/").split("/")
+        
+        if parts[:2] == ["v1", "batches"]:
+            status = "completed" if self.poll(parts[2]) else "in_progress"
+            self.send_json(self.openai_batch(parts[2], status))
+            return
+        
+        if parts[:2] == ["v1", "files"] and parts[3:] == ["content"]:
+            self.send_text(server.files[parts[2]])
+            return
+        
+        if parts[:3] == ["v1", "messages", "batches"] and parts[4:] == ["results"]:
+            lines = []
+            for request in server.batches[parts[3]]["requests"]:
+                text = server.answer(request["params"]["messages"])
+                if text is None:
+                    result = {"type": "errored", "error": {"type": "error", "error": {"type": "invalid_request_error", "message": "bad request"}}}
+                else:
+                    result = {"type": "succeeded", "message": {
+                        "id": "msg_1", "type": "message", "role": "assistant", "model": request["params"]["model"],
+                        "content": [{"type": "text", "text": text}], "stop_reason": "end_turn",
+                        "usage": {"input_tokens": 1, "output_tokens": 1}
+                    }}
+                lines.append(json.dumps({"custom_id": request["custom_id"], "result": result}))
+            self.send_text("\n".join(lines) + "\n")
+            return
+        
+        if parts[:3] == ["v1", "messages", "batches"]:
+            status = "ended" if self.poll(parts[3]) else "in_progress"
+            self.send_json(self.anthropic_batch(parts[3], status))
+            return
+        
+        self.send_json({"error": {"message": "not found"}}, status=404)
+    
+    def openai_batch(self, batch_id, status):
+        """Build an OpenAI batch object, writing its output file once it completes"""
+        server = self.server
+        batch = server.batches[batch_id]
+        output_file_id = None
+        
+        if status == "completed":
+            output_file_id = f"file-output-{batch_id}"
+            lines = []
+            for line in server.files[batch["input_file_id"]].splitlines():
+                request = json.loads(line)
+                text = server.answer(request["body"]["messages"])
+                if text is None:
+                    response = {"status_code": 400, "body": {"error": {"message": "bad request"}}}
+                else:
+                    response = {"status_code": 200, "body": {"choices": [{"message": {"role": "assistant", "content": text}}]}}
+                lines.append(json.dumps({"custom_id": request["custom_id"], "response": response, "error": None}))
+            server.files[output_file_id] = "\n".join(lines) + "\n"
+        
+        return {"id": batch_id, "object": "batch", "endpoint": "/v1/chat/completions",
+                "input_file_id": batch["input_file_id"], "completion_window": "24h", "status": status,
+                "output_file_id": output_file_id, "error_file_id": None, "created_at": 0}
+    
+    def anthropic_batch(self, batch_id, status):
+        """Build an Anthropic message batch object"""
+        return {"id": batch_id, "type": "message_batch", "processing_status": status,
+                "request_counts": {"processing": 0, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0},
+                "created_at": "2024-01-01T00:00:00Z", "expires_at": "2024-01-02T00:00:00Z",
+                "ended_at": None, "cancel_initiated_at": None, "archived_at": None,
+                "results_url": f"{self.server.url}/v1/messages/batches/{batch_id}/results" if status == "ended" else None}
+
+class TestBatchJobManager(unittest.TestCase):
+    """Test cases for the BatchJobManager class"""
+    
+    def setUp(self):
+        """Start the stand-in server and create a temporary database"""
+        self.server = StubBatchServer()
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DBManager(os.path.join(self.temp_dir, "chat_history.db"))
+        self.manager = BatchJobManager(
+            self.db_manager,
+            openai_api_key="test-openai-key",
+            anthropic_api_key="test-anthropic-key",
+            openai_base_url=f"{self.server.url}/v1",
+            anthropic_base_url=self.server.url,
+            poll_interval=0.01
+        )
+        
+        sleep_patcher = patch("src.batch.batch_jobs.time.sleep")
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+    
+    def tearDown(self):
+        """Stop the server and remove the database"""
+        self.server.shutdown()
+        self.server.server_close()
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def items(self, prompts):
+        """Build batch items from prompts"""
+        return [{"id": f"item-{i}", "messages": [{"role": "user", "content": prompt}]} for i, prompt in enumerate(prompts)]
+    
+    def saved_answers(self):
+        """Get the assistant message of every saved conversation"""
+        answers = []
+        for conversation in self.db_manager.get_all_conversations():
+            _, messages = self.db_manager.get_conversation(conversation["id"])
+            answers.append(messages[-1]["content"])
+        return sorted(answers)
+    
+    def test_openai_batch(self):
+        """Test submitting, polling and collecting an OpenAI batch"""
+        stats = self.manager.run(self.items(["One", "Two", "fail"]), "gpt-4", run="nightly")
+        
+        self.assertEqual(stats, {"submitted": 3, "succeeded": 2, "failed": 1, "skipped": 0})
+        self.assertEqual(self.saved_answers(), ["Answer to One", "Answer to Two"])
+        
+        job = self.db_manager.list_batch_jobs(run="nightly")[0]
+        self.assertEqual((job["provider"], job["status"], job["succeeded"], job["failed"]), ("openai", "collected", 2, 1))
+        
+        # The uploaded file holds one chat completion request per item
+        uploaded = [json.loads(line) for line in next(iter(self.server.files.values())).splitlines()]
+        self.assertEqual(uploaded[0]["url"], "/v1/chat/completions")
+        self.assertEqual(uploaded[0]["body"]["model"], "gpt-4")
+        
+        # Polling backs off while the batch is still running
+        delays = [call.args[0] for call in self.sleep.call_args_list if call.args[0] > 0]
+        self.assertEqual(len(delays), StubBatchServer.POLLS_UNTIL_DONE)
+        self.assertGreater(delays[1], delays[0])
+    
+    def test_anthropic_batch(self):
+        """Test submitting, polling and collecting an Anthropic message batch"""
+        stats = self.manager.run(self.items(["One", "fail"]), "claude-3-haiku", run="nightly")
+        
+        self.assertEqual(stats, {"submitted": 2, "succeeded": 1, "failed": 1, "skipped": 0})
+        self.assertEqual(self.saved_answers(), ["Answer to One"])
+        
+        batch = next(iter(self.server.batches.values()))
+        self.assertEqual(batch["requests"][0]["params"]["model"], "claude-3-haiku-20240307")
+    
+    def test_resume(self):
+        """Test that a rerun waits for submitted jobs instead of submitting them again"""
+        items = self.items(["One", "Two"])
+        self.manager.submit(items[:1], "gpt-4", run="nightly")
+        
+        stats = self.manager.run(items, "gpt-4", run="nightly")
+        
+        self.assertEqual(stats, {"submitted": 1, "succeeded": 2, "failed": 0, "skipped": 1})
+        self.assertEqual(len(self.server.batches), 2)
+        
+        # Everything has been saved, so a third run sends nothing
+        stats = self.manager.run(items, "gpt-4", run="nightly")
+        self.assertEqual(stats, {"submitted": 0, "succeeded": 0, "failed": 0, "skipped": 2})
+        self.assertEqual(len(self.server.batches), 2)
+        self.assertEqual(len(self.db_manager.get_all_conversations()), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+"""
+Tests for the BatchRunner class
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from src.batch.batch_runner import BatchRunner
+from src.db.db_manager import DBManager
+from src.llm.scheduler import LLMRequestError
+
+class FakeChatClient:
+    """Chat client that answers instantly, recording what it was sent"""
+    
+    sent = []
+    failing = set()
+    delay = 0.0
+    lock = threading.Lock()
+    
+    def __init__(self):
+        self.model = "gpt-3.5-turbo"
+        self.temperature = 0.7
+        self.max_tokens = 1000
+        self.conversation_history = []
+        self.last_usage = {}
+    
+    def get_response(self, user_message):
+        time.sleep(self.delay)
+        with self.lock:
+            FakeChatClient.sent.append((self.model, list(self.conversation_history), user_message))
+        if user_message in self.failing:
+            raise LLMRequestError("Error calling OpenAI API: rate limited", status_code=429, retryable=True)
+        return f"Answer to {user_message}"
+
+class TestBatchRunner(unittest.TestCase):
+    """Test cases for the BatchRunner class"""
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.temp_dir, "prompts.jsonl")
+        self.output_path = os.path.join(self.temp_dir, "results.jsonl")
+        FakeChatClient.sent = []
+        FakeChatClient.failing = set()
+        FakeChatClient.delay = 0.0
+    
+    def tearDown(self):
+        """Remove temporary files"""
+        shutil.rmtree(self.temp_dir)
+    
+    def write_input(self, items):
+        """Write prompt items to the input file"""
+        with open(self.input_path, "w") as f:
+            for item in items:
+                f.write(item if isinstance(item, str) else json.dumps(item))
+                f.write("\n")
+    
+    def read_output(self):
+        """Read the results written so far"""
+        with open(self.output_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    
+    def runner(self, **kwargs):
+        """Create a runner using the fake chat client"""
+        kwargs.setdefault("output_path", self.output_path)
+        return BatchRunner(client_factory=FakeChatClient, concurrency=4, **kwargs)
+    
+    def test_run_prompts_and_conversations(self):
+        """Test running prompts and conversations into a JSONL file"""
+        self.write_input([
+            {"id": "a", "prompt": "First"},
+            {"id": "b", "model": "gpt-4", "messages": [
+                {"role": "user", "content": "Hi"},
+                {"role": "assistant", "content": "Hello"},
+                {"role": "user", "content": "Second"}
+            ]},
+            "not json",
+            {"id": "c", "messages": [{"role": "assistant", "content": "No question"}]},
+            {"prompt": "Third"}
+        ])
+        
+        with self.assertLogs("src.batch.batch_runner", "WARNING") as logs:
+            stats = self.runner().run(self.input_path)
+        
+        self.assertEqual(stats, {"succeeded": 3, "failed": 0, "skipped": 0, "invalid": 2})
+        self.assertEqual([record.fields["line"] for record in logs.records], [3, 4])
+        results = {result["id"]: result for result in self.read_output()}
+        self.assertEqual(set(results), {"a", "b", "line-5"})
+        self.assertEqual(results["b"]["response"], "Answer to Second")
+        self.assertEqual(results["b"]["model"], "gpt-4")
+        
+        sent = {message: (model, history) for model, history, message in FakeChatClient.sent}
+        self.assertEqual(sent["Second"], ("gpt-4", [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]))
+        self.assertEqual(sent["First"], ("gpt-3.5-turbo", []))
+    
+    def test_resume(self):
+        """Test that a rerun only sends items that haven't completed"""
+        self.write_input([{"id": str(i), "prompt": f"Prompt {i}"} for i in range(10)])
+        FakeChatClient.failing = {"Prompt 3"}
+        
+        stats = self.runner().run(self.input_path)
+        self.assertEqual(stats["failed"], 1)
+        
+        # Simulate a crash in the middle of writing a line
+        with open(self.output_path, "a") as f:
+            f.write('{"id": "9", "resp')
+        
+        FakeChatClient.sent = []
+        FakeChatClient.failing = set()
+        stats = self.runner().run(self.input_path)
+        
+        self.assertEqual(stats, {"succeeded": 1, "failed": 0, "skipped": 9, "invalid": 0})
+        self.assertEqual([message for _, _, message in FakeChatClient.sent], ["Prompt 3"])
+        
+        with open(self.output_path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(json.loads(lines[-1])["id"], "3")
+    
+    def test_save_to_database(self):
+        """Test saving results as conversations and resuming from the database"""
+        db_manager = DBManager(os.path.join(self.temp_dir, "chat_history.db"))
+        self.write_input([{"id": str(i), "prompt": f"Prompt {i}", "title": f"Item {i}"} for i in range(3)])
+        
+        stats = self.runner(output_path=None, db_manager=db_manager).run(self.input_path)
+        self.assertEqual(stats["succeeded"], 3)
+        
+        conversations = db_manager.get_all_conversations()
+        self.assertEqual(sorted(c["title"] for c in conversations), ["Item 0", "Item 1", "Item 2"])
+        _, messages = db_manager.get_conversation(conversations[0]["id"])
+        self.assertEqual([m["role"] for m in messages], ["user", "assistant"])
+        
+        FakeChatClient.sent = []
+        stats = self.runner(output_path=None, db_manager=db_manager).run(self.input_path)
+        self.assertEqual(stats["skipped"], 3)
+        self.assertEqual(FakeChatClient.sent, [])
+        
+        # Deleting a saved conversation makes its item run again
+        db_manager.delete_conversation(conversations[0]["id"])
+        self.assertEqual(len(db_manager.get_batch_item_ids("prompts")), 2)
+        db_manager.close()
+    
+    def test_runs_concurrently(self):
+        """Test that items are sent concurrently"""
+        self.write_input([{"id": str(i), "prompt": f"Prompt {i}"} for i in range(8)])
+        FakeChatClient.delay = 0.1
+        
+        start = time.perf_counter()
+        stats = self.runner().run(self.input_path)
+        
+        self.assertEqual(stats["succeeded"], 8)
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Tests for the benchmark suite
+"""
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from benchmarks.bench_compression import run as run_compression, synthetic_corpus
+from benchmarks.bench_import import import_profile, lazy_packages_loaded, parse_importtime
+from benchmarks.suite import compare, parse_size, run_suite
+
+class TestBenchmarkSuite(unittest.TestCase):
+    """Test cases for the benchmark suite"""
+    
+    def test_run_suite(self):
+        """Test that a tiny run times every operation"""
+        with redirect_stdout(io.StringIO()):
+            results = run_suite([200], per_conversation=10, ops=4, history_lengths=[0, 4], import_runs=1)
+        
+        self.assertEqual(results["databases"]["200"]["conversations"], 20)
+        for operation in ["add_message", "get_conversation", "get_all_conversations", "delete_conversation",
+                          "export_conversation", "import_conversation", "export_all", "import_all"]:
+            self.assertGreater(results["results"][f"db[200].{operation}"]["ops_per_sec"], 0)
+        self.assertIn("chat_client.get_response[history=4]", results["results"])
+        self.assertIn("sqlite", results["environment"])
+        self.assertGreater(results["results"]["import[src.llm.chat_client]"]["median_ms"], 0)
+    
+    def test_compression(self):
+        """Test that the compression report covers the codec and both databases"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            results = run_compression(synthetic_corpus(40), temp_dir)
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        self.assertGreater(results["codec"]["compressed_share"], 0)
+        self.assertGreater(results["codec"]["ratio"], 1)
+        self.assertLess(results["compressed"]["db_bytes"], results["uncompressed"]["db_bytes"])
+    
+    def test_compare(self):
+        """Test that only medians slower than the threshold count as regressions"""
+        baseline = {"results": {"a": {"median_ms": 1.0}, "b": {"median_ms": 1.0}, "gone": {"median_ms": 1.0}}}
+        results = {"results": {"a": {"median_ms": 1.2}, "b": {"median_ms": 2.0}, "new": {"median_ms": 9.0}}}
+        
+        self.assertEqual(compare(results, baseline, threshold=0.25), [("b", 1.0, 2.0)])
+    
+    def test_parse_size(self):
+        """Test parsing database sizes"""
+        self.assertEqual([parse_size(size) for size in ["1k", "100K", "1m", "2500", "1.5k"]], [1000, 100000, 1000000, 2500, 1500])
+    
+    def test_parse_importtime(self):
+        """Test parsing the -X importtime report"""
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   _json\n"
+            "import time:      2200 |       2320 | json\n"
+            "import time:        80 |         80 | json\n"
+        )
+        self.assertEqual(parse_importtime(output), {"_json": 120, "json": 2320})
+    
+    def test_headless_imports_are_lazy(self):
+        """Test that the chat client loads no provider SDK, LangChain or Streamlit until used"""
+        for module in ["src.llm.chat_client", "src.llm.llm_factory", "src.batch.batch_runner"]:
+            self.assertEqual(lazy_packages_loaded(import_profile(module)), [], module)
+
+if __name__ == "__main__":
+    unittest.main()
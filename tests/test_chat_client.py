@@ -56,5 +56,127 @@ class TestChatClient(unittest.TestCase):
         self.assertEqual(chat_client.conversation_history[1]["role"], "assistant")
         self.assertEqual(chat_client.conversation_history[1]["content"], "Test response")
 
+    def test_stream_response(self):
+        """Test streaming a response from the LLM"""
+        # Build a fake OpenAI stream of content deltas
+        chunks = []
+        for delta in ["Test", " streamed", None, " response"]:
+            chunk = MagicMock()
+            chunk.choices = [MagicMock()]
+            chunk.choices[0].delta.content = delta
+            chunks.append(chunk)
+        
+        self.chat_client.openai_client = MagicMock()
+        self.chat_client.openai_client.chat.completions.create.return_value = iter(chunks)
+        
+        # Deltas are yielded as they arrive
+        deltas = list(self.chat_client.stream_response("Test message"))
+        self.assertEqual(deltas, ["Test", " streamed", " response"])
+        
+        # The request was made in streaming mode
+        kwargs = self.chat_client.openai_client.chat.completions.create.call_args.kwargs
+        self.assertTrue(kwargs["stream"])
+        
+        # The full text is added to history once the stream ends
+        self.assertEqual(len(self.chat_client.conversation_history), 2)
+        self.assertEqual(self.chat_client.conversation_history[1]["role"], "assistant")
+        self.assertEqual(self.chat_client.conversation_history[1]["content"], "Test streamed response")
+    
+    def test_abandoned_stream(self):
+        """Test that a stream closed before it finished leaves the history unchanged"""
+        chunk = MagicMock()
+        chunk.choices = [MagicMock()]
+        chunk.choices[0].delta.content = "Partial"
+        
+        self.chat_client.openai_client = MagicMock()
+        self.chat_client.openai_client.chat.completions.create.return_value = iter([chunk, chunk])
+        
+        stream = self.chat_client.stream_response("Test message")
+        self.assertEqual(next(stream), "Partial")
+        stream.close()
+        
+        self.assertEqual(self.chat_client.conversation_history, [])
+    
+    def test_rolling_summary(self):
+        """Test that older turns are replaced by a summary written with the current model"""
+        completion = MagicMock()
+        completion.choices = [MagicMock()]
+        completion.choices[0].message.content = "Earlier: greetings"
+        self.chat_client.openai_client = MagicMock()
+        self.chat_client.openai_client.chat.completions.create.return_value = completion
+        
+        self.chat_client.use_rolling_summary(summary_share=0.5)
+        self.chat_client.context_budget = 400
+        for _ in range(3):
+            self.chat_client.add_message("user", "word " * 100)
+            self.chat_client.add_message("assistant", "word " * 100)
+        
+        self.chat_client.get_response("Test message")
+        
+        calls = self.chat_client.openai_client.chat.completions.create.call_args_list
+        self.assertEqual(len(calls), 2)
+        self.assertIn("Update the summary", calls[0].kwargs["messages"][0]["content"])
+        sent = calls[1].kwargs["messages"]
+        self.assertTrue(sent[0]["content"].startswith("Summary of the earlier conversation:\nEarlier: greetings"))
+        self.assertTrue(sent[-1]["content"].endswith("Test message"))
+        self.assertEqual(len(self.chat_client.conversation_history), 8)
+
+    def _anthropic_client(self, long_history):
+        """Set up the chat client with a mocked Anthropic SDK client"""
+        self.chat_client.model = "claude-3-haiku"
+        self.chat_client.anthropic_api_key = "test_anthropic_key"
+        self.chat_client.anthropic_client = MagicMock()
+        
+        message = MagicMock()
+        message.content = [MagicMock(text="Test response")]
+        message.usage = MagicMock(input_tokens=12, output_tokens=5,
+                                  cache_read_input_tokens=2000, cache_creation_input_tokens=300)
+        self.chat_client.anthropic_client.messages.create.return_value = message
+        
+        text = "word " * 800 if long_history else "Hi"
+        self.chat_client.add_message("user", text)
+        self.chat_client.add_message("assistant", text)
+        return self.chat_client.anthropic_client
+    
+    def test_prompt_cache_breakpoints(self):
+        """Test that long Anthropic prompts mark the stable prefix for caching"""
+        anthropic_client = self._anthropic_client(long_history=True)
+        
+        self.chat_client.get_response("Test message")
+        
+        messages = anthropic_client.messages.create.call_args.kwargs["messages"]
+        self.assertEqual(messages[0]["content"][0]["cache_control"], {"type": "ephemeral"})
+        self.assertEqual(messages[1]["content"], "word " * 800)
+        self.assertEqual(messages[2]["content"][0]["text"], "Test message")
+        self.assertEqual(messages[2]["content"][0]["cache_control"], {"type": "ephemeral"})
+        
+        # The history itself keeps plain text content
+        self.assertEqual(self.chat_client.conversation_history[2]["content"], "Test message")
+        
+        # Cache token counts are recorded
+        self.assertEqual(self.chat_client.last_usage["cache_read_input_tokens"], 2000)
+        self.assertEqual(self.chat_client.last_usage["cache_creation_input_tokens"], 300)
+        self.chat_client.get_response("Another message")
+        self.assertEqual(self.chat_client.usage_totals["cache_read_input_tokens"], 4000)
+    
+    def test_short_prompts_are_not_cached(self):
+        """Test that prompts below the provider's minimum cacheable length have no breakpoints"""
+        anthropic_client = self._anthropic_client(long_history=False)
+        
+        self.chat_client.get_response("Test message")
+        
+        messages = anthropic_client.messages.create.call_args.kwargs["messages"]
+        self.assertEqual([message["content"] for message in messages], ["Hi", "Hi", "Test message"])
+    
+    def test_prompt_caching_disabled(self):
+        """Test turning prompt caching off"""
+        anthropic_client = self._anthropic_client(long_history=True)
+        self.chat_client.prompt_caching = False
+        
+        self.chat_client.get_response("Test message")
+        
+        messages = anthropic_client.messages.create.call_args.kwargs["messages"]
+        self.assertTrue(all(isinstance(message["content"], str) for message in messages))
+
 if __name__ == "__main__":
     unittest.main()
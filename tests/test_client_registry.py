@@ -0,0 +1,68 @@
+"""
+Tests for the ClientRegistry class
+"""
+import asyncio
+import unittest
+from unittest.mock import patch, MagicMock
+from src.llm.client_registry import ClientRegistry, get_registry
+
+class TestClientRegistry(unittest.TestCase):
+    """Test cases for the ClientRegistry class"""
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.registry = ClientRegistry(max_connections=7, max_keepalive_connections=3, timeout=30, connect_timeout=2)
+    
+    def tearDown(self):
+        """Close the pools opened by the test"""
+        self.registry.close()
+    
+    def test_clients_share_connection_pool(self):
+        """Test that every client for a provider uses the same HTTP pool"""
+        first = self.registry.openai_client("key-1")
+        second = self.registry.openai_client("key-2")
+        self.assertIs(first._client, second._client)
+        
+        anthropic_client = self.registry.anthropic_client("key-3")
+        self.assertIsNot(anthropic_client._client, first._client)
+        self.assertIs(anthropic_client._client, self.registry.anthropic_client("key-4")._client)
+    
+    def test_pool_settings(self):
+        """Test that pool size and timeouts are applied"""
+        self.assertEqual(self.registry.limits.max_connections, 7)
+        self.assertEqual(self.registry.limits.max_keepalive_connections, 3)
+        timeout = self.registry.openai_client("key").timeout
+        self.assertEqual(timeout.connect, 2)
+        self.assertEqual(timeout.read, 30)
+    
+    @patch.dict("os.environ", {"LLM_POOL_MAX_CONNECTIONS": "42", "LLM_CONNECT_TIMEOUT": "1.5"})
+    def test_pool_settings_from_environment(self):
+        """Test that pool settings can be tuned through environment variables"""
+        registry = ClientRegistry()
+        self.assertEqual(registry.limits.max_connections, 42)
+        self.assertEqual(registry.connect_timeout, 1.5)
+    
+    def test_async_pools_are_per_event_loop(self):
+        """Test that async clients share a pool within one event loop only"""
+        async def pool():
+            first = self.registry.async_openai_client("key-1")
+            second = self.registry.async_openai_client("key-2")
+            self.assertIs(first._client, second._client)
+            return first._client
+        
+        self.assertIsNot(asyncio.run(pool()), asyncio.run(pool()))
+    
+    def test_prewarm_runs_once(self):
+        """Test that pre-warming opens a connection only on the first call"""
+        http_client = MagicMock()
+        with patch.object(self.registry, "_http_client", return_value=http_client):
+            self.registry.prewarm(["openai"], background=False)
+            self.registry.prewarm(["openai"], background=False)
+        http_client.head.assert_called_once()
+    
+    def test_get_registry_is_singleton(self):
+        """Test that the process-wide registry is shared"""
+        self.assertIs(get_registry(), get_registry())
+
+if __name__ == "__main__":
+    unittest.main()
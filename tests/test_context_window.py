@@ -0,0 +1,118 @@
+"""
+Tests for context window management
+"""
+import unittest
+from unittest.mock import MagicMock, patch
+from src.llm.chat_client import ChatClient
+from src.llm.context_window import (
+    PinFirstStrategy,
+    RollingSummaryStrategy,
+    SlidingWindowStrategy,
+    TokenCounter,
+    context_window,
+)
+
+def conversation(turns):
+    """Build a conversation of alternating user and assistant messages"""
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"}
+        for i in range(turns)
+    ]
+
+def count(message):
+    """Count every message as 10 tokens"""
+    return 10
+
+class TestContextWindow(unittest.TestCase):
+    """Test cases for token counting and context strategies"""
+    
+    def test_context_window(self):
+        """Test looking up the context window of a model"""
+        self.assertEqual(context_window("gpt-4"), 8192)
+        self.assertEqual(context_window("gpt-4-turbo-preview"), 128000)
+        self.assertEqual(context_window("claude-3-opus"), 200000)
+        self.assertEqual(context_window("unknown-model"), 8192)
+    
+    def test_token_counts_are_cached(self):
+        """Test that each message is only tokenized once"""
+        counter = TokenCounter()
+        message = {"role": "user", "content": "Hello there, how are you?"}
+        
+        with patch.object(counter, "_count_text", return_value=7) as count_text:
+            self.assertEqual(counter.count("claude-3-opus", message), 11)
+            self.assertEqual(counter.count("claude-3-sonnet", dict(message)), 11)
+            self.assertEqual(count_text.call_count, 1)
+    
+    def test_sliding_window(self):
+        """Test that the sliding window keeps the most recent messages"""
+        messages = conversation(9)
+        strategy = SlidingWindowStrategy()
+        
+        self.assertIs(strategy.fit(messages, 1000, count), messages)
+        
+        fitted = strategy.fit(messages, 40, count)
+        self.assertEqual(fitted, messages[6:])
+        self.assertEqual(fitted[0]["role"], "user")
+        
+        # The latest message is sent even if it doesn't fit on its own
+        self.assertEqual(strategy.fit(messages, 5, count), messages[-1:])
+    
+    def test_pin_first(self):
+        """Test that pinned messages are always sent"""
+        messages = conversation(9)
+        
+        fitted = PinFirstStrategy(pinned=2).fit(messages, 50, count)
+        self.assertEqual(fitted, messages[:2] + messages[6:])
+    
+    def test_rolling_summary(self):
+        """Test that only newly dropped turns are summarized"""
+        summarize = MagicMock(side_effect=lambda summary, messages, limit: summary + f"[{len(messages)}]")
+        strategy = RollingSummaryStrategy(summarize, summary_share=0.5)
+        messages = conversation(7)
+        
+        fitted = strategy.fit(messages, 60, count)
+        self.assertEqual(summarize.call_args[0][1], messages[:4])
+        self.assertEqual(fitted[1:], messages[5:])
+        self.assertTrue(fitted[0]["content"].startswith("Summary of the earlier conversation:\n[4]"))
+        self.assertEqual(messages[4]["content"], "message 4")
+        
+        # Nothing new has left the window, so the summary is reused
+        strategy.fit(messages, 60, count)
+        self.assertEqual(summarize.call_count, 1)
+        
+        messages.extend(conversation(9)[7:])
+        strategy.fit(messages, 60, count)
+        self.assertEqual(summarize.call_count, 2)
+        self.assertEqual(summarize.call_args[0][0], "[4]")
+        self.assertEqual(summarize.call_args[0][1], messages[4:6])
+        
+        # A history rebuilt from the database is the same conversation
+        strategy.fit([dict(message) for message in messages], 60, count)
+        self.assertEqual(summarize.call_count, 2)
+        
+        strategy.fit(conversation(9)[1:], 60, count)
+        self.assertEqual(summarize.call_args[0][0], "")
+    
+    @patch('openai.OpenAI')
+    def test_chat_client_trims_payload(self, mock_openai):
+        """Test that ChatClient sends a trimmed payload but keeps the full history"""
+        mock_client = MagicMock()
+        mock_openai.return_value = mock_client
+        mock_completion = MagicMock()
+        mock_completion.choices = [MagicMock()]
+        mock_completion.choices[0].message.content = "Test response"
+        mock_client.chat.completions.create.return_value = mock_completion
+        
+        chat_client = ChatClient(api_key="test_api_key")
+        chat_client.context_budget = 40
+        chat_client.token_counter.count = lambda model, message: count(message)
+        chat_client.conversation_history = conversation(8)
+        
+        chat_client.get_response("Latest question")
+        
+        sent = mock_client.chat.completions.create.call_args[1]["messages"]
+        self.assertEqual(sent, chat_client.conversation_history[6:9])
+        self.assertEqual(len(chat_client.conversation_history), 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,608 @@
+"""
+Tests for the DBManager class
+"""
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from src.db.db_manager import DBManager
+
+class TestDBManager(unittest.TestCase):
+    """Test cases for the DBManager class"""
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "chat_history.db")
+        self.db_manager = DBManager(self.db_path)
+    
+    def tearDown(self):
+        """Remove the temporary database"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_conversation_round_trip(self):
+        """Test creating a conversation and reading back its messages"""
+        conversation_id = self.db_manager.create_conversation(title="Test", model="gpt-4")
+        self.db_manager.add_message(conversation_id, "user", "Hello")
+        self.db_manager.add_message(conversation_id, "assistant", "Hi there")
+        
+        conversation, messages = self.db_manager.get_conversation(conversation_id)
+        
+        self.assertEqual(conversation["title"], "Test")
+        self.assertEqual(conversation["summary"], "Hello")
+        self.assertEqual([m["content"] for m in messages], ["Hello", "Hi there"])
+    
+    def test_tail_messages(self):
+        """Test reading a conversation's messages from the end, one page at a time"""
+        conversation_id = self.db_manager.create_conversation(title="Long")
+        for i in range(25):
+            self.db_manager.add_message(conversation_id, "user", f"Message {i}")
+        
+        _, tail = self.db_manager.get_conversation(conversation_id, message_limit=3)
+        self.assertEqual([m["content"] for m in tail], ["Message 22", "Message 23", "Message 24"])
+        
+        pages = []
+        cursor = None
+        while True:
+            page, cursor = self.db_manager.get_messages(conversation_id, limit=10, before_id=cursor)
+            pages.append([m["content"] for m in page])
+            if cursor is None:
+                break
+        
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(pages[0][0], "Message 15")
+        self.assertEqual(pages[2], [f"Message {i}" for i in range(5)])
+        self.assertEqual(self.db_manager.get_messages("missing"), ([], None))
+    
+    def test_delete_conversation(self):
+        """Test deleting a conversation and its messages"""
+        conversation_id = self.db_manager.create_conversation()
+        self.db_manager.add_message(conversation_id, "user", "Hello")
+        
+        self.assertTrue(self.db_manager.delete_conversation(conversation_id))
+        self.assertEqual(self.db_manager.get_conversation(conversation_id), (None, []))
+        self.assertEqual(self.db_manager.get_all_conversations(), [])
+        
+        # Nothing was there to delete or rename
+        self.assertFalse(self.db_manager.delete_conversation(conversation_id))
+        self.assertFalse(self.db_manager.update_conversation_title(conversation_id, "Gone"))
+    
+    def test_list_conversations_pages(self):
+        """Test paging through conversations with a keyset cursor"""
+        created = []
+        for i in range(5):
+            conversation_id = self.db_manager.create_conversation(title=f"Conversation {i}")
+            # Give every conversation the same timestamp so ties are broken by ID
+            with self.db_manager._connection() as conn:
+                conn.execute("UPDATE conversations SET updated_at = '2024-01-01' WHERE id = ?", (conversation_id,))
+                conn.commit()
+            created.append(conversation_id)
+        
+        first_page, cursor = self.db_manager.list_conversations(limit=2)
+        second_page, cursor = self.db_manager.list_conversations(limit=2, cursor=cursor)
+        last_page, cursor = self.db_manager.list_conversations(limit=2, cursor=cursor)
+        
+        ids = [c["id"] for c in first_page + second_page + last_page]
+        self.assertEqual(ids, sorted(created, reverse=True))
+        self.assertEqual(len(last_page), 1)
+        self.assertIsNone(cursor)
+        self.assertEqual(set(first_page[0]), {"id", "title", "updated_at", "archive"} | set(DBManager.LISTING_STATS))
+    
+    def test_conversation_stats(self):
+        """Test that message and token counts and the last message follow every write"""
+        conversation_id = self.db_manager.create_conversation()
+        self.db_manager.add_message(conversation_id, "user", "Hello")
+        self.db_manager.add_messages([(conversation_id, "assistant", "x" * 150)])
+        
+        conversations, _ = self.db_manager.list_conversations()
+        stats = conversations[0]
+        self.assertEqual(stats["message_count"], 2)
+        self.assertEqual(stats["token_count"], 2 + 38)
+        self.assertEqual(stats["last_message_preview"], "x" * 100)
+        self.assertIsNotNone(stats["last_message_at"])
+        
+        # The summary still comes from the first user message only
+        self.db_manager.add_message(conversation_id, "user", "Second question")
+        conversation, _ = self.db_manager.get_conversation(conversation_id)
+        self.assertEqual(conversation["summary"], "Hello")
+        
+        with self.db_manager._connection() as conn:
+            conn.execute("DELETE FROM messages WHERE content = 'Second question'")
+            conn.commit()
+        conversation, _ = self.db_manager.get_conversation(conversation_id)
+        self.assertEqual(conversation["message_count"], 2)
+        self.assertEqual(conversation["token_count"], 40)
+        self.assertEqual(conversation["last_message_preview"], "x" * 100)
+        
+        # Bulk paths are counted too
+        imported = self.db_manager.save_batch_result("run", "item", "Batch", "gpt-4", [
+            {"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello there"}
+        ])
+        conversation, _ = self.db_manager.get_conversation(imported)
+        self.assertEqual(conversation["message_count"], 2)
+        self.assertEqual(conversation["last_message_preview"], "Hello there")
+    
+    def test_compressed_messages(self):
+        """Test that large bodies are stored compressed and read, searched and exported as text"""
+        conversation_id = self.db_manager.create_conversation(title="Logs")
+        log = "\n".join(f"2024-03-01 12:00:{i % 60:02d} INFO worker started job {i}" for i in range(200))
+        large = "Here is the log:\n" + log + "\nWhy does the scheduler stall?"
+        self.db_manager.add_message(conversation_id, "user", large)
+        self.db_manager.add_message(conversation_id, "assistant", "Short answer")
+        
+        with self.db_manager._connection() as conn:
+            rows = conn.execute("SELECT content, codec, length(content_blob) FROM messages ORDER BY id").fetchall()
+        self.assertEqual((rows[0][0], rows[0][1]), (None, DBManager.ZLIB_CODEC))
+        self.assertLess(rows[0][2], len(large) // 4)
+        self.assertEqual((rows[1][0], rows[1][1]), ("Short answer", None))
+        
+        _, messages = self.db_manager.get_conversation(conversation_id)
+        self.assertEqual([m["content"] for m in messages], [large, "Short answer"])
+        self.assertNotIn("content_blob", messages[0])
+        self.assertEqual(self.db_manager.get_messages(conversation_id, limit=2)[0][0]["content"], large)
+        
+        # The search index and the statistics see the text
+        results = self.db_manager.search("scheduler stall")
+        self.assertEqual(results[0]["conversation_id"], conversation_id)
+        self.assertIn("stall", results[0]["snippet"])
+        conversation, _ = self.db_manager.get_conversation(conversation_id)
+        self.assertEqual(conversation["token_count"], (len(large) + 3) // 4 + 3)
+        
+        # Exports hold the text, and imports compress it again
+        export_path = os.path.join(self.temp_dir, "export.jsonl")
+        self.db_manager.export_all(export_path)
+        with open(export_path, "r", encoding="utf-8") as f:
+            self.assertEqual(json.loads(f.readline())["messages"][0]["content"], large)
+        target = DBManager(os.path.join(self.temp_dir, "target.db"))
+        try:
+            target.import_all(export_path)
+            imported = target.list_conversations()[0][0]["id"]
+            self.assertEqual(target.get_conversation(imported)[1][0]["content"], large)
+            self.assertEqual(target.search("scheduler stall")[0]["conversation_id"], imported)
+            with target._connection() as conn:
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM messages WHERE codec = 'zlib'").fetchone()[0], 1)
+        finally:
+            target.close()
+        
+        # Deleting removes the message from the search index
+        self.assertTrue(self.db_manager.delete_conversation(conversation_id))
+        self.assertEqual(self.db_manager.search("scheduler stall"), [])
+    
+    def test_plain_sqlite_connection_writes(self):
+        """Test that other SQLite clients can write messages, and that the search index can be rebuilt"""
+        conversation_id = self.db_manager.create_conversation(title="Shared")
+        self.db_manager.add_message(conversation_id, "user", "compressed body " * 200)
+        
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "INSERT INTO messages (conversation_id, role, content, timestamp) VALUES (?, 'assistant', 'plain reply', '2024-01-01')",
+            (conversation_id,)
+        )
+        conn.commit()
+        conversation, _ = self.db_manager.get_conversation(conversation_id)
+        self.assertEqual((conversation["message_count"], conversation["last_message_preview"]), (2, "plain reply"))
+        self.assertEqual(self.db_manager.search("plain reply")[0]["conversation_id"], conversation_id)
+        
+        conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+        conn.commit()
+        conn.close()
+        conversation, _ = self.db_manager.get_conversation(conversation_id)
+        self.assertEqual((conversation["message_count"], conversation["token_count"]), (0, 0))
+        self.assertEqual(self.db_manager.search("plain reply"), [])
+        
+        # The compressed row's index entry is left behind until the index is rebuilt
+        self.assertEqual(self.db_manager.search("compressed body"), [])
+        count = "SELECT COUNT(*) FROM messages_fts WHERE messages_fts MATCH 'compressed'"
+        with self.db_manager._connection() as conn:
+            self.assertEqual(conn.execute(count).fetchone()[0], 1)
+        self.assertEqual(self.db_manager.rebuild_search_index(), 0)
+        with self.db_manager._connection() as conn:
+            self.assertEqual(conn.execute(count).fetchone()[0], 0)
+        
+        self.db_manager.add_message(conversation_id, "user", "compressed body " * 200)
+        self.assertEqual(self.db_manager.rebuild_search_index(), 1)
+        self.assertEqual(len(self.db_manager.search("compressed body")), 1)
+    
+    def test_search(self):
+        """Test searching message contents and titles"""
+        first = self.db_manager.create_conversation(title="Deployment notes")
+        self.db_manager.add_message(first, "user", "How do I configure nginx as a reverse proxy?")
+        second = self.db_manager.create_conversation(title="Cooking")
+        self.db_manager.add_message(second, "user", "A recipe for sourdough bread")
+        
+        results = self.db_manager.search("nginx proxy")
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["conversation_id"], first)
+        self.assertEqual(results[0]["role"], "user")
+        self.assertIn("nginx", results[0]["snippet"])
+        
+        results = self.db_manager.search("deployment")
+        self.assertEqual([(r["conversation_id"], r["message_id"]) for r in results], [(first, None)])
+        
+        # Renaming and deleting keep the index in sync
+        self.db_manager.update_conversation_title(second, "Baking")
+        self.assertEqual(self.db_manager.search("cooking"), [])
+        self.assertEqual(len(self.db_manager.search("baking")), 1)
+        self.db_manager.delete_conversation(first)
+        self.assertEqual(self.db_manager.search("nginx"), [])
+    
+    def test_search_paging_and_syntax(self):
+        """Test paging through results and searching for FTS5 syntax characters"""
+        conversation_id = self.db_manager.create_conversation()
+        for i in range(5):
+            self.db_manager.add_message(conversation_id, "user", f"error number {i}" + " and more" * i)
+        
+        first_page = self.db_manager.search("error", limit=3)
+        second_page = self.db_manager.search("error", limit=3, offset=3)
+        ids = [r["message_id"] for r in first_page + second_page]
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+        
+        # Pages past the first tier of ranked matches
+        with patch.object(DBManager, "FTS_RANK_WINDOW", 2):
+            self.db_manager.update_conversation_title(conversation_id, "error log")
+            pages = [self.db_manager.search("error", limit=2, offset=offset) for offset in range(0, 8, 2)]
+        hits = [(r["message_id"], r["conversation_id"]) for page in pages for r in page]
+        self.assertEqual(len(set(hits)), 6)
+        self.assertEqual(pages[-1], [])
+        
+        # Message and title scores are scaled to the best match of each kind
+        self.assertEqual([r["score"] for r in pages[0]], [1.0, 1.0])
+        self.assertEqual({r["message_id"] is None for r in pages[0]}, {True, False})
+        
+        self.assertEqual(self.db_manager.search('"unbalanced AND ('), [])
+        self.assertEqual(self.db_manager.search("   "), [])
+    
+    def test_bulk_export_import(self):
+        """Test moving the whole history through a JSONL file"""
+        for i in range(3):
+            conversation_id = self.db_manager.create_conversation(title=f"Conversation {i}")
+            self.db_manager.add_message(conversation_id, "user", f"Question {i}")
+            self.db_manager.add_message(conversation_id, "assistant", f"Answer {i}")
+        
+        export_path = os.path.join(self.temp_dir, "history.jsonl")
+        self.assertEqual(self.db_manager.export_all(export_path), 3)
+        with open(export_path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([len(line["messages"]) for line in lines], [2, 2, 2])
+        
+        target = DBManager(os.path.join(self.temp_dir, "target.db"))
+        self.assertEqual(target.import_all(export_path), {"imported": 3, "skipped": 0, "messages": 6, "errors": 0})
+        
+        # Importing the same file again skips everything
+        self.assertEqual(target.import_all(export_path), {"imported": 0, "skipped": 3, "messages": 0, "errors": 0})
+        
+        titles = sorted(c["title"] for c in target.get_all_conversations())
+        self.assertEqual(titles, ["Conversation 0", "Conversation 1", "Conversation 2"])
+        conversation_id = target.search("Question 1")[0]["conversation_id"]
+        _, messages = target.get_conversation(conversation_id)
+        self.assertEqual([m["content"] for m in messages], ["Question 1", "Answer 1"])
+        target.close()
+    
+    def test_reexport_after_new_messages(self):
+        """Test that an imported conversation that grew is exported with a new hash"""
+        conversation_id = self.db_manager.create_conversation(title="Shared")
+        self.db_manager.add_message(conversation_id, "user", "Question")
+        first_export = os.path.join(self.temp_dir, "first.jsonl")
+        self.db_manager.export_all(first_export)
+        
+        laptop = DBManager(os.path.join(self.temp_dir, "laptop.db"))
+        desktop = DBManager(os.path.join(self.temp_dir, "desktop.db"))
+        try:
+            laptop.import_all(first_export)
+            desktop.import_all(first_export)
+            imported_id = laptop.get_all_conversations()[0]["id"]
+            laptop.add_message(imported_id, "assistant", "Answer")
+            
+            second_export = os.path.join(self.temp_dir, "second.jsonl")
+            laptop.export_all(second_export)
+            self.assertEqual(desktop.import_all(second_export)["imported"], 1)
+            contents = [[m["content"] for m in desktop.get_conversation(c["id"])[1]] for c in desktop.get_all_conversations()]
+            self.assertIn(["Question", "Answer"], contents)
+            
+            # The original file is still recognised where it was imported
+            self.assertEqual(laptop.import_all(first_export)["skipped"], 1)
+        finally:
+            laptop.close()
+            desktop.close()
+    
+    def test_export_selected_conversations(self):
+        """Test exporting a filtered set of conversations"""
+        first = self.db_manager.create_conversation(title="First")
+        self.db_manager.create_conversation(title="Second")
+        
+        export_path = os.path.join(self.temp_dir, "selected.jsonl")
+        self.assertEqual(self.db_manager.export_all(export_path, [first, "missing"]), 1)
+        with open(export_path) as f:
+            self.assertEqual(json.loads(f.readline())["conversation"]["title"], "First")
+    
+    def test_data_version(self):
+        """Test that the data version changes on writes only, including writes from another manager"""
+        version = self.db_manager.data_version()
+        conversation_id = self.db_manager.create_conversation(title="Test")
+        self.assertNotEqual(self.db_manager.data_version(), version)
+        
+        version = self.db_manager.data_version()
+        self.db_manager.get_conversation(conversation_id)
+        self.db_manager.list_conversations()
+        self.assertEqual(self.db_manager.data_version(), version)
+        
+        other = DBManager(self.db_path)
+        try:
+            other.add_message(conversation_id, "user", "Hello")
+        finally:
+            other.close()
+        self.assertNotEqual(self.db_manager.data_version(), version)
+    
+    def test_wal_mode_and_pragmas(self):
+        """Test that connections use WAL and the tuned pragmas"""
+        with self.db_manager._connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0], -64000)
+    
+    def test_connections_are_reused(self):
+        """Test that operations reuse pooled connections"""
+        with self.db_manager._connection() as conn:
+            first = conn
+        self.db_manager.get_all_conversations()
+        with self.db_manager._connection() as conn:
+            self.assertIs(conn, first)
+    
+    def test_concurrent_writers(self):
+        """Test that several threads can write through one manager"""
+        conversation_id = self.db_manager.create_conversation()
+        
+        def write():
+            for i in range(25):
+                self.db_manager.add_message(conversation_id, "user", f"Message {i}")
+        
+        threads = [threading.Thread(target=write) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        _, messages = self.db_manager.get_conversation(conversation_id)
+        self.assertEqual(len(messages), 100)
+
+class TestDBManagerMigrations(unittest.TestCase):
+    """Test cases for the DBManager schema migrations"""
+    
+    def setUp(self):
+        """Create a database with the schema used before migrations existed"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "chat_history.db")
+        
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE conversations (id TEXT PRIMARY KEY, title TEXT, model TEXT, created_at TIMESTAMP, updated_at TIMESTAMP, summary TEXT)")
+        conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id TEXT, role TEXT, content TEXT, timestamp TIMESTAMP)")
+        conn.execute("INSERT INTO conversations VALUES ('legacy', 'Legacy', 'gpt-4', '2024-01-01', '2024-01-01', 'Hello')")
+        conn.execute("INSERT INTO messages (conversation_id, role, content, timestamp) VALUES ('legacy', 'user', 'Hello', '2024-01-01')")
+        conn.commit()
+        conn.close()
+    
+    def tearDown(self):
+        """Remove the temporary database"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_upgrades_existing_database_in_place(self):
+        """Test that an existing database is migrated without losing data"""
+        db_manager = DBManager(self.db_path)
+        
+        self.assertEqual(db_manager.get_schema_version(), DBManager.MIGRATIONS[-1][0])
+        conversation, messages = db_manager.get_conversation("legacy")
+        self.assertEqual(conversation["title"], "Legacy")
+        self.assertEqual(messages[0]["content"], "Hello")
+        db_manager.close()
+    
+    def test_migrations_are_applied_once(self):
+        """Test that reopening a migrated database doesn't reapply migrations"""
+        DBManager(self.db_path).close()
+        DBManager(self.db_path).close()
+        
+        conn = sqlite3.connect(self.db_path)
+        versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+        conn.close()
+        self.assertEqual(versions, [version for version, _, _ in DBManager.MIGRATIONS])
+    
+    def test_search_index_is_backfilled(self):
+        """Test that existing messages and titles become searchable"""
+        db_manager = DBManager(self.db_path)
+        self.assertEqual(db_manager.search("hello")[0]["message_id"], 1)
+        self.assertEqual(db_manager.search("legacy")[0]["conversation_id"], "legacy")
+        db_manager.close()
+    
+    def test_conversation_stats_are_backfilled(self):
+        """Test that existing conversations get their statistics"""
+        db_manager = DBManager(self.db_path)
+        conversation, _ = db_manager.get_conversation("legacy")
+        self.assertEqual(conversation["message_count"], 1)
+        self.assertEqual(conversation["token_count"], 2)
+        self.assertEqual(conversation["last_message_at"], "2024-01-01")
+        self.assertEqual(conversation["last_message_preview"], "Hello")
+        db_manager.close()
+    
+    def test_enable_incremental_vacuum(self):
+        """Test converting a database created without incremental auto-vacuum"""
+        db_manager = DBManager(self.db_path)
+        try:
+            self.assertTrue(db_manager.enable_incremental_vacuum())
+            self.assertFalse(db_manager.enable_incremental_vacuum())
+            with db_manager._connection() as conn:
+                self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+            self.assertEqual(db_manager.get_conversation("legacy")[1][0]["content"], "Hello")
+        finally:
+            db_manager.close()
+    
+    def test_conversation_queries_use_indexes(self):
+        """Test that per-conversation queries and the listing don't scan whole tables"""
+        db_manager = DBManager(self.db_path)
+        with db_manager._connection() as conn:
+            plan = " ".join(row["detail"] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM messages WHERE conversation_id = ? ORDER BY id", ("legacy",)
+            ))
+            self.assertIn("idx_messages_conversation", plan)
+            
+            plan = " ".join(row["detail"] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM messages WHERE conversation_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                ("legacy", 100, 50)
+            ))
+            self.assertIn("idx_messages_conversation", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+            
+            plan = " ".join(row["detail"] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id, title FROM conversations WHERE (updated_at, id) < (?, ?) ORDER BY updated_at DESC, id DESC",
+                ("2024-01-02", "")
+            ))
+            self.assertIn("idx_conversations_updated_at_id", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+        db_manager.close()
+
+class TestDBManagerArchive(unittest.TestCase):
+    """Test cases for archiving idle conversations and compacting the database"""
+    
+    def setUp(self):
+        """Create a database with an old and a recent conversation"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DBManager(os.path.join(self.temp_dir, "chat_history.db"))
+        
+        self.old = self.db_manager.create_conversation(title="Old notes")
+        self.db_manager.add_message(self.old, "user", "Remember the nginx settings")
+        self.db_manager.add_message(self.old, "assistant", "x" * 2000)
+        self.recent = self.db_manager.create_conversation(title="Recent")
+        self.db_manager.add_message(self.recent, "user", "Hello")
+        
+        with self.db_manager._connection() as conn:
+            conn.execute("UPDATE conversations SET updated_at = '2024-01-15T10:00:00' WHERE id = ?", (self.old,))
+            conn.commit()
+    
+    def tearDown(self):
+        """Remove the temporary databases"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_archive_and_read(self):
+        """Test that idle conversations move to a monthly file and still read the same"""
+        before, before_messages = self.db_manager.get_conversation(self.old)
+        
+        stats = self.db_manager.archive_conversations(idle_days=30)
+        self.assertEqual(stats, {"conversations": 1, "messages": 2, "files": 1})
+        self.assertEqual(self.db_manager.archive_conversations(idle_days=30)["conversations"], 0)
+        
+        archive_path = os.path.join(self.db_manager.archive_dir, "chat_history-2024-01.db")
+        self.assertTrue(os.path.exists(archive_path))
+        with self.db_manager._connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (self.old,)).fetchone()[0], 0)
+        
+        # The conversation is still listed with its statistics, and its messages read from the archive
+        listed = {c["id"]: c for c in self.db_manager.list_conversations()[0]}
+        self.assertEqual(listed[self.old]["archive"], "chat_history-2024-01.db")
+        self.assertEqual(listed[self.old]["message_count"], 2)
+        self.assertEqual(listed[self.old]["token_count"], before["token_count"])
+        self.assertIsNone(listed[self.recent]["archive"])
+        
+        conversation, messages = self.db_manager.get_conversation(self.old)
+        self.assertEqual(messages, before_messages)
+        self.assertEqual(self.db_manager.get_messages(self.old, limit=1), ([before_messages[1]], before_messages[1]["id"]))
+        self.assertEqual(self.db_manager.search("notes")[0]["conversation_id"], self.old)
+        
+        # Their messages can still be searched, plain and compressed alike
+        for query, message in (("nginx", before_messages[0]), ("x" * 2000, before_messages[1])):
+            results = self.db_manager.search(query)
+            self.assertEqual(len(results), 1)
+            self.assertEqual((results[0]["message_id"], results[0]["title"]), (message["id"], "Old notes"))
+        
+        # Archive files can be queried directly
+        conn = sqlite3.connect(os.path.join(self.temp_dir, "chat_history.db"))
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        self.assertEqual(conn.execute("SELECT title FROM archive.conversations").fetchone()[0], "Old notes")
+        conn.close()
+    
+    def test_export_includes_archived_messages(self):
+        """Test that exports read archived conversations from their archive"""
+        self.db_manager.archive_conversations(idle_days=30)
+        export_path = os.path.join(self.temp_dir, "export.jsonl")
+        self.assertEqual(self.db_manager.export_all(export_path), 2)
+        with open(export_path, "r", encoding="utf-8") as f:
+            exported = {line["conversation"]["id"]: line["messages"] for line in map(json.loads, f)}
+        self.assertEqual(exported[self.old][1]["content"], "x" * 2000)
+    
+    def test_new_message_restores_conversation(self):
+        """Test that writing to an archived conversation brings it back"""
+        before, _ = self.db_manager.get_conversation(self.old)
+        self.db_manager.archive_conversations(idle_days=30)
+        self.db_manager.add_message(self.old, "user", "What were they again?")
+        
+        conversation, messages = self.db_manager.get_conversation(self.old)
+        self.assertIsNone(conversation["archive"])
+        self.assertEqual(conversation["message_count"], 3)
+        self.assertEqual(conversation["token_count"], before["token_count"] + (len("What were they again?") + 3) // 4)
+        self.assertEqual(self.db_manager.search("x" * 2000)[0]["conversation_id"], self.old)
+        self.assertEqual([m["content"] for m in messages][-1], "What were they again?")
+        self.assertEqual(len(self.db_manager.search("nginx")), 1)
+        self.assertEqual(self.db_manager.search("nginx")[0]["conversation_id"], self.old)
+        self.assertFalse(self.db_manager.restore_conversation(self.old))
+        
+        conn = sqlite3.connect(os.path.join(self.db_manager.archive_dir, "chat_history-2024-01.db"))
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0], 0)
+        conn.close()
+    
+    def test_delete_archived_conversation(self):
+        """Test that deleting an archived conversation removes it from its archive"""
+        self.db_manager.archive_conversations(idle_days=30)
+        self.assertTrue(self.db_manager.delete_conversation(self.old))
+        
+        conn = sqlite3.connect(os.path.join(self.db_manager.archive_dir, "chat_history-2024-01.db"))
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0], 0)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0], 0)
+        conn.close()
+        
+        # Its messages are gone from the search index too
+        self.assertEqual(self.db_manager.search("nginx"), [])
+        self.assertEqual(self.db_manager.search("x" * 2000), [])
+        with self.db_manager._connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM messages_fts_docsize").fetchone()[0], 1)
+    
+    def test_rebuild_search_index_includes_archives(self):
+        """Test that rebuilding the search index keeps archived messages searchable"""
+        self.db_manager.archive_conversations(idle_days=30)
+        self.assertEqual(self.db_manager.rebuild_search_index(), 1)
+        
+        self.assertEqual(len(self.db_manager.search("nginx")), 1)
+        self.assertEqual(self.db_manager.search("x" * 2000)[0]["conversation_id"], self.old)
+        self.assertEqual(self.db_manager.search("hello")[0]["conversation_id"], self.recent)
+    
+    def test_failed_delete_keeps_archived_messages(self):
+        """Test that the archived copy is only deleted once the conversation is gone"""
+        self.db_manager.archive_conversations(idle_days=30)
+        with patch.object(self.db_manager, "_unindex_compressed", side_effect=sqlite3.OperationalError("disk I/O error")):
+            self.assertFalse(self.db_manager.delete_conversation(self.old))
+        
+        conversation, messages = self.db_manager.get_conversation(self.old)
+        self.assertEqual(conversation["archive"], "chat_history-2024-01.db")
+        self.assertEqual(len(messages), 2)
+    
+    def test_compact(self):
+        """Test that free pages are given back a step at a time"""
+        with self.db_manager._connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        
+        conversation_id = self.db_manager.create_conversation()
+        self.db_manager.add_messages([(conversation_id, "user", os.urandom(2000).hex()) for _ in range(200)])
+        self.db_manager.delete_conversation(conversation_id)
+        
+        first = self.db_manager.compact(max_pages=10)
+        self.assertEqual(first, 10)
+        while self.db_manager.compact(max_pages=100):
+            pass
+        with self.db_manager._connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+
+if __name__ == "__main__":
+    unittest.main()
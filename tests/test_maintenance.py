@@ -0,0 +1,77 @@
+"""
+Tests for the DBMaintenance class
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from src.db.db_manager import DBManager
+from src.db.maintenance import DBMaintenance
+
+class TestDBMaintenance(unittest.TestCase):
+    """Test cases for the DBMaintenance class"""
+    
+    def setUp(self):
+        """Create a database with an idle conversation and free pages"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DBManager(os.path.join(self.temp_dir, "chat_history.db"))
+        
+        self.old = self.db_manager.create_conversation(title="Old")
+        self.db_manager.add_message(self.old, "user", "Hello")
+        with self.db_manager._connection() as conn:
+            conn.execute("UPDATE conversations SET updated_at = '2024-01-15T10:00:00' WHERE id = ?", (self.old,))
+            conn.commit()
+        
+        deleted = self.db_manager.create_conversation()
+        self.db_manager.add_messages([(deleted, "user", os.urandom(2000).hex()) for _ in range(50)])
+        self.db_manager.delete_conversation(deleted)
+    
+    def tearDown(self):
+        """Remove the temporary databases"""
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_run_once(self):
+        """Test that one run archives idle conversations and releases every free page in steps"""
+        maintenance = DBMaintenance(self.db_manager, archive_after_days=30, step_pages=10, step_pause=0)
+        with patch.object(self.db_manager, "compact", wraps=self.db_manager.compact) as compact:
+            result = maintenance.run_once()
+        
+        self.assertEqual(result["archived"]["conversations"], 1)
+        self.assertGreater(result["pages_released"], 10)
+        self.assertGreater(compact.call_count, 2)
+        with self.db_manager._connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+    
+    def test_without_archival(self):
+        """Test that nothing is archived unless archive_after_days is set"""
+        result = DBMaintenance(self.db_manager, step_pause=0).run_once()
+        
+        self.assertIsNone(result["archived"])
+        conversation, _ = self.db_manager.get_conversation(self.old)
+        self.assertIsNone(conversation["archive"])
+    
+    def test_start_and_stop(self):
+        """Test that the background thread runs maintenance and stops on request"""
+        maintenance = DBMaintenance(self.db_manager, archive_after_days=30, interval=60, step_pause=0)
+        ran = threading.Event()
+        run_once = maintenance.run_once
+        
+        def run_and_signal():
+            result = run_once()
+            ran.set()
+            return result
+        
+        with patch.object(maintenance, "run_once", side_effect=run_and_signal):
+            maintenance.start()
+            self.assertTrue(ran.wait(5))
+            maintenance.stop()
+            maintenance.stop()
+        
+        conversation, _ = self.db_manager.get_conversation(self.old)
+        self.assertIsNotNone(conversation["archive"])
+
+if __name__ == "__main__":
+    unittest.main()
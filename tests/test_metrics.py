@@ -0,0 +1,162 @@
+"""
+Tests for the metrics registry, structured logging and the recorded request metrics
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+import httpx
+from src.db.db_manager import DBManager
+from src.llm.chat_client import ChatClient
+from src.llm.scheduler import RequestScheduler
+from src.monitoring.logs import JSONFormatter, log_event
+from src.monitoring.metrics import (
+    DB_OPERATION_DURATION, LLM_REQUESTS, LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS, MetricsRegistry
+)
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test cases for counters, histograms and their export"""
+    
+    def setUp(self):
+        """Create an empty registry"""
+        self.registry = MetricsRegistry()
+    
+    def test_render(self):
+        """Test the Prometheus text format of counters and histograms"""
+        requests = self.registry.counter("test_requests_total", "Requests", ["outcome"])
+        requests.inc(outcome="ok")
+        requests.inc(2, outcome="ok")
+        requests.inc(outcome='say "hi"')
+        
+        durations = self.registry.histogram("test_duration_seconds", "Durations", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            durations.observe(value)
+        
+        lines = self.registry.render().splitlines()
+        self.assertIn("# TYPE test_requests_total counter", lines)
+        self.assertIn('test_requests_total{outcome="ok"} 3', lines)
+        self.assertIn('test_requests_total{outcome="say \\"hi\\""} 1', lines)
+        
+        # Buckets are cumulative and end with +Inf
+        self.assertIn("# TYPE test_duration_seconds histogram", lines)
+        self.assertIn('test_duration_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('test_duration_seconds_bucket{le="1"} 3', lines)
+        self.assertIn('test_duration_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn("test_duration_seconds_count 4", lines)
+        self.assertIn("test_duration_seconds_sum 4.25", lines)
+        self.assertEqual(durations.summary(), (4, 4.25))
+    
+    def test_labels_and_registration(self):
+        """Test that labels are checked and metrics are shared by name"""
+        counter = self.registry.counter("test_total", "Test", ["kind"])
+        self.assertIs(self.registry.counter("test_total", "Test", ["kind"]), counter)
+        
+        with self.assertRaises(ValueError):
+            counter.inc(other="x")
+        with self.assertRaises(ValueError):
+            self.registry.histogram("test_total", "Test", ["kind"])
+    
+    def test_write(self):
+        """Test writing the export to a file"""
+        self.registry.counter("test_total", "Test").inc()
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "metrics.prom")
+            self.registry.write(path)
+            with open(path, "r", encoding="utf-8") as f:
+                self.assertIn("test_total 1", f.read())
+            self.assertEqual(os.listdir(temp_dir), ["metrics.prom"])
+        finally:
+            shutil.rmtree(temp_dir)
+
+class TestRecordedMetrics(unittest.TestCase):
+    """Test cases for the metrics recorded by the chat client, scheduler and database"""
+    
+    def test_chat_turn(self):
+        """Test that a request records its timings and the provider's token usage"""
+        completion = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="Answer"))],
+            usage=SimpleNamespace(prompt_tokens=12, completion_tokens=5)
+        )
+        client = ChatClient(api_key="test", model="gpt-4")
+        client.openai_client = MagicMock()
+        client.openai_client.chat.completions.create.return_value = completion
+        
+        requests_before = LLM_REQUESTS.value(provider="openai", model="gpt-4", outcome="ok")
+        tokens_before = LLM_TOKENS.value(provider="openai", model="gpt-4", type="output_tokens")
+        first_tokens_before = LLM_TIME_TO_FIRST_TOKEN.summary(provider="openai", model="gpt-4")
+        
+        client.get_response("Question")
+        
+        self.assertEqual(client.last_usage["input_tokens"], 12)
+        self.assertEqual(client.last_usage["output_tokens"], 5)
+        self.assertGreaterEqual(client.last_metrics["duration"], client.last_metrics["queue_wait"])
+        self.assertIsNotNone(client.last_metrics["time_to_first_token"])
+        self.assertEqual(LLM_REQUESTS.value(provider="openai", model="gpt-4", outcome="ok"), requests_before + 1)
+        self.assertEqual(LLM_TOKENS.value(provider="openai", model="gpt-4", type="output_tokens"), tokens_before + 5)
+        
+        # Only streamed responses have a first token before the end of the response
+        self.assertEqual(LLM_TIME_TO_FIRST_TOKEN.summary(provider="openai", model="gpt-4"), first_tokens_before)
+    
+    def test_scheduler_timings(self):
+        """Test that backoff delays count as queue wait and retries are counted"""
+        scheduler = RequestScheduler("openai", max_retries=3, base_delay=0.01)
+        errors = [httpx.ConnectError("reset"), httpx.ConnectError("reset")]
+        
+        def request():
+            if errors:
+                raise errors.pop()
+            return "ok"
+        
+        timings = {}
+        with patch("src.llm.scheduler.time.sleep"):
+            self.assertEqual(scheduler.call(request, timings=timings), "ok")
+        
+        self.assertEqual(timings["retries"], 2)
+        self.assertGreater(timings["queue_wait"], 0)
+    
+    def test_db_operations_are_timed(self):
+        """Test that DBManager calls are recorded by operation"""
+        temp_dir = tempfile.mkdtemp()
+        db_manager = DBManager(os.path.join(temp_dir, "chat_history.db"))
+        try:
+            before, _ = DB_OPERATION_DURATION.summary(operation="add_message")
+            conversation_id = db_manager.create_conversation()
+            db_manager.add_message(conversation_id, "user", "Hello")
+            db_manager.add_message(conversation_id, "assistant", "Hi")
+            
+            count, total = DB_OPERATION_DURATION.summary(operation="add_message")
+            self.assertEqual(count, before + 2)
+            self.assertGreater(total, 0)
+        finally:
+            db_manager.close()
+            shutil.rmtree(temp_dir)
+
+class TestStructuredLogging(unittest.TestCase):
+    """Test cases for structured log events"""
+    
+    def test_json_event(self):
+        """Test that event fields are written as JSON"""
+        records = []
+        logger = logging.getLogger("src.tests.structured")
+        logger.setLevel(logging.INFO)
+        handler = logging.Handler()
+        handler.emit = lambda record: records.append(JSONFormatter().format(record))
+        logger.addHandler(handler)
+        try:
+            log_event(logger, "chat_turn", model="gpt-4", duration=0.25)
+        finally:
+            logger.removeHandler(handler)
+        
+        event = json.loads(records[0])
+        self.assertEqual(event["event"], "chat_turn")
+        self.assertEqual(event["model"], "gpt-4")
+        self.assertEqual(event["duration"], 0.25)
+
+if __name__ == "__main__":
+    unittest.main()
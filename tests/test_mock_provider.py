@@ -0,0 +1,180 @@
+"""
+Tests for the mock provider, driven through ChatClient as the app would use it
+"""
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import httpx
+import uvicorn
+from src.llm.chat_client import ChatClient
+from src.llm.mock_provider import MockProvider, Recording, create_app
+from src.llm.scheduler import LLMRequestError, RequestScheduler
+
+class MockProviderServer:
+    """Runs a mock provider on a free local port in a background thread"""
+    
+    def __init__(self, provider):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.provider = provider
+        self.server = uvicorn.Server(uvicorn.Config(create_app(provider), host="127.0.0.1", port=self.port, log_level="error"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+    
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+    
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join()
+
+class TestMockProvider(unittest.TestCase):
+    """Test cases for the mock provider"""
+    
+    def setUp(self):
+        """Use schedulers that retry quickly"""
+        schedulers = {provider: RequestScheduler(provider, max_retries=2, base_delay=0.001) for provider in ("openai", "anthropic")}
+        scheduler_patcher = patch.dict("src.llm.scheduler._schedulers", schedulers)
+        scheduler_patcher.start()
+        self.addCleanup(scheduler_patcher.stop)
+        self.schedulers = schedulers
+    
+    def client(self, server, model):
+        """Create a chat client pointed at the mock provider"""
+        with patch.dict("os.environ", {"ANTHROPIC_API_KEY": "test-anthropic-key"}):
+            client = ChatClient(
+                api_key="test-openai-key",
+                model=model,
+                openai_base_url=f"{server.url}/v1",
+                anthropic_base_url=server.url
+            )
+        client.prompt_caching = False
+        return client
+    
+    def test_openai_format(self):
+        """Test plain and streamed OpenAI chat completions"""
+        with MockProviderServer(MockProvider()) as server:
+            client = self.client(server, "gpt-4")
+            
+            self.assertEqual(client.get_response("Hello there"), "Mock answer to: Hello there")
+            chunks = list(client.stream_response("Streaming now"))
+            
+            self.assertEqual(chunks, ["Mock ", "answer ", "to: ", "Streaming ", "now"])
+            self.assertEqual(len(client.conversation_history), 4)
+            self.assertEqual(server.provider.stats["streams"], 1)
+    
+    def test_anthropic_format(self):
+        """Test plain and streamed Anthropic messages, including usage"""
+        with MockProviderServer(MockProvider(response_tokens=12)) as server:
+            client = self.client(server, "claude-3-haiku")
+            
+            answer = client.get_response("Hello")
+            self.assertEqual(len(answer.split(" ")), 12)
+            self.assertEqual(client.last_usage["output_tokens"], 12)
+            self.assertGreater(client.last_usage["input_tokens"], 0)
+            
+            self.assertEqual("".join(client.stream_response("Again")), answer)
+            self.assertEqual(client.last_usage["output_tokens"], 12)
+    
+    def test_latency_and_token_rate(self):
+        """Test that answers are paced by the latency and token rate"""
+        with MockProviderServer(MockProvider(latency=0.2, tokens_per_second=50, response_tokens=10)) as server:
+            client = self.client(server, "gpt-4")
+            
+            start = time.perf_counter()
+            stream = client.stream_response("Hi")
+            next(stream)
+            first_token = time.perf_counter() - start
+            list(stream)
+            total = time.perf_counter() - start
+            
+            self.assertGreaterEqual(first_token, 0.2)
+            self.assertGreaterEqual(total, 0.2 + 9 / 50)
+    
+    def test_injected_errors(self):
+        """Test that injected rate limits and server errors reach the client as LLMRequestError"""
+        with MockProviderServer(MockProvider(rate_limit_rate=1.0, retry_after=0)) as server:
+            with self.assertRaises(LLMRequestError) as context:
+                self.client(server, "gpt-4").get_response("Hi")
+            self.assertEqual(context.exception.status_code, 429)
+            self.assertEqual(self.schedulers["openai"].retries, 2)
+        
+        with MockProviderServer(MockProvider(server_error_rate=1.0, seed=1)) as server:
+            with self.assertRaises(LLMRequestError) as context:
+                self.client(server, "claude-3-haiku").get_response("Hi")
+            self.assertIn(context.exception.status_code, (500, 502, 503, 529))
+            self.assertTrue(context.exception.retryable)
+    
+    def test_record_and_replay(self):
+        """Test recording answers from an upstream API and replaying them"""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, "traffic.jsonl")
+        
+        with MockProviderServer(MockProvider(response_tokens=5)) as upstream:
+            recorder = MockProvider(record_path=path, upstream_urls={"openai": f"{upstream.url}/v1", "anthropic": upstream.url})
+            with MockProviderServer(recorder) as server:
+                recorded = self.client(server, "gpt-4").get_response("Record me")
+                self.client(server, "claude-3-haiku").get_response("Record me")
+            self.assertEqual(recorder.stats["recorded"], 2)
+            self.assertEqual(upstream.provider.stats["requests"], 2)
+        
+        # The upstream API is gone; the recorded answers are replayed, streamed or not
+        with MockProviderServer(MockProvider(replay_path=path)) as server:
+            self.assertEqual(self.client(server, "gpt-4").get_response("Record me"), recorded)
+            self.assertEqual("".join(self.client(server, "claude-3-haiku").stream_response("Record me")), recorded)
+            self.assertEqual(self.client(server, "gpt-4").get_response("Not recorded"), "Mock answer to: Not recorded")
+            self.assertEqual(server.provider.stats["replayed"], 2)
+            
+            # Different sampling parameters make a different request
+            client = self.client(server, "gpt-4")
+            client.temperature = 0.0
+            self.assertEqual(client.get_response("Record me"), "Mock answer to: Record me")
+            self.assertEqual(server.provider.stats["replayed"], 2)
+    
+    def test_recording_key(self):
+        """Test that the Anthropic system prompt and the sampling parameters are part of a recording's key"""
+        messages = [{"role": "user", "content": "Hi"}]
+        keys = {
+            Recording.key("anthropic", "claude-3-haiku", messages),
+            Recording.key("anthropic", "claude-3-haiku", messages, system="Be brief"),
+            Recording.key("anthropic", "claude-3-haiku", messages, temperature=0.2),
+            Recording.key("anthropic", "claude-3-haiku", messages, max_tokens=100)
+        }
+        self.assertEqual(len(keys), 4)
+    
+    def test_unreachable_upstream(self):
+        """Test that an unreachable upstream API is reported as a 502 in the provider's format"""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            closed_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        
+        recorder = MockProvider(record_path=os.path.join(temp_dir, "traffic.jsonl"),
+                                upstream_urls={"openai": f"{closed_url}/v1", "anthropic": closed_url})
+        with MockProviderServer(recorder) as server:
+            request = {"model": "test", "messages": [{"role": "user", "content": "Hi"}]}
+            response = httpx.post(f"{server.url}/v1/chat/completions", json=request)
+            self.assertEqual(response.status_code, 502)
+            self.assertEqual(response.json()["error"]["type"], "api_error")
+            
+            response = httpx.post(f"{server.url}/v1/messages", json=request)
+            self.assertEqual(response.status_code, 502)
+            self.assertEqual(response.json()["type"], "error")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Tests for the ResponseCache class
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from src.llm.chat_client import ChatClient
+from src.llm.response_cache import ResponseCache
+from src.llm.scheduler import LLMRequestError
+
+class TestResponseCache(unittest.TestCase):
+    """Test cases for the ResponseCache class"""
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = ResponseCache(os.path.join(self.temp_dir, "response_cache.db"), max_entries=3, ttl=60, memory_entries=2)
+    
+    def tearDown(self):
+        """Remove the temporary cache"""
+        self.cache.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_hit_and_miss(self):
+        """Test storing and looking up a response"""
+        key = ResponseCache.make_key("gpt-4", [{"role": "user", "content": "Hi"}], 0.7, 1000)
+        self.assertIsNone(self.cache.get(key))
+        
+        self.cache.put(key, "gpt-4", "Hello!")
+        self.assertEqual(self.cache.get(key), "Hello!")
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "entries": 1})
+    
+    def test_key_normalization(self):
+        """Test that keys ignore surrounding whitespace but not model or sampling parameters"""
+        messages = [{"role": "user", "content": "What is SQLite?"}]
+        key = ResponseCache.make_key("gpt-4", messages, 0.7, 1000)
+        
+        self.assertEqual(key, ResponseCache.make_key("gpt-4", [{"role": "user", "content": " What is SQLite?\n"}], 0.7, 1000))
+        self.assertNotEqual(key, ResponseCache.make_key("gpt-3.5-turbo", messages, 0.7, 1000))
+        self.assertNotEqual(key, ResponseCache.make_key("gpt-4", messages, 0.2, 1000))
+        self.assertNotEqual(key, ResponseCache.make_key("gpt-4", messages, 0.7, 500))
+        
+        # Indentation and line breaks inside a message change its meaning, e.g. in code or YAML
+        nested = ResponseCache.make_key("gpt-4", [{"role": "user", "content": "a:\n  b: 1"}], 0.7, 1000)
+        flat = ResponseCache.make_key("gpt-4", [{"role": "user", "content": "a:\nb: 1"}], 0.7, 1000)
+        self.assertNotEqual(nested, flat)
+        self.assertEqual(nested, ResponseCache.make_key("gpt-4", [{"role": "user", "content": "a:\r\n  b: 1\n"}], 0.7, 1000))
+    
+    def test_ttl_expiry(self):
+        """Test that expired entries are not returned"""
+        self.cache.put("key", "gpt-4", "Old answer")
+        with patch("src.llm.response_cache.time.time", return_value=time.time() + 61):
+            self.assertIsNone(self.cache.get("key"))
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used entries are evicted"""
+        for key in ["a", "b", "c"]:
+            self.cache.put(key, "gpt-4", key.upper())
+            time.sleep(0.01)
+        
+        # Read "a" from disk so it becomes the most recently used entry
+        self.cache._memory.clear()
+        self.assertEqual(self.cache.get("a"), "A")
+        time.sleep(0.01)
+        self.cache.put("d", "gpt-4", "D")
+        self.cache._memory.clear()
+        
+        self.assertEqual(self.cache.stats()["entries"], 3)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), "A")
+    
+    def test_memory_hits_count_as_use(self):
+        """Test that entries answered from memory are not the first evicted from disk"""
+        self.cache.put("a", "gpt-4", "A")
+        time.sleep(0.01)
+        self.cache.put("b", "gpt-4", "B")
+        time.sleep(0.01)
+        self.assertEqual(self.cache.get("a"), "A")
+        self.assertIn("a", self.cache._memory)
+        time.sleep(0.01)
+        self.cache.put("c", "gpt-4", "C")
+        time.sleep(0.01)
+        self.cache.put("d", "gpt-4", "D")
+        self.cache._memory.clear()
+        
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), "A")
+    
+    def test_evicted_entries_leave_memory(self):
+        """Test that an entry evicted from disk is no longer answered from memory"""
+        cache = ResponseCache(os.path.join(self.temp_dir, "large_memory.db"), max_entries=3, ttl=60, memory_entries=10)
+        try:
+            for key in ["a", "b", "c", "d"]:
+                cache.put(key, "gpt-4", key.upper())
+                time.sleep(0.01)
+            
+            self.assertNotIn("a", cache._memory)
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.stats()["entries"], 3)
+        finally:
+            cache.close()
+    
+    def test_chat_client_uses_cache(self):
+        """Test that ChatClient answers repeated prompts without calling the provider"""
+        with patch("openai.OpenAI"):
+            chat_client = ChatClient(api_key="test_api_key", response_cache=self.cache)
+        
+        completion = MagicMock()
+        completion.choices = [MagicMock()]
+        completion.choices[0].message.content = "Fresh answer"
+        chat_client.openai_client = MagicMock()
+        chat_client.openai_client.chat.completions.create.return_value = completion
+        
+        self.assertEqual(chat_client.get_response("Hi"), "Fresh answer")
+        self.assertFalse(chat_client.last_response_cached)
+        
+        chat_client.clear_history()
+        self.assertEqual(chat_client.get_response("Hi"), "Fresh answer")
+        self.assertTrue(chat_client.last_response_cached)
+        self.assertEqual(chat_client.openai_client.chat.completions.create.call_count, 1)
+        self.assertEqual(chat_client.conversation_history[-1]["content"], "Fresh answer")
+    
+    def test_errors_are_not_cached(self):
+        """Test that failed requests are not stored"""
+        with patch("openai.OpenAI"):
+            chat_client = ChatClient(api_key="test_api_key", response_cache=self.cache)
+        chat_client.openai_client = MagicMock()
+        chat_client.openai_client.chat.completions.create.side_effect = RuntimeError("boom")
+        
+        with self.assertRaises(LLMRequestError):
+            chat_client.get_response("Hi")
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
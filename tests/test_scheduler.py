@@ -0,0 +1,164 @@
+"""
+Tests for the RequestScheduler class
+"""
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from src.llm.chat_client import ChatClient
+from src.llm.scheduler import LLMRequestError, RequestScheduler, TokenBucket
+
+class APIStatusError(Exception):
+    """Stand-in for an SDK error carrying an HTTP response"""
+    
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = MagicMock(headers=headers or {})
+
+class APIConnectionError(Exception):
+    """Stand-in for an SDK connection error"""
+
+def flaky(*errors, result="ok"):
+    """Build a request that raises the given errors before succeeding"""
+    remaining = list(errors)
+    
+    def request():
+        if remaining:
+            raise remaining.pop(0)
+        return result
+    
+    return request
+
+class TestRequestScheduler(unittest.TestCase):
+    """Test cases for the RequestScheduler class"""
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.scheduler = RequestScheduler("openai", max_concurrency=2, max_retries=3, base_delay=0.01)
+        sleep_patcher = patch("src.llm.scheduler.time.sleep")
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+    
+    def test_token_bucket(self):
+        """Test that a bucket allows a burst and then spaces out reservations"""
+        bucket = TokenBucket(per_minute=60, capacity=2)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 1.0, places=1)
+        self.assertAlmostEqual(bucket.reserve(), 2.0, places=1)
+    
+    def test_rate_limit_delays_requests(self):
+        """Test that requests beyond the per-minute budget wait their turn"""
+        scheduler = RequestScheduler("openai", requests_per_minute=60)
+        scheduler.requests.capacity = scheduler.requests.tokens = 1
+        
+        scheduler.call(lambda: "first")
+        scheduler.call(lambda: "second")
+        
+        delays = [call.args[0] for call in self.sleep.call_args_list]
+        self.assertEqual(delays[0], 0)
+        self.assertAlmostEqual(delays[1], 1.0, places=1)
+    
+    def test_retries_transient_errors(self):
+        """Test that rate limits, server errors and connection errors are retried"""
+        request = flaky(APIStatusError(429), APIStatusError(503), APIConnectionError("reset"))
+        
+        self.assertEqual(self.scheduler.call(request), "ok")
+        self.assertEqual(self.scheduler.retries, 3)
+    
+    def test_honors_retry_after(self):
+        """Test that Retry-After sets the delay and pauses other requests"""
+        request = flaky(APIStatusError(429, {"retry-after": "7"}))
+        
+        self.assertEqual(self.scheduler.call(request), "ok")
+        self.assertIn(7.0, [call.args[0] for call in self.sleep.call_args_list])
+        self.assertGreater(self.scheduler._reserve(0), 6)
+    
+    def test_gives_up(self):
+        """Test that client errors fail at once and transient ones after max_retries"""
+        with self.assertRaises(LLMRequestError) as context:
+            self.scheduler.call(flaky(APIStatusError(400)))
+        self.assertEqual(context.exception.status_code, 400)
+        self.assertFalse(context.exception.retryable)
+        self.assertEqual(self.scheduler.retries, 0)
+        
+        with self.assertRaises(LLMRequestError) as context:
+            self.scheduler.call(flaky(*[APIStatusError(500)] * 5))
+        self.assertTrue(context.exception.retryable)
+        self.assertIn("Error calling OpenAI API", str(context.exception))
+        self.assertEqual(self.scheduler.retries, 3)
+    
+    def test_stream_retries_only_before_first_chunk(self):
+        """Test that a stream is retried until it starts, but not after"""
+        attempts = []
+        
+        def open_stream():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise APIStatusError(429)
+            yield "Hello"
+            raise APIConnectionError("reset")
+        
+        chunks = []
+        with self.assertRaises(LLMRequestError):
+            for chunk in self.scheduler.stream(open_stream):
+                chunks.append(chunk)
+        
+        self.assertEqual(chunks, ["Hello"])
+        self.assertEqual(len(attempts), 2)
+    
+    def test_bounded_concurrency(self):
+        """Test that no more than max_concurrency requests run at once"""
+        lock = threading.Lock()
+        running = []
+        peak = []
+        
+        def request():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            threading.Event().wait(0.02)
+            with lock:
+                running.pop()
+        
+        threads = [threading.Thread(target=self.scheduler.call, args=(request,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(max(peak), 2)
+    
+    def test_call_async(self):
+        """Test retrying an async request"""
+        attempts = []
+        
+        async def request():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise APIStatusError(502)
+            return "ok"
+        
+        scheduler = RequestScheduler("openai", max_retries=3, base_delay=0.001)
+        self.assertEqual(asyncio.run(scheduler.call_async(request)), "ok")
+        self.assertEqual(len(attempts), 3)
+    
+    def test_failed_turn_is_not_kept(self):
+        """Test that a failed request raises and leaves the history unchanged"""
+        with patch("openai.OpenAI"):
+            chat_client = ChatClient(api_key="test_api_key")
+        chat_client.openai_client = MagicMock()
+        chat_client.openai_client.chat.completions.create.side_effect = APIStatusError(401)
+        
+        with self.assertRaises(LLMRequestError):
+            chat_client.get_response("Hi")
+        self.assertEqual(chat_client.conversation_history, [])
+        
+        with self.assertRaises(LLMRequestError):
+            list(chat_client.stream_response("Hi"))
+        self.assertEqual(chat_client.conversation_history, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Tests for the WriteBehindWriter class
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from src.db.db_manager import DBManager
+from src.db.write_behind import WriteBehindWriter
+
+class TestWriteBehindWriter(unittest.TestCase):
+    """Test cases for the WriteBehindWriter class"""
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_manager = DBManager(os.path.join(self.temp_dir, "chat_history.db"))
+        self.conversation_id = self.db_manager.create_conversation(title="Test")
+        self.writer = WriteBehindWriter(self.db_manager)
+    
+    def tearDown(self):
+        """Stop the writer and remove the temporary database"""
+        self.writer.close()
+        self.db_manager.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def contents(self):
+        """Get the contents of the test conversation's messages, in order"""
+        _, messages = self.db_manager.get_conversation(self.conversation_id)
+        return [msg["content"] for msg in messages]
+    
+    def test_ids_and_order(self):
+        """Test that queued messages are saved in order and their futures give their IDs"""
+        futures = [self.writer.add_message(self.conversation_id, "user", f"Message {i}") for i in range(5)]
+        message_ids = [future.result(timeout=5) for future in futures]
+        
+        _, messages = self.db_manager.get_conversation(self.conversation_id)
+        self.assertEqual([msg["id"] for msg in messages], message_ids)
+        self.assertEqual(self.contents(), [f"Message {i}" for i in range(5)])
+    
+    def test_flush(self):
+        """Test that flush() returns once every queued message can be read"""
+        for i in range(20):
+            self.writer.add_message(self.conversation_id, "user", f"Message {i}")
+        self.writer.flush(timeout=5)
+        
+        self.assertEqual(len(self.contents()), 20)
+    
+    def test_close_saves_queued_messages(self):
+        """Test that closing the writer saves what is still queued and refuses new messages"""
+        for i in range(20):
+            self.writer.add_message(self.conversation_id, "user", f"Message {i}")
+        self.writer.close()
+        self.writer.close()
+        
+        self.assertEqual(len(self.contents()), 20)
+        self.writer.flush()
+        with self.assertRaises(RuntimeError):
+            self.writer.add_message(self.conversation_id, "user", "Too late")
+    
+    def test_group_commit(self):
+        """Test that messages queued while a batch is being saved are committed together"""
+        started = threading.Event()
+        release = threading.Event()
+        add_messages = self.db_manager.add_messages
+        
+        def slow_add_messages(messages):
+            started.set()
+            release.wait(5)
+            return add_messages(messages)
+        
+        with patch.object(self.db_manager, "add_messages", side_effect=slow_add_messages):
+            self.writer.add_message(self.conversation_id, "user", "First")
+            self.assertTrue(started.wait(5))
+            for i in range(10):
+                self.writer.add_message(self.conversation_id, "user", f"Message {i}")
+            release.set()
+            self.writer.flush(timeout=5)
+        
+        self.assertEqual(self.writer.batches, 2)
+        self.assertEqual(self.writer.written, 11)
+        self.assertEqual(len(self.contents()), 11)
+    
+    def test_failed_batch(self):
+        """Test that a failed batch is retried one message at a time and only bad messages fail"""
+        add_message = self.db_manager.add_message
+        
+        def failing_add_message(conversation_id, role, content):
+            if content == "Lost":
+                raise RuntimeError("disk I/O error")
+            return add_message(conversation_id, role, content)
+        
+        with patch.object(self.db_manager, "add_messages", side_effect=RuntimeError("disk I/O error")), \
+                patch.object(self.db_manager, "add_message", side_effect=failing_add_message):
+            good = self.writer.add_message(self.conversation_id, "user", "Saved")
+            bad = self.writer.add_message(self.conversation_id, "user", "Lost")
+            self.writer.flush(timeout=5)
+        
+        self.assertIsInstance(good.result(), int)
+        self.assertIsNotNone(bad.exception())
+        self.assertEqual(self.contents(), ["Saved"])
+    
+    def test_concurrent_producers(self):
+        """Test that messages from several threads are all saved"""
+        def produce(n):
+            for i in range(25):
+                self.writer.add_message(self.conversation_id, "user", f"{n}-{i}")
+        
+        threads = [threading.Thread(target=produce, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.writer.flush(timeout=5)
+        
+        contents = self.contents()
+        self.assertEqual(len(contents), 100)
+        # Each thread's messages keep their order
+        for n in range(4):
+            self.assertEqual([c for c in contents if c.startswith(f"{n}-")], [f"{n}-{i}" for i in range(25)])
+
+if __name__ == "__main__":
+    unittest.main()